@@ -1,10 +1,13 @@
- # 导入BIF文件读取器
-from pgmpy.readwrite import BIFReader
+import os
+import sys
 
-# 读取.bif文件并获取模型
-# 这行代码会解析文件的结构和概率表，在内存中创建一个模型对象
-model = BIFReader('data/bnlearn/asia/asia.bif').get_model()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# 模型注册表：BIF 文件只在首次使用时解析，之后从按文件哈希索引的编译缓存载入
+from common.bn_model import load_model
+
+# 获取编译后的模型（拓扑序、条件概率表与状态名）
+model = load_model('asia')
 
 # 打印模型的因果边，验证是否加载成功
 print("模型真实的因果边:", model.edges())
-# 预期输出: [('Pollution', 'Cancer'), ('Smoker', 'Cancer'), ('Cancer', 'Xray'), ('Cancer', '    ')]
\ No newline at end of file
+# 预期输出: [('asia', 'tub'), ('smoke', 'lung'), ('smoke', 'bronc'), ('lung', 'either'), ('tub', 'either'), ('either', 'xray'), ('bronc', 'dysp'), ('either', 'dysp')]
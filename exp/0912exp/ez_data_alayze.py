@@ -1,50 +1,67 @@
+import os
+import sys
 import json
-from collections import Counter
+import argparse
 
-with open("exp/914_outcome/ez_glm_output.json", "r", encoding="utf-8") as f:
-    data_list = json.load(f)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.canonical import CanonicalIndex, hypothesis_names
+from common.hypothesis_metrics import RankTable, evaluate, iter_records, load_truth, print_report
 
-truth_ans = {"癌症","肺癌"}
-topk_value = [1,3,5]
-# 正确率
-accuary = 0
-# topk列表
-topk_list = {k:0 for k in topk_value}
-# all hypotheses
-all_hypotheses = []
-# 倒数排名总和
-reciprocal_ranks_sum = 0.0
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="统计LLM混淆变量假设的命中率、MRR、hit@k 与提出频次。")
+    parser.add_argument("inputs", nargs='*', default=["outcome/914_outcome/ez_glm_output.json"],
+                        help="假设结果文件（JSON列表或JSONL检查点），可传多个；文件名作为模型/来源标签")
+    parser.add_argument("--truth", default="癌症,肺癌",
+                        help="真值混淆变量：逗号分隔的名称（对所有变量组合生效），或按变量组合给出真值的JSON文件")
+    parser.add_argument("--ignore-case", action="store_true",
+                        help="命中判断不区分大小写（默认与原脚本一致区分大小写），英文结果与小写真值比较时使用")
+    parser.add_argument("--topk", default="1,3,5", help="以逗号分隔的 k 值")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="自助重采样次数，0 表示不计算置信区间")
+    parser.add_argument("--ci", type=float, default=0.95, help="置信水平")
+    parser.add_argument("--seed", type=int, default=0, help="自助重采样的随机种子")
+    parser.add_argument("--top-n", type=int, default=10, help="每组打印的高频假设个数")
+    parser.add_argument("--output", default=None, help="保存各组指标的JSON文件")
+    parser.add_argument("--canonicalize", action="store_true",
+                        help="先对全部假设名称做归一化、同义词与MinHash聚类，频次与命中判断按规范名称进行")
+    parser.add_argument("--canonical-map", default=None, help="读取已保存的规范化映射（隐含 --canonicalize）")
+    parser.add_argument("--save-canonical", default=None, help="保存本次得到的规范化映射，供采样与后续分析复用")
+    parser.add_argument("--threshold", type=float, default=0.6, help="名称聚类所需的 Jaccard 相似度估计")
+    return parser.parse_args()
 
-for data in data_list:
-    found = False
-    for hypothesis in data["confounder_hypotheses"]:
-        all_hypotheses.append(hypothesis["confounder"])
-        
 
-        if any(ans in hypothesis["confounder"] for ans in truth_ans) and not found:
-            accuary += 1
-            found = True
-            rank = hypothesis["rank"]
+def main():
+    args = parse_args()
+    truth = load_truth(args.truth)
+    index = None
+    if args.canonical_map:
+        index = CanonicalIndex.load(args.canonical_map)
+    elif args.canonicalize:
+        # 第一遍流式读取只收集名称，聚类完成后第二遍再计算指标
+        index = CanonicalIndex(threshold=args.threshold)
+        for path in args.inputs:
+            for record in iter_records(path):
+                index.add_all(hypothesis_names(record))
+        index.build()
+    if index is not None:
+        truth = {pair: tuple(index.canonical(name) for name in names) for pair, names in truth.items()}
+        if args.save_canonical:
+            index.save(args.save_canonical)
+            print(f"规范化映射已保存到文件: {args.save_canonical}")
 
-            reciprocal_ranks_sum += 1.0 / rank
+    table = RankTable(truth, canonicalize=index.canonical if index is not None else None, ignore_case=args.ignore_case)
+    for path in args.inputs:
+        table.extend(path)
 
-            for k in topk_value:
-                if rank <= k:
-                    topk_list[k] += 1
+    ks = tuple(int(k) for k in args.topk.split(','))
+    results = evaluate(table, ks=ks, n_boot=args.bootstrap, ci=args.ci, seed=args.seed, top_n=args.top_n)
+    print_report(results, ci=args.ci)
 
-hit_rate = accuary / len(data_list) if len(data_list) > 0 else 0
-mrr = reciprocal_ranks_sum / len(data_list) if len(data_list) > 0 else 0
-top_k_accuracy = {k: (count / len(data_list) if len(data_list) > 0 else 0) for k, count in topk_list.items()}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+        print(f"\n指标已保存到文件: {args.output}")
 
-hypothesis_frequency = Counter(all_hypotheses)
 
-sorted_hypotheses = hypothesis_frequency.most_common() 
-for hypothesis, count in sorted_hypotheses:
-    percentage = (count / len(data_list)) * 100
-    print(f"  - {hypothesis:<25}: 提出了 {count:>2} 次 (频率: {percentage:.1f}%)")
-
-
-print(f"正确率: {hit_rate}")
-print(f"倒数排名总和: {mrr}")
-print(f"topk列表: {top_k_accuracy}")
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,12 @@
 
 import json
 import os
+import time
+import argparse
+import numpy as np
 import pandas as pd
-from pgmpy.models import DiscreteBayesianNetwork
-from pgmpy.factors.discrete import TabularCPD
-from pgmpy.sampling import BayesianModelSampling
+
+# pgmpy 导入耗时数秒，只在 pgmpy 后端与 --verify 等价性检验中导入，默认的 numpy 后端不付出这部分开销
 
 def create_and_sample_network(llm_run_data, output_dir):
     """
@@ -15,6 +17,10 @@ def create_and_sample_network(llm_run_data, output_dir):
         llm_run_data (dict): 从ez_glm_output.json中读取的单次运行数据。
         output_dir (str): 保存生成的数据集的目录。
     """
+    from pgmpy.models import DiscreteBayesianNetwork
+    from pgmpy.factors.discrete import TabularCPD
+    from pgmpy.sampling import BayesianModelSampling
+
     run_id = llm_run_data['id']
     observed_variables = llm_run_data['variables']
 
@@ -114,13 +120,213 @@ def create_and_sample_network(llm_run_data, output_dir):
         print(f"  数据已成功保存到: {output_path}")
 
 
+def compile_fork_cpts(llm_run_data):
+    """
+    将单次LLM运行中的先验概率与条件概率直接编译为NumPy概率表，跳过pgmpy建模。
+
+    结构与 create_and_sample_network 相同：Confounder -> Observed_Var1, Confounder -> Observed_Var2，
+    混淆变量为二元 (True/False)，状态顺序与pgmpy的 state_names 一致。
+
+    返回:
+        list: 每个可用假设一个字典，包含 'confounder'、'prior' (形状 (2,)) 以及 'children'，
+            children 中每项为 (观察变量名, 状态列表, 形状为 (状态数, 2) 的条件概率表)。
+    """
+    run_id = llm_run_data['id']
+    observed_variables = llm_run_data['variables']
+    if not all(k in llm_run_data for k in ['confounder_variables', 'Probability', 'conditional_probabilities']):
+        print(f"[Run ID: {run_id}] 数据不完整，缺少关键键，跳过。")
+        return []
+
+    priors = {p['confounder']: p['probability'] for p in llm_run_data['Probability']}
+    conditionals = {c['confounder']: c['probabilities'] for c in llm_run_data['conditional_probabilities']}
+
+    compiled = []
+    for confounder_hypothesis in llm_run_data['confounder_hypotheses']:
+        confounder_name = confounder_hypothesis['confounder']
+        if confounder_name not in priors:
+            print(f"[Run ID: {run_id}] 错误: 找不到混淆变量 '{confounder_name}' 的先验概率。")
+            continue
+        if confounder_name not in conditionals:
+            print(f"[Run ID: {run_id}] 错误: 找不到混淆变量 '{confounder_name}' 的条件概率表。")
+            continue
+
+        children = []
+        for obs_var in observed_variables:
+            obs_var_prob = next((p for p in conditionals[confounder_name] if p['observed_variable'] == obs_var), None)
+            if not obs_var_prob:
+                print(f"[Run ID: {run_id}] 错误: 找不到观察变量 '{obs_var}' 的条件概率。")
+                break
+            cpt = obs_var_prob['cpt']
+            states = list(cpt['when_confounder_true'].keys())
+            # 列顺序与pgmpy一致: 第0列为混淆变量为True，第1列为False
+            table = np.array([[cpt['when_confounder_true'][state], cpt['when_confounder_false'].get(state, np.nan)]
+                              for state in states], dtype=float)
+            children.append((obs_var, states, table))
+        else:
+            prior_true = float(priors[confounder_name])
+            compiled.append({
+                'run_id': run_id,
+                'confounder': confounder_name,
+                'prior': np.array([prior_true, 1 - prior_true]),
+                'children': children,
+            })
+    return compiled
+
+
+def validate_cpts(compiled, tol=1e-6):
+    """
+    批量校验并归一化所有假设的概率表：概率必须有限且非负，每列之和偏离1时重新归一化。
+
+    返回:
+        list: 通过校验的假设（原地归一化）。
+    """
+    if not compiled:
+        return []
+    # 先验概率一次性检查
+    priors = np.stack([h['prior'] for h in compiled])
+    prior_ok = np.isfinite(priors).all(axis=1) & (priors >= 0).all(axis=1)
+
+    valid = []
+    renormalized = 0
+    for h, ok in zip(compiled, prior_ok):
+        tables = [table for _, _, table in h['children']]
+        if not ok or not all(np.isfinite(t).all() and (t >= 0).all() for t in tables):
+            print(f"[Run ID: {h['run_id']}] 模型验证失败: '{h['confounder']}' 的概率表包含无效数值。")
+            continue
+        sums = [t.sum(axis=0) for t in tables]
+        if any((s <= 0).any() for s in sums):
+            print(f"[Run ID: {h['run_id']}] 模型验证失败: '{h['confounder']}' 的条件概率列和为0。")
+            continue
+        if any(np.abs(s - 1).max() > tol for s in sums):
+            renormalized += 1
+        for (_, _, table), col_sum in zip(h['children'], sums):
+            table /= col_sum
+        valid.append(h)
+
+    if renormalized:
+        print(f"有 {renormalized} 个假设的条件概率列和不为1，已重新归一化。")
+    return valid
+
+
+def sample_forks_numpy(compiled, size=1000, seed=42):
+    """
+    对一次运行中的所有假设做一次向量化的祖先采样：先采样混淆变量，再按其取值采样两个观察变量。
+
+    参数:
+        compiled (list): validate_cpts 返回的假设列表。
+        size (int): 每个假设的样本数。
+        seed (int | None): 随机种子。
+
+    返回:
+        list: 与 compiled 对应的 DataFrame 列表，列与取值格式同 pgmpy 的 forward_sample。
+    """
+    if not compiled:
+        return []
+    rng = np.random.default_rng(seed)
+    n_hyp = len(compiled)
+
+    # 混淆变量：所有假设一次采样，True 对应状态下标0
+    prior_true = np.array([h['prior'][0] for h in compiled])
+    confounder_true = rng.random((n_hyp, size)) < prior_true[:, None]
+
+    frames_columns = [{h['confounder']: confounder_true[k]} for k, h in enumerate(compiled)]
+    n_children = len(compiled[0]['children'])
+    for j in range(n_children):
+        max_card = max(len(h['children'][j][1]) for h in compiled)
+        # 各假设的累积概率表补齐到相同状态数，形状 (假设数, 2, 状态数)
+        cdf = np.ones((n_hyp, 2, max_card))
+        for k, h in enumerate(compiled):
+            table = h['children'][j][2]
+            cdf[k, :, :table.shape[0]] = np.cumsum(table, axis=0).T
+        parent_state = np.where(confounder_true, 0, 1)
+        selected = cdf[np.arange(n_hyp)[:, None], parent_state]
+        u = rng.random((n_hyp, size))
+        state_idx = (u[:, :, None] > selected).sum(axis=2)
+        for k, h in enumerate(compiled):
+            obs_var, states, _ = h['children'][j]
+            idx = np.minimum(state_idx[k], len(states) - 1)
+            frames_columns[k][obs_var] = np.asarray(states, dtype=object)[idx]
+
+    return [pd.DataFrame(columns) for columns in frames_columns]
+
+
+def build_reference_model(hypothesis):
+    """
+    用pgmpy构建与编译结果相同的网络，作为NumPy实现的参照。
+    """
+    from pgmpy.models import DiscreteBayesianNetwork
+    from pgmpy.factors.discrete import TabularCPD
+
+    confounder_name = hypothesis['confounder']
+    model = DiscreteBayesianNetwork([(confounder_name, obs_var) for obs_var, _, _ in hypothesis['children']])
+    cpds = [TabularCPD(variable=confounder_name, variable_card=2, values=hypothesis['prior'].reshape(2, 1),
+                       state_names={confounder_name: [True, False]})]
+    for obs_var, states, table in hypothesis['children']:
+        cpds.append(TabularCPD(variable=obs_var, variable_card=len(states), values=table,
+                               evidence=[confounder_name], evidence_card=[2],
+                               state_names={obs_var: states, confounder_name: [True, False]}))
+    model.add_cpds(*cpds)
+    model.check_model()
+    return model
+
+
+def verify_against_pgmpy(compiled, size=20000, tol=0.02, seed=0):
+    """
+    等价性检验：逐个假设比较NumPy采样与pgmpy forward_sample 的联合分布频率（总变差距离）。
+    使用较大的样本数，使两种实现的抽样误差远小于 tol。
+
+    返回:
+        bool: 所有假设的总变差距离都不超过 tol 时返回 True。
+    """
+    from pgmpy.sampling import BayesianModelSampling
+
+    all_ok = True
+    numpy_frames = sample_forks_numpy(compiled, size=size, seed=seed)
+    for h, df_numpy in zip(compiled, numpy_frames):
+        model = build_reference_model(h)
+        df_ref = BayesianModelSampling(model).forward_sample(size=size, seed=seed + 1, show_progress=False)
+        columns = list(df_numpy.columns)
+        freq_numpy = df_numpy[columns].astype(str).value_counts(normalize=True)
+        freq_ref = df_ref[columns].astype(str).value_counts(normalize=True)
+        tvd = 0.5 * freq_numpy.subtract(freq_ref, fill_value=0).abs().sum()
+        ok = tvd <= tol
+        all_ok &= ok
+        print(f"  [{'通过' if ok else '不一致'}] {h['confounder']}: 与pgmpy采样的总变差距离 {tvd:.4f}")
+    return all_ok
+
+
+def generate_run_numpy(llm_run_data, output_dir, size=1000, seed=42, verify=False):
+    """
+    NumPy快速路径：编译、批量校验并一次性采样单次运行的全部假设，保存为与pgmpy路径相同的CSV。
+    """
+    compiled = validate_cpts(compile_fork_cpts(llm_run_data))
+    frames = sample_forks_numpy(compiled, size=size, seed=seed)
+    for h, dataset in zip(compiled, frames):
+        output_path = os.path.join(output_dir, f"run_{h['run_id']}_{h['confounder']}.csv")
+        dataset.to_csv(output_path, index=False)
+        print(f"  数据已成功保存到: {output_path}")
+    if verify and compiled:
+        print(f"[Run ID: {llm_run_data['id']}] 与pgmpy参照实现做等价性检验...")
+        verify_against_pgmpy(compiled)
+
+
 def main():
     """
     主函数，加载LLM输出，创建输出目录，并为每个假设生成数据。
     """
+    parser = argparse.ArgumentParser(description="根据LLM给出的概率表构建分叉网络并采样数据。")
+    parser.add_argument("--input", default='outcome/914_outcome/ez_glm_output_test.json', help="LLM输出的JSON文件")
+    parser.add_argument("--output-dir", default='llm_generated_data2', help="生成数据的保存目录")
+    parser.add_argument("--backend", choices=["numpy", "pgmpy"], default="numpy",
+                        help="numpy: 批量编译并向量化采样；pgmpy: 原有的逐假设建模与采样")
+    parser.add_argument("--size", type=int, default=1000, help="每个假设的样本数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--verify", action="store_true", help="numpy后端下与pgmpy参照实现做等价性检验")
+    args = parser.parse_args()
+
     # 定义输入文件和输出目录
-    input_json_path = 'llm_exp/914_outcome/ez_glm_output_test.json'
-    output_data_dir = 'llm_generated_data2'
+    input_json_path = args.input
+    output_data_dir = args.output_dir
 
     # 如果输出目录不存在，则创建它
     if not os.path.exists(output_data_dir):
@@ -138,12 +344,17 @@ def main():
         print(f"错误: 解析JSON文件失败 {input_json_path}")
         return
 
+    start = time.perf_counter()
     # 遍历JSON中的每一次运行结果
     for run_data in all_runs_data:
         if run_data.get("is_confounder", False):
-            create_and_sample_network(run_data, output_data_dir)
+            if args.backend == "numpy":
+                generate_run_numpy(run_data, output_data_dir, size=args.size, seed=args.seed, verify=args.verify)
+            else:
+                create_and_sample_network(run_data, output_data_dir)
         else:
             print(f"\n[Run ID: {run_data.get('id', 'N/A')}] LLM判断无混淆变量，跳过。")
+    print(f"\n全部运行处理完成，耗时 {time.perf_counter() - start:.2f} 秒 (后端: {args.backend})")
 
 if __name__ == '__main__':
     main()
@@ -1,27 +1,61 @@
 ## 分析由LLM直接生成的JSON数据中的因果效应
 
 import os
-import json
-import pandas as pd
+import sys
+import argparse
 import numpy as np
-from causallearn.search.ConstraintBased.PC import pc
 from causallearn.utils.GraphUtils import GraphUtils
 from sklearn.preprocessing import LabelEncoder
 
-def discover_causal_structure(data, node_names):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import load_frames
+from common.dataset_store import open_datasets
+from common.pc_batch import discover_causal_structure as run_pc, run_pc_batch, print_batch_results, save_batch_results
+from common.graph_eval import evaluate_results, load_truth_graph, print_summary, summarize
+from common.ci_stats import alpha_sweep, print_sensitivity_table, cache_info
+from common.bootstrap import bootstrap_edges, print_stability_table, save_stability_results
+
+def discover_causal_structure(data, node_names, show_progress=True):
+    """
+    对给定的数据集运行PC因果发现算法（类别数据使用 G 检验）。
+    """
+    return run_pc(data, node_names, indep_test='gsq', show_progress=show_progress)
+
+def preprocess_dataset(df):
     """
-    对给定的数据集运行PC因果发现算法。
+    移除 id 列并做标签编码，返回 (编码后的DataFrame, 列名列表)。
     """
-    data_np = data.to_numpy()
-    cg = pc(data_np, alpha=0.05, node_names=node_names,indep_test='gsq')
-    return cg
+    # 数据清洗：移除不相关的'id'列 ---
+    if 'id' in df.columns:
+        df = df.drop('id', axis=1)
+        print("已移除'id'列，因为它不参与因果分析。")
+
+    # 数据预处理：标签编码 ---
+    # 我们需要将所有列从类别型（字符串、布尔值）转换为数值型（整数）
+    df_encoded = df.apply(LabelEncoder().fit_transform)
+    return df_encoded, df_encoded.columns.tolist()
 
 def main():
     """
     主函数，加载LLM直接生成的JSON数据文件，执行因果发现并打印结果。
     """
-    # 定义新的输入文件路径
-    json_file_path = 'outcome/926_outcome/data_glm_data_test.json'
+    parser = argparse.ArgumentParser(description="对LLM生成的数据集运行PC算法。")
+    parser.add_argument("--input", default='outcome/926_outcome/data_glm_data_test.json',
+                        help="JSON文件，或 common/columnar.py 写出的列式目录（内存映射读取）")
+    parser.add_argument("--batch", action="store_true", help="批量模式：用进程池并行分析文件中的全部数据集")
+    parser.add_argument("--store", action="store_true",
+                        help="批量模式下使用数据集缓存：标签编码结果存为 .npy，子进程内存映射打开，不再向每个进程复制数据")
+    parser.add_argument("--workers", type=int, default=None, help="批量模式与自助重采样模式的进程数，默认使用全部CPU核心")
+    parser.add_argument("--output", default=None, help="批量模式或自助重采样模式下保存结构化结果的JSON文件")
+    parser.add_argument("--truth", default=None,
+                        help="批量模式下与真实结构比较并输出 SHD、邻接/方向 P/R/F1 汇总表，如 cancer（也可为 .bif 或JSON文件）")
+    parser.add_argument("--alphas", default=None,
+                        help="以逗号分隔的显著性水平，如 0.01,0.05,0.1；给出时对每个数据集做 alpha 敏感性分析")
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="自助重采样次数；大于0时并行运行PC并报告每条边及其方向的出现频率")
+    parser.add_argument("--seed", type=int, default=0, help="自助重采样的随机种子")
+    args = parser.parse_args()
+    json_file_path = args.input
     
     if not os.path.exists(json_file_path):
         print(f"错误: 数据文件 '{json_file_path}' 不存在。")
@@ -33,24 +67,58 @@ def main():
 
     # --- 1. 加载并解析JSON数据 ---
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            json_content = json.load(f)
+        frames = None if args.batch and args.store else load_frames(json_file_path)
         
-        if isinstance(json_content, list) and len(json_content) > 0:
-            for data in json_content:
-                data_list = data.get('data', [])
-                df = pd.DataFrame(data_list)
+        if args.batch and (args.store or (isinstance(frames, list) and len(frames) > 0)):
+            tasks = []
+            if args.store:
+                # 任务中只有 .npy 路径与列名，discover_causal_structure 调用 to_numpy() 时才在子进程中映射
+                for dataset_id, dataset in enumerate(open_datasets(json_file_path, encode='all')):
+                    dataset = dataset.select(drop=['id'])
+                    confounder = (dataset.meta.get('confounder_variables') or [None])[0]
+                    tasks.append((dataset_id, confounder, dataset, dataset.columns))
+            else:
+                for dataset_id, (meta, df) in enumerate(frames):
+                    df_encoded, column_names = preprocess_dataset(df)
+                    confounder = (meta.get('confounder_variables') or [None])[0]
+                    tasks.append((dataset_id, confounder, df_encoded, column_names))
+            print(f"正在用进程池对 {len(tasks)} 个数据集运行PC算法...")
+            results = run_pc_batch(tasks, discover_causal_structure, max_workers=args.workers)
+            print_batch_results(results)
+            if args.truth:
+                metrics, evaluated = evaluate_results(results, load_truth_graph(args.truth))
+                print_summary(summarize(metrics), os.path.basename(json_file_path), len(evaluated),
+                              failed=len(results) - len(evaluated))
+            if args.output:
+                save_batch_results(results, args.output)
+        elif isinstance(frames, list) and len(frames) > 0 and args.bootstrap > 0:
+            all_results = []
+            for dataset_id, (meta, df) in enumerate(frames):
+                df_encoded, column_names = preprocess_dataset(df)
+                print(f"正在对数据集 {dataset_id} 进行 {args.bootstrap} 次自助重采样并并行运行PC算法...")
+                result = bootstrap_edges(df_encoded.to_numpy(), column_names, n_boot=args.bootstrap,
+                                         max_workers=args.workers, seed=args.seed, alpha=0.05, indep_test='gsq')
+                print_stability_table(result)
+                all_results.append(dict(result, dataset_id=dataset_id,
+                                        confounder=(meta.get('confounder_variables') or [None])[0]))
+            if args.output:
+                save_stability_results(all_results, args.output)
+        elif isinstance(frames, list) and len(frames) > 0 and args.alphas:
+            alphas = [float(a) for a in args.alphas.split(',')]
+            for _, df in frames:
+                df_encoded, column_names = preprocess_dataset(df)
+                # 充分统计量与 p 值按数据集哈希缓存，各 alpha 之间只重复PC的搜索过程
+                print(f"正在以 {len(alphas)} 个 alpha 运行PC算法 (gsq)...")
+                results = alpha_sweep(df_encoded.to_numpy(), column_names, alphas, indep_test='gsq')
+                print("\nalpha 敏感性表:")
+                print_sensitivity_table(results)
+            info = cache_info()
+            print(f"\n统计量缓存: {info['datasets']} 个数据集, p 值命中 {info['pvalue_hits']} 次, 计算 {info['pvalue_misses']} 次")
+        elif isinstance(frames, list) and len(frames) > 0:
+            for _, df in frames:
     
-                # 数据清洗：移除不相关的'id'列 ---
-                if 'id' in df.columns:
-                    df = df.drop('id', axis=1)
-                    print("已移除'id'列，因为它不参与因果分析。")
-
-                # 数据预处理：标签编码 ---
-                # 我们需要将所有列从类别型（字符串、布尔值）转换为数值型（整数）
-                df_encoded = df.apply(LabelEncoder().fit_transform)
+                df_encoded, column_names = preprocess_dataset(df)
                 
-
                 # ## 处理完全相关列
                 # corr_matrix = df_encoded.corr().abs()
                 # upper_tri = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool))
@@ -60,8 +128,6 @@ def main():
                 #     print(f"警告: 检测到以下列存在完全相关性: {to_drop}")
                 #     print("将从分析中移除这些列以避免奇异矩阵错误。")
 
-                column_names = df_encoded.columns.tolist()
-
                 # 运行因果发现算法 ---
                 print("正在运行PC算法进行因果发现...")
                 causal_graph = discover_causal_structure(df_encoded, column_names)
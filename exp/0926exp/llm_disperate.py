@@ -1,12 +1,33 @@
-from openai import OpenAI
+from __future__ import annotations
+
 import os
+import sys
 import json
+import asyncio
+import argparse
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.async_runner import gather_limited, run_closing
+from common.llm_cache import ResponseCache, cached_completion, acached_completion
+from common.llm_decode import STATS as DECODE_STATS, decode_hypothesis, decode_datasets, validator
+from common.prompt_encoding import FORMATS as PROMPT_FORMATS, RowEncoding, token_report
+from common.checkpoint import JsonlCheckpoint
+from common.pair_scan import DATASETS, enumerate_subsets, parse_subsets, read_observations, scan_subsets
+from common.rate_limit import LLMScheduler, ThrottledClient, parse_model_limits
+from common.chunking import attach_row_ids, generate_in_batches
+
+# openai 只在创建客户端时导入，仅回放、扫描预览等路径不付出它的导入开销
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
 
 load_dotenv()
 
-def get_confounder_hypotheses(*variables: str, client: OpenAI):
+def build_confounder_prompt(*variables: str):
+    """
+    构造混淆变量假设生成的prompt，同步与异步调用共用。
+    """
 
     if len(variables) < 2:
         raise ValueError("请至少提供两个变量。")
@@ -79,20 +100,32 @@ def get_confounder_hypotheses(*variables: str, client: OpenAI):
     }}
     ```
     """
-    response = client.chat.completions.create(
-        model="glm-4.5-air",
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-        
-    )
+    return prompt
+
 
-    llm_hypotheses = response.choices[0].message.content
+def get_confounder_hypotheses(*variables: str, client: OpenAI,
+                              cache: ResponseCache | None = None, sample_index: int = 0):
+
+    prompt = build_confounder_prompt(*variables)
+    llm_hypotheses = cached_completion(client, "glm-4.5-air", prompt, cache=cache, sample_index=sample_index,
+                                       validate=validator(decode_hypothesis))
     return llm_hypotheses
 
 
-def data_llm(*variables: str, confounder_variables: list, var_list: list , client: OpenAI):
+async def aget_confounder_hypotheses(*variables: str, client: AsyncOpenAI,
+                                     cache: ResponseCache | None = None, sample_index: int = 0):
+    """
+    get_confounder_hypotheses 的异步版本，供并发模式使用。
+    """
+    prompt = build_confounder_prompt(*variables)
+    return await acached_completion(client, "glm-4.5-air", prompt, cache=cache, sample_index=sample_index,
+                                    validate=validator(decode_hypothesis))
+
 
+def build_data_prompt(*variables: str, confounder_variables: list, var_list: list, encoding: RowEncoding | None = None):
+    """
+    构造数据生成的prompt，同步与异步调用共用。观察数据按 encoding（默认 ROW_ENCODING）编码。
+    """
 
     if len(variables) < 2:
         raise ValueError("请至少提供两个变量。")
@@ -101,7 +134,7 @@ def data_llm(*variables: str, confounder_variables: list, var_list: list , clien
     else:
         variables_str = '、'.join([f'“{v}”' for v in variables[:]])
 
-    var_list_str = json.dumps(var_list, ensure_ascii=False, indent=2)
+    var_list_str = (encoding or ROW_ENCODING).encode(var_list, list(variables))
     confounder_variables_str = str(confounder_variables)
     
     # 使用 .format() 方法代替f-string，以安全地处理包含JSON示例的提示文本
@@ -157,112 +190,457 @@ def data_llm(*variables: str, confounder_variables: list, var_list: list , clien
         conf_vars_str=confounder_variables_str,
         var_list_str=var_list_str
     )
-    
-    response_data = client.chat.completions.create(
-        model="glm-4.5",
-        messages=[
-            {"role": "user", "content": prompt_data}
-        ],
-        temperature=0.8, #提高一点
+    if var_list and 'id' in var_list[0]:
+        # 分批模式下观察数据带有 id，要求LLM原样保留，以便按 id 合并各批次结果
+        prompt_data += """
+    **补充要求**: 观察数据中的每条记录都带有 id，data 中每条记录的 id 必须与对应观察记录的 id 完全一致，且每条观察记录恰好输出一次。
+    """
+    return prompt_data
 
-    )
-    llm_data = response_data.choices[0].message.content
+
+def data_llm(*variables: str, confounder_variables: list, var_list: list , client: OpenAI,
+             cache: ResponseCache | None = None, sample_index: int = 0):
+
+    prompt_data = build_data_prompt(*variables, confounder_variables=confounder_variables, var_list=var_list)
+    llm_data = cached_completion(client, "glm-4.5", prompt_data, cache=cache, sample_index=sample_index,
+                                 temperature=0.8, validate=validator(decode_datasets))
     return llm_data
 
 
-def chat_confounder(client, num_runs, first_results_list):    
+async def adata_llm(*variables: str, confounder_variables: list, var_list: list, client: AsyncOpenAI,
+                    cache: ResponseCache | None = None, sample_index: int = 0):
+    """
+    data_llm 的异步版本，供并发模式使用。
+    """
+    prompt_data = build_data_prompt(*variables, confounder_variables=confounder_variables, var_list=var_list)
+    return await acached_completion(client, "glm-4.5", prompt_data, cache=cache, sample_index=sample_index,
+                                    temperature=0.8, validate=validator(decode_datasets))
+
+
+## 观察变量设定
+OBSERVED_VARIABLES = ["X-ray Result", "Dyspnea Symptom"] # 修正变量名
+# 观察数据在数据生成prompt中的编码方式，由 --prompt-format / --short-names / --precision 设置
+ROW_ENCODING = RowEncoding()
+
+
+def parse_confounder_response(i, hypotheses_str):
+    """
+    解析第 i 次混淆变量生成调用的返回内容。
+
+    返回:
+        dict | None: 成功且存在混淆变量时返回带 id 的记录，LLM判断不存在混淆变量时返回 None。
+
+    解析失败时打印原因后重新抛出异常，调用方据此区分“无混淆变量”与“失败”，失败的运行不写入检查点。
+    """
+    try:
+        # 代码块标记、多余说明文字与常见格式错误统一由 llm_decode 处理
+        single_run_data = decode_hypothesis(hypotheses_str)
+        
+        # 检查LLM的判断，如果不存在混淆变量，则跳过本次结果
+        if not single_run_data.get("is_confounder", False):
+            print(f"第 {i + 1} 次调用：LLM判断不存在混淆变量，跳过记录。")
+            return None
+        
+        single_run_data['id'] = i + 1
+        print(f"第 {i + 1} 次调用成功并已记录混淆变量生成。")
+        return single_run_data
+
+    except json.JSONDecodeError as e:
+        # 如果某一次调用失败，打印错误信息并跳过，继续下一次调用
+        print(f"混淆变量生成第 {i + 1} 次调用时解析JSON失败: {e}")
+        print("原始字符串:", hypotheses_str)
+        raise
+    except Exception as e:
+        print(f"混淆变量生成第 {i + 1} 次调用时发生未知错误: {e}")
+        raise
+
+
+def chat_confounder(client, num_runs, first_results_list, cache=None, checkpoint=None):    
     
     for i in range(num_runs):
+        if checkpoint is not None and i + 1 in checkpoint.done:
+            continue
         
-        observed_variables = ["X-ray Result", "Dyspnea Symptom"] # 修正变量名
         # 使用 f-string 来格式化字符串，让输出更清晰
         print(f"Running LLM call {i + 1}/{num_runs}...")
         
-        
         try:
             # 将API调用移入try块，以便捕获网络或API错误
-            hypotheses_str = get_confounder_hypotheses(*observed_variables, client=client)
-            
-            # 同样需要处理LLM可能返回的代码块标记
-            if hypotheses_str.strip().startswith("```json"):
-                hypotheses_str = hypotheses_str.strip()[7:-3].strip()
-            
-            single_run_data = json.loads(hypotheses_str)
-            
-            # 检查LLM的判断，如果不存在混淆变量，则跳过本次结果
-            if not single_run_data.get("is_confounder", False):
-                print(f"第 {i + 1} 次调用：LLM判断不存在混淆变量，跳过记录。")
-                continue
-            
-            single_run_data['id'] = i + 1
-            
-            first_results_list.append(single_run_data)
-            print(f"第 {i + 1} 次调用成功并已记录混淆变量生成。")
-
-        except json.JSONDecodeError as e:
-            # 如果某一次调用失败，打印错误信息并跳过，继续下一次调用
-            print(f"混淆变量生成第 {i + 1} 次调用时解析JSON失败: {e}")
-            print("原始字符串:", hypotheses_str)
+            hypotheses_str = get_confounder_hypotheses(*OBSERVED_VARIABLES, client=client,
+                                                       cache=cache, sample_index=i + 1)
         except Exception as e:
             print(f"混淆变量生成第 {i + 1} 次调用时发生未知错误: {e}")
+            continue
+
+        try:
+            single_run_data = parse_confounder_response(i, hypotheses_str)
+        except Exception:
+            # 解析失败不写入检查点，--resume 时重新调用
+            continue
+        if checkpoint is not None:
+            checkpoint.write(i + 1, single_run_data)
+        if single_run_data is not None:
+            first_results_list.append(single_run_data)
+
+
+async def chat_confounder_async(client, num_runs, first_results_list, max_concurrency=8, cache=None, checkpoint=None):
+    """
+    chat_confounder 的并发版本：num_runs 次调用同时发出，最多 max_concurrency 个在途请求。
+    结果按运行序号写入 first_results_list，id 与串行模式一致。
+    """
+    run_ids = [i for i in range(num_runs) if checkpoint is None or i + 1 not in checkpoint.done]
+    print(f"并发发起 {len(run_ids)} 次混淆变量生成调用 (并发上限 {max_concurrency})...")
 
+    async def run_one(i):
+        hypotheses_str = await aget_confounder_hypotheses(*OBSERVED_VARIABLES, client=client,
+                                                          cache=cache, sample_index=i + 1)
+        try:
+            single_run_data = parse_confounder_response(i, hypotheses_str)
+        except Exception:
+            # 原因已打印；解析失败不写入检查点，--resume 时重新调用
+            return None
+        # 每次调用完成即写入检查点，不等待整批结束
+        if checkpoint is not None:
+            checkpoint.write(i + 1, single_run_data)
+        return single_run_data
+
+    results = await gather_limited([lambda i=i: run_one(i) for i in run_ids], max_concurrency=max_concurrency)
+
+    for i, single_run_data in zip(run_ids, results):
+        if isinstance(single_run_data, Exception):
+            print(f"混淆变量生成第 {i + 1} 次调用时发生未知错误: {single_run_data}")
+            continue
+        if single_run_data is not None:
+            first_results_list.append(single_run_data)
+
+
+def prepare_data_request(hypothesis, max_rows=200, csv_path=None):
+    """
+    从单个假设中提取混淆变量信息、观察变量名以及对应的观察数据。
+
+    参数:
+        hypothesis (dict): 单次运行的混淆变量假设。
+        max_rows (int | None): 使用的观察数据行数，为 None 时使用全部数据。
+        csv_path (str | None): 观察数据文件，默认为 cancer 数据集；扫描模式下假设带有 columns 字段，指明使用的列。
+
+    返回:
+        tuple: (confounder_info, observed_vars, var_list)
+    """
+    # 从假设中提取信息
+    confounder_info = hypothesis['Probability'][0]
+    
+    ## 提取变量名称
+    observed_vars = hypothesis['variables']
     
+    # 读取原始数据
+    df = read_observations(csv_path or DATASETS['cancer']['csv'])
+    df_subset = df[hypothesis.get('columns', ['Xray', 'Dyspnoea'])]
+    if max_rows is not None:
+        df_subset = df_subset.head(max_rows)
+
+    # 重命名列以匹配假设
+    df_subset.columns = observed_vars
+
+    # 将DataFrame转换为字典列表
+    var_list = df_subset.to_dict(orient='records')
+    return confounder_info, observed_vars, var_list
+
 
+def parse_data_response(data_str):
+    """
+    去除代码块标记、修复常见格式错误并将LLM返回的数据生成结果解析为数据集列表。
+    """
+    return decode_datasets(data_str)
+
+
+def _record_data_result(i, data_str, data_list, checkpoint=None, key=None, variables=()):
+    """
+    解析第 i 个假设的数据生成结果并追加到 data_list，串行与并发模式共用。
+    """
+    try:
+        json_run_data = ROW_ENCODING.expand(parse_data_response(data_str), variables)
         
+        data_list.extend(json_run_data)
+        if checkpoint is not None:
+            checkpoint.write(key, json_run_data)
+        print(f"为第 {i + 1} 个假设生成数据成功。")
 
-def chat_data(client, hypotheses_list, data_list):
+    except Exception as e:
+        print(f"为第 {i + 1} 个假设生成数据时发生未知错误: {e}")
+
+
+def chat_data(client, hypotheses_list, data_list, cache=None, max_rows=200, checkpoint=None):
     for i, hypothesis in enumerate(hypotheses_list):
         print(f"为第 {i + 1}/{len(hypotheses_list)} 个假设生成数据...")
         try:
-            # 从假设中提取信息
-            confounder_info = hypothesis['Probability'][0]
-            
-            ## 提取变量名称
-            observed_vars = hypothesis['variables']
+            confounder_info, observed_vars, var_list = prepare_data_request(hypothesis, max_rows=max_rows)
             
-            # 读取原始数据
-            df = pd.read_csv('oringnal_data/bnlearn_generate/generated_cancer_dataset.csv')
-            df_subset = df[['Xray', 'Dyspnoea']].head(200)
+            # 调用LLM生成数据
+            data_str = data_llm(*observed_vars, confounder_variables=confounder_info, var_list=var_list, client=client,
+                                cache=cache, sample_index=hypothesis.get('id', i + 1))
+        except Exception as e:
+            print(f"为第 {i + 1} 个假设生成数据时发生未知错误: {e}")
+            continue
 
-            # 重命名列以匹配假设
-            df_subset.columns = observed_vars
+        _record_data_result(i, data_str, data_list, checkpoint=checkpoint, key=hypothesis.get('id', i + 1),
+                            variables=observed_vars)
 
-            # 将DataFrame转换为字典列表
-            var_list = df_subset.to_dict(orient='records')
-            
-            # 调用LLM生成数据
-            data_str = data_llm(*observed_vars, confounder_variables=confounder_info, var_list=var_list, client=client)
-            
-            if data_str.strip().startswith("```json"):
-                data_str = data_str.strip()[7:-3].strip()
-            json_run_data = json.loads(data_str)
-            
-            data_list.extend(json_run_data)
-            print(f"为第 {i + 1} 个假设生成数据成功。")
 
+async def chat_data_async(client, hypotheses_list, data_list, max_concurrency=8, cache=None, max_rows=200,
+                          checkpoint=None):
+    """
+    chat_data 的并发版本：每个假设一次数据生成调用，全部并发发出。
+    结果按假设顺序写入 data_list，输出结构与串行模式一致。
+    """
+    async def run_one(i, key, variables, request):
+        # 每个假设完成即解析并写入检查点；结果先放入各自的列表，最后按假设顺序合并
+        datasets = []
+        _record_data_result(i, await request, datasets, checkpoint=checkpoint, key=key, variables=variables)
+        return datasets
+
+    indices, factories = [], []
+    for i, hypothesis in enumerate(hypotheses_list):
+        try:
+            confounder_info, observed_vars, var_list = prepare_data_request(hypothesis, max_rows=max_rows)
         except Exception as e:
-            print(f"为第 {i + 1} 个假设生成数据时发生未知错误: {e}")
+            # 与串行模式一致，只跳过该假设，不影响其余假设的并发请求
+            print(f"为第 {i + 1} 个假设准备数据生成请求时发生错误，已跳过: {e}")
+            continue
+        indices.append(i)
+        factories.append(
+            lambda i=i, o=observed_vars, c=confounder_info, v=var_list, k=hypothesis.get('id', i + 1):
+                run_one(i, k, o, adata_llm(*o, confounder_variables=c, var_list=v, client=client, cache=cache, sample_index=k))
+        )
+
+    print(f"正在并发为 {len(factories)} 个假设生成数据 (并发上限 {max_concurrency})...")
+    results = await gather_limited(factories, max_concurrency=max_concurrency)
+
+    for i, datasets in zip(indices, results):
+        if isinstance(datasets, Exception):
+            print(f"为第 {i + 1} 个假设生成数据时发生未知错误: {datasets}")
+            continue
+        data_list.extend(datasets)
+
+
+async def chat_data_chunked(client, hypotheses_list, data_list, batch_size, max_rows=None,
+                            max_concurrency=8, cache=None, max_retries=2, checkpoint=None):
+    """
+    分批生成数据：每个假设的观察数据按 batch_size 行切分并带上行号 id，所有假设的所有批次并发调用LLM，
+    返回结果按 id 合并回完整数据集；缺失的 id 会重新请求，最多 max_retries 轮。
+    输出结构与 chat_data 一致。
+    """
+    jobs = []
+    for i, hypothesis in enumerate(hypotheses_list):
+        try:
+            confounder_info, observed_vars, var_list = prepare_data_request(hypothesis, max_rows=max_rows)
+        except Exception as e:
+            print(f"为第 {i + 1} 个假设准备数据生成请求时发生错误，已跳过: {e}")
+            continue
+        jobs.append({
+            'index': i,
+            'key': hypothesis.get('id', i + 1),
+            'confounder_info': confounder_info,
+            'observed_vars': observed_vars,
+            'var_list': attach_row_ids(var_list),
+        })
+
+    def request_fn(job, batch, tag):
+        return adata_llm(*job['observed_vars'], confounder_variables=job['confounder_info'], var_list=batch,
+                         client=client, cache=cache, sample_index=tag)
+
+    results = await generate_in_batches(jobs, request_fn, parse_data_response, batch_size,
+                                        max_concurrency=max_concurrency, max_retries=max_retries)
+
+    for job, (merged, missing, duplicates) in zip(jobs, results):
+        i = job['index']
+        merged = ROW_ENCODING.expand(merged, job['observed_vars'])
+        if duplicates:
+            print(f"第 {i + 1} 个假设: LLM返回了 {len(duplicates)} 个重复 id，已保留首次出现的记录。")
+        if missing:
+            shown = ', '.join(str(m) for m in missing[:10]) + (' ...' if len(missing) > 10 else '')
+            print(f"警告: 第 {i + 1} 个假设在 {max_retries} 轮补发后仍缺失 {len(missing)} 条记录: {shown}")
+        if merged:
+            data_list.extend(merged)
+            if checkpoint is not None:
+                # 仍有缺失行的结果标记 missing，恢复时会重新生成该假设
+                checkpoint.write(job['key'], merged, **({'missing': missing} if missing else {}))
+            print(f"为第 {i + 1} 个假设生成数据成功，共 {sum(len(d['data']) for d in merged)} 条记录。")
+
+
+async def chat_scan(client, dataset, subsets, num_runs, out_dir, max_concurrency=8, cache=None, max_rows=200,
+                    resume=False):
+    """
+    全组合扫描：对 dataset 的每个变量组合生成 num_runs 次混淆变量假设及对应数据。
+    所有组合的假设与数据生成任务共用一个工作队列，结果按组合分别写入 out_dir 下的子目录。
+    """
+    names = DATASETS[dataset]['names']
+    csv_path = DATASETS[dataset]['csv']
+
+    async def hypothesis_fn(subset, run_id):
+        variables = [names[c] for c in subset]
+        hypotheses_str = await aget_confounder_hypotheses(*variables, client=client,
+                                                          cache=cache, sample_index=run_id)
+        single_run_data = parse_confounder_response(run_id - 1, hypotheses_str)
+        if single_run_data is not None:
+            # 以数据集的变量全称为准，并记录对应的数据列，数据生成阶段据此取观察数据
+            single_run_data['variables'] = variables
+            single_run_data['columns'] = list(subset)
+        return single_run_data
+
+    async def data_fn(subset, hypothesis):
+        confounder_info, observed_vars, var_list = prepare_data_request(hypothesis, max_rows=max_rows, csv_path=csv_path)
+        data_str = await adata_llm(*observed_vars, confounder_variables=confounder_info, var_list=var_list,
+                                   client=client, cache=cache, sample_index=hypothesis['id'])
+        datasets = parse_data_response(data_str)
+        return ROW_ENCODING.expand(datasets, observed_vars)
+
+    return await scan_subsets(subsets, num_runs, hypothesis_fn, data_fn, out_dir,
+                              max_concurrency=max_concurrency, resume=resume)
+
 
+DEFAULT_BASE_URL = "https://open.bigmodel.cn/api/paas/v4/"
+
+
+def create_client(use_async=False, base_url=None, scheduler=None):
+    """
+    创建LLM客户端。异步客户端绑定在创建它的事件循环上，因此每个 asyncio.run 阶段单独创建。
+    base_url 指向其他服务（如 common/mock_llm_server.py）时，未设置 OPENAI_API_KEY 也可运行。
+    传入 scheduler 时由其负责限流与重试，客户端自带的重试关闭。
+    """
+    from openai import OpenAI, AsyncOpenAI
+
+    client_cls = AsyncOpenAI if use_async else OpenAI
+    base_url = base_url or DEFAULT_BASE_URL
+    api_key = os.getenv("OPENAI_API_KEY") or (None if base_url == DEFAULT_BASE_URL else "mock")
+    client = client_cls(
+        base_url=base_url,
+        api_key=api_key,       
+        max_retries=0 if scheduler is not None else 2,
+    )
+    if scheduler is None:
+        return client
+    return ThrottledClient(client, scheduler, use_async=use_async)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="调用LLM生成混淆变量假设及对应的离散型数据。")
+    parser.add_argument("--num-runs", type=int, default=1, help="混淆变量生成的调用次数")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="使用AsyncOpenAI并发执行两个阶段的调用")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="并发模式下同时在途的请求数上限")
+    parser.add_argument("--rows", type=int, default=200, help="使用的观察数据行数，0 表示使用全部数据")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="大于0时启用分批模式：观察数据按该行数切分并发生成，再按 id 合并")
+    parser.add_argument("--max-retries", type=int, default=2, help="分批模式下对缺失 id 重新请求的最大轮数")
+    parser.add_argument("--cache-dir", default=".llm_cache", help="LLM响应缓存目录")
+    parser.add_argument("--cache-max-mb", type=float, default=512, help="缓存容量上限 (MB)，超出后按LRU淘汰")
+    parser.add_argument("--no-cache", action="store_true", help="关闭响应缓存，每次都调用API")
+    parser.add_argument("--replay-only", action="store_true", help="仅回放缓存中的响应，不调用API (离线复现分析)")
+    parser.add_argument("--base-url", default=None,
+                        help="OpenAI 兼容服务地址，默认为智谱API；离线压测时指向 common/mock_llm_server.py")
+    parser.add_argument("--model-limit", action="append", default=[], metavar="MODEL=RPM[:TPM]",
+                        help="覆盖某个模型的每分钟请求数/token数限额，可重复，如 glm-4.5=30:100000")
+    parser.add_argument("--max-requests", type=int, default=None, help="全局请求数预算（含重试），用完后不再发出请求")
+    parser.add_argument("--max-tokens", type=int, default=None, help="全局token预算，用完后不再发出请求")
+    parser.add_argument("--max-attempts", type=int, default=6, help="单次调用遇到429/5xx/超时时的最大尝试次数")
+    parser.add_argument("--prompt-format", choices=PROMPT_FORMATS, default="json",
+                        help="观察数据在数据生成prompt中的编码：json(原缩进格式)、json-compact、csv")
+    parser.add_argument("--short-names", action="store_true",
+                        help="观察变量列名在prompt与输出中使用 X1、X2… 简写，解码后映射回原名")
+    parser.add_argument("--precision", type=int, default=None, help="观察数据浮点数保留的小数位数")
+    parser.add_argument("--token-report", action="store_true",
+                        help="数据生成前打印各种编码下prompt的token数对比")
+    parser.add_argument("--checkpoint-dir", default="outcome/926_outcome/checkpoints",
+                        help="JSONL检查点目录，每完成一次调用即追加一条记录")
+    parser.add_argument("--no-checkpoint", action="store_true", help="关闭检查点，结果只在结束时写出")
+    parser.add_argument("--resume", action="store_true", help="从检查点恢复，跳过已完成的运行id与假设")
+    parser.add_argument("--fsync-every", type=int, default=20, help="检查点每写入多少条记录 fsync 一次")
+    parser.add_argument("--no-throttle", action="store_true", help="关闭限流与退避重试，直接使用原始客户端")
+    parser.add_argument("--scan", choices=['cancer', 'asia'], default=None,
+                        help="全组合扫描：对该数据集的变量组合逐一生成假设与数据，结果按组合写入 --scan-dir")
+    parser.add_argument("--scan-k", type=int, default=2, help="扫描的组合大小，默认两两组合")
+    parser.add_argument("--scan-subsets", default=None, metavar="A+B,C+D+E",
+                        help="只扫描指定的组合（数据集列名，用+连接，逗号分隔），默认枚举全部 k 元组")
+    parser.add_argument("--scan-dir", default=None, help="扫描结果目录，默认为 outcome/926_outcome/scan/<数据集>")
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
+    args = parse_args()
+
     ## 所有假说列表
     all_hypotheses_data = [] 
     all_data = []
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024),
+                              replay_only=args.replay_only)
+    # 仅回放模式下不需要API密钥，也不会创建客户端
+    # 两个阶段、同步与异步客户端共用一个调度器，限流状态与预算在整个运行中累计
+    scheduler = None
+    if not args.no_throttle and not args.replay_only:
+        scheduler = LLMScheduler(parse_model_limits(args.model_limit), max_requests=args.max_requests,
+                                 max_tokens=args.max_tokens, max_attempts=args.max_attempts)
+    if args.replay_only:
+        make_client = lambda use_async=False: None
+    else:
+        make_client = lambda use_async=False: create_client(use_async=use_async, base_url=args.base_url,
+                                                            scheduler=scheduler)
+
+    def run_async(stage, *stage_args, **stage_kwargs):
+        # 每个 asyncio.run 阶段使用新的异步客户端，并在该阶段的事件循环关闭前关闭它
+        client = make_client(use_async=True)
+        return asyncio.run(run_closing(client, stage(client, *stage_args, **stage_kwargs)))
+
+    max_rows = args.rows if args.rows > 0 else None
+    ROW_ENCODING = RowEncoding(args.prompt_format, short_names=args.short_names, precision=args.precision)
+
+    if args.scan:
+        # 全组合扫描独立于单组合流程：结果按组合写入扫描目录，--resume 时跳过已完成的组合
+        columns = list(DATASETS[args.scan]['names'])
+        selected = parse_subsets(args.scan_subsets) if args.scan_subsets else None
+        subsets = enumerate_subsets(columns, k=args.scan_k, selected=selected)
+        scan_dir = args.scan_dir or os.path.join("outcome/926_outcome/scan", args.scan)
+        try:
+            run_async(chat_scan, args.scan, subsets, num_runs=args.num_runs,
+                      out_dir=scan_dir, max_concurrency=args.max_concurrency, cache=cache,
+                      max_rows=max_rows, resume=args.resume)
+        finally:
+            DECODE_STATS.print_stats()
+            if cache is not None:
+                cache.print_stats()
+            if scheduler is not None:
+                scheduler.print_stats()
+        sys.exit(0)
+
+    # 两个阶段各一个追加写检查点；--resume 时载入已完成的记录并跳过
+    hyp_ckpt = data_ckpt = None
+    if not args.no_checkpoint:
+        hyp_ckpt = JsonlCheckpoint(os.path.join(args.checkpoint_dir, 'hypotheses.jsonl'), resume=args.resume,
+                                   fsync_every=args.fsync_every)
+        data_ckpt = JsonlCheckpoint(os.path.join(args.checkpoint_dir, 'data.jsonl'), resume=args.resume,
+                                    fsync_every=args.fsync_every)
+        if args.resume:
+            print(f"从检查点恢复: 已完成 {len(hyp_ckpt.done)} 次混淆变量调用、{len(data_ckpt.done)} 个假设的数据生成")
     
-    client = OpenAI(
-        base_url="https://open.bigmodel.cn/api/paas/v4/",
-        api_key=os.getenv("OPENAI_API_KEY"),       
-    )
     try:
         ## 运行数量
-        chat_confounder(client, num_runs=1, first_results_list=all_hypotheses_data)
+        if args.use_async:
+            run_async(chat_confounder_async, num_runs=args.num_runs,
+                      first_results_list=all_hypotheses_data, max_concurrency=args.max_concurrency, cache=cache,
+                      checkpoint=hyp_ckpt)
+        else:
+            chat_confounder(make_client(), num_runs=args.num_runs, first_results_list=all_hypotheses_data, cache=cache,
+                            checkpoint=hyp_ckpt)
         
     except Exception as e:
         print(f"\n程序发生严重错误: {e}")
 
     finally:
         # finally块确保无论是否发生异常，都会执行这部分代码
+        if hyp_ckpt is not None:
+            # 以检查点为准（包含此前运行中已完成的记录），按运行id排序
+            all_hypotheses_data = hyp_ckpt.collect(sorted(hyp_ckpt.done))
         if all_hypotheses_data:
             output_filename = "outcome/926_outcome/var_glm_output_test.json"
 
@@ -276,15 +654,49 @@ if __name__ == '__main__':
     
     ## 第二次调用，进行数据集生成
     try:
+        if args.token_report and all_hypotheses_data:
+            # 以第一个假设的请求为样本比较各编码；分批模式下按单批的行数与带 id 的记录比较
+            confounder_info, observed_vars, var_list = prepare_data_request(all_hypotheses_data[0], max_rows=max_rows)
+            if args.batch_size > 0:
+                var_list = attach_row_ids(var_list)[:args.batch_size]
+            token_report(lambda encoding, rows: build_data_prompt(*observed_vars, confounder_variables=confounder_info,
+                                                                  var_list=rows, encoding=encoding),
+                         var_list, observed_vars)
         # 确保有假设数据后再进行
-        if all_hypotheses_data:
-            chat_data(client, hypotheses_list=all_hypotheses_data, data_list=all_data)
+        pending_hypotheses = [h for h in all_hypotheses_data
+                              if data_ckpt is None or not data_ckpt.is_done(h.get('id'))]
+        if data_ckpt is not None and len(pending_hypotheses) < len(all_hypotheses_data):
+            print(f"跳过 {len(all_hypotheses_data) - len(pending_hypotheses)} 个已在检查点中完成的假设。")
+        if pending_hypotheses:
+            if args.batch_size > 0:
+                run_async(chat_data_chunked, hypotheses_list=pending_hypotheses,
+                          data_list=all_data, batch_size=args.batch_size, max_rows=max_rows,
+                          max_concurrency=args.max_concurrency, cache=cache, max_retries=args.max_retries,
+                          checkpoint=data_ckpt)
+            elif args.use_async:
+                run_async(chat_data_async, hypotheses_list=pending_hypotheses,
+                          data_list=all_data, max_concurrency=args.max_concurrency, cache=cache,
+                          max_rows=max_rows, checkpoint=data_ckpt)
+            else:
+                chat_data(make_client(), hypotheses_list=pending_hypotheses, data_list=all_data, cache=cache,
+                          max_rows=max_rows, checkpoint=data_ckpt)
     except Exception as e:
         print(f"\n程序发生严重错误: {e}")
 
     finally:
+        if data_ckpt is not None:
+            keys = [h.get('id') for h in all_hypotheses_data]
+            all_data = data_ckpt.collect(keys)
+            hyp_ckpt.close()
+            data_ckpt.close()
         if all_data:
             output_data_filename = "outcome/926_outcome/data_glm_data_test.json"
             with open(output_data_filename, 'w', encoding='utf-8') as f:
                 json.dump(all_data, f, indent=4, ensure_ascii=False)
             print(f"\n所有 {len(all_data)} 次运行的结果已成功保存到文件: {output_data_filename}")
+
+        DECODE_STATS.print_stats()
+        if cache is not None:
+            cache.print_stats()
+        if scheduler is not None:
+            scheduler.print_stats()
@@ -1,26 +1,64 @@
 ## 分析由LLM直接生成的连续型数据中的因果效应
 
 import os
-import json
+import sys
+import argparse
 import pandas as pd
 import numpy as np
-from causallearn.search.ConstraintBased.PC import pc
 from sklearn.preprocessing import StandardScaler
 
-def discover_causal_structure(data, node_names):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import load_frames
+from common.pc_batch import discover_causal_structure, run_pc_batch, print_batch_results, save_batch_results
+from common.graph_eval import evaluate_results, load_truth_graph, print_summary, summarize
+from common.ci_stats import alpha_sweep, print_sensitivity_table, cache_info
+from common.bootstrap import bootstrap_edges, print_stability_table, save_stability_results
+
+def preprocess_dataset(df):
     """
-    对给定的数据集运行PC因果发现算法。
+    移除 id 列并对连续数据进行标准化，返回 (处理后的DataFrame, 列名列表)。
     """
-    data_np = data.to_numpy()
-    cg = pc(data_np, alpha=0.05, node_names=node_names)
-    return cg
+    # 数据清洗：移除不相关的'id'列
+    if 'id' in df.columns:
+        df = df.drop('id', axis=1)
+        print("已移除'id'列，因为它不参与因果分析。")
+
+    # 数据预处理：对连续数据进行标准化
+    # 连续数据通常需要标准化以确保PC算法的最佳性能
+    print("正在对连续数据进行标准化...")
+    scaler = StandardScaler()
+    
+    df_scaled = pd.DataFrame(
+        scaler.fit_transform(df), 
+        columns=df.columns,
+        index=df.index
+    )
+    
+    # 转换为标准列
+    column_names = df_scaled.columns.tolist()
+    print(f"数据预处理完成。最终数据维度: {df_scaled.shape}")
+    print(f"变量列表: {column_names}")
+    return df_scaled, column_names
 
 def main():
     """
     主函数，加载LLM直接生成的连续型数据文件，执行因果发现并打印结果。
     """
-    # 定义新的输入文件路径
-    json_file_path = 'outcome/927_outcome/final_data.json'
+    parser = argparse.ArgumentParser(description="对LLM生成的数据集运行PC算法。")
+    parser.add_argument("--input", default='outcome/927_outcome/final_data.json',
+                        help="JSON文件，或 common/columnar.py 写出的列式目录（内存映射读取）")
+    parser.add_argument("--batch", action="store_true", help="批量模式：用进程池并行分析文件中的全部数据集")
+    parser.add_argument("--workers", type=int, default=None, help="批量模式与自助重采样模式的进程数，默认使用全部CPU核心")
+    parser.add_argument("--output", default=None, help="批量模式或自助重采样模式下保存结构化结果的JSON文件")
+    parser.add_argument("--truth", default=None,
+                        help="批量模式下与真实结构比较并输出 SHD、邻接/方向 P/R/F1 汇总表，如 sachs（也可为 .bif 或JSON文件）")
+    parser.add_argument("--alphas", default=None,
+                        help="以逗号分隔的显著性水平，如 0.01,0.05,0.1；给出时对每个数据集做 alpha 敏感性分析")
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="自助重采样次数；大于0时并行运行PC并报告每条边及其方向的出现频率")
+    parser.add_argument("--seed", type=int, default=0, help="自助重采样的随机种子")
+    args = parser.parse_args()
+    json_file_path = args.input
     
     if not os.path.exists(json_file_path):
         print(f"错误: 数据文件 '{json_file_path}' 不存在。")
@@ -32,34 +70,50 @@ def main():
 
     # --- 1. 加载并解析JSON数据 ---
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            json_content = json.load(f)
+        frames = load_frames(json_file_path)
         
-        if isinstance(json_content, list) and len(json_content) > 0:
-            for data in json_content:
-                data_list = data.get('data', [])
-                df = pd.DataFrame(data_list)
+        if isinstance(frames, list) and len(frames) > 0 and args.batch:
+            tasks = []
+            for dataset_id, (meta, df) in enumerate(frames):
+                df_scaled, column_names = preprocess_dataset(df)
+                confounder = (meta.get('confounder_variables') or [None])[0]
+                tasks.append((dataset_id, confounder, df_scaled, column_names))
+            print(f"正在用进程池对 {len(tasks)} 个数据集运行PC算法...")
+            results = run_pc_batch(tasks, discover_causal_structure, max_workers=args.workers)
+            print_batch_results(results)
+            if args.truth:
+                metrics, evaluated = evaluate_results(results, load_truth_graph(args.truth))
+                print_summary(summarize(metrics), os.path.basename(json_file_path), len(evaluated),
+                              failed=len(results) - len(evaluated))
+            if args.output:
+                save_batch_results(results, args.output)
+        elif isinstance(frames, list) and len(frames) > 0 and args.bootstrap > 0:
+            all_results = []
+            for dataset_id, (meta, df) in enumerate(frames):
+                df_scaled, column_names = preprocess_dataset(df)
+                print(f"正在对数据集 {dataset_id} 进行 {args.bootstrap} 次自助重采样并并行运行PC算法...")
+                result = bootstrap_edges(df_scaled.to_numpy(), column_names, n_boot=args.bootstrap,
+                                         max_workers=args.workers, seed=args.seed, alpha=0.05)
+                print_stability_table(result)
+                all_results.append(dict(result, dataset_id=dataset_id,
+                                        confounder=(meta.get('confounder_variables') or [None])[0]))
+            if args.output:
+                save_stability_results(all_results, args.output)
+        elif isinstance(frames, list) and len(frames) > 0 and args.alphas:
+            alphas = [float(a) for a in args.alphas.split(',')]
+            for _, df in frames:
+                df_scaled, column_names = preprocess_dataset(df)
+                # 充分统计量与 p 值按数据集哈希缓存，各 alpha 之间只重复PC的搜索过程
+                print(f"正在以 {len(alphas)} 个 alpha 运行PC算法 (fisherz)...")
+                results = alpha_sweep(df_scaled.to_numpy(), column_names, alphas, indep_test='fisherz')
+                print("\nalpha 敏感性表:")
+                print_sensitivity_table(results)
+            info = cache_info()
+            print(f"\n统计量缓存: {info['datasets']} 个数据集, p 值命中 {info['pvalue_hits']} 次, 计算 {info['pvalue_misses']} 次")
+        elif isinstance(frames, list) and len(frames) > 0:
+            for _, df in frames:
     
-                # 数据清洗：移除不相关的'id'列
-                if 'id' in df.columns:
-                    df = df.drop('id', axis=1)
-                    print("已移除'id'列，因为它不参与因果分析。")
-
-                # 数据预处理：对连续数据进行标准化
-                # 连续数据通常需要标准化以确保PC算法的最佳性能
-                print("正在对连续数据进行标准化...")
-                scaler = StandardScaler()
-                
-                df_scaled = pd.DataFrame(
-                    scaler.fit_transform(df), 
-                    columns=df.columns,
-                    index=df.index
-                )
-                
-                # 转换为标准列
-                column_names = df_scaled.columns.tolist()
-                print(f"数据预处理完成。最终数据维度: {df_scaled.shape}")
-                print(f"变量列表: {column_names}")
+                df_scaled, column_names = preprocess_dataset(df)
 
                 # 运行因果发现算法
                 print("正在运行PC算法进行因果发现...")
@@ -1,26 +1,56 @@
 import json
 import os
+import sys
+import argparse
 import pandas as pd
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.columnar import FORMATS, is_columnar, load_frames, save_frames, frame_to_records
+from common.canonical import CanonicalIndex
+
+# 分布类型关键词，按顺序匹配
+DISTRIBUTION_KEYWORDS = {
+    "normal": ["正态", "normal", "gaussian", "高斯"],
+    "bernoulli": ["伯努利", "bernoulli"],
+    "uniform": ["均匀", "uniform"],
+    "categorical": ["分类", "categorical"],
+}
+
+_family_cache = {}
+
+def classify_distribution(dist_type):
+    """
+    将LLM给出的分布类型字符串归类为 normal / bernoulli / uniform / categorical，无法识别时返回 None。
+    同一字符串只匹配一次，结果会被缓存。
+    """
+    if dist_type not in _family_cache:
+        lowered = str(dist_type).lower() # 转换为小写以进行不区分大小写的匹配
+        _family_cache[dist_type] = next(
+            (family for family, keywords in DISTRIBUTION_KEYWORDS.items()
+             if any(keyword in lowered for keyword in keywords)),
+            None,
+        )
+    return _family_cache[dist_type]
+
 def sample_from_distribution(record, confounder_name):
     """
     根据单条记录中的分布类型和参数，生成一个随机样本。
     """
-    
+
     dist_type_key = f"{confounder_name}分布类型"
-    
+
     # 检查是否存在对应的分布类型
     if dist_type_key not in record or confounder_name not in record:
         # 正常情况：如果已经是最终数据，则跳过
         return record.get(confounder_name)
 
-    dist_type = record[dist_type_key].lower() # 转换为小写以进行不区分大小写的匹配
+    family = classify_distribution(record[dist_type_key])
     params = record[confounder_name]
-
+    sampled_value = None
 
     # 使用更鲁棒的关键词匹配
-    if any(keyword in dist_type for keyword in ["正态", "normal", "gaussian", "高斯"]):
+    if family == "normal":
         # 【修正】同时兼容 'mean'/'std' 和 'mu'/'sigma' 两种参数名
         mean = params.get("mean", params.get("mu", 0))
         std = params.get("std", params.get("sigma", 1))
@@ -28,19 +58,19 @@ def sample_from_distribution(record, confounder_name):
             print(f"警告: 标准差为负数 ({std})。将使用其绝对值。")
             std = abs(std)
         sampled_value = np.random.normal(loc=mean, scale=std)
-    
+
     # 伯努利
-    elif any(keyword in dist_type for keyword in ["伯努利", "bernoulli"]):
+    elif family == "bernoulli":
         p = params.get("p", 0.5) # 成功（即为1）的概率
         sampled_value = np.random.binomial(1, p)
-    
+
     # 均匀
-    elif any(keyword in dist_type for keyword in ["均匀", "uniform"]):
+    elif family == "uniform":
         low = params.get("low", 0)
         high = params.get("high", 1)
         sampled_value = np.random.uniform(low=low, high=high)
     # 分类
-    elif any(keyword in dist_type for keyword in ["分类", "categorical"]):
+    elif family == "categorical":
         categories = params.get("categories", [])
         probabilities = params.get("probabilities", [])
         if categories and probabilities and len(categories) == len(probabilities):
@@ -53,58 +83,315 @@ def sample_from_distribution(record, confounder_name):
 
     return sampled_value
 
+def sample_record(record, confounder_name):
+    """
+    对单条记录采样，用采样值替换参数字典并移除分布类型字段（原地修改）。
+
+    返回:
+        bool: 替换成功返回 True。
+    """
+    new_value = sample_from_distribution(record, confounder_name)
+
+    if new_value is not None:
+        # 用采样值替换参数字典
+        record[confounder_name] = new_value
+
+        # 移除分布类型字段
+        dist_type_key = f"{confounder_name}分布类型"
+        if dist_type_key in record:
+            del record[dist_type_key]
+
+    return not isinstance(record.get(confounder_name), dict)
+
+def _param_array(params_list, names, default):
+    # 依次尝试多个参数名（如 'mean'/'mu'），取第一个存在的值；缺失时取默认值。
+    # 与列式路径的 _param_column 一样按数值转换，存在但无法转换的值（"N/A"、None 等）记为无效，
+    # 返回 (数值数组, 无效掩码)，无效处填默认值以免影响同批其他记录的采样
+    def pick(params):
+        for name in names:
+            if name in params:
+                return params[name]
+        return default
+    raw = pd.Series([pick(p) for p in params_list], dtype=object)
+    values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=float)
+    bad = np.isnan(values)
+    return np.where(bad, default, values), bad
+
+def _sample_categorical(params_list, rng):
+    """
+    分类分布的批量采样：按类别数分组，对归一化后的累积概率做一次逆变换采样。
+    参数不完整的记录返回 None。
+    """
+    values = [None] * len(params_list)
+    groups = {}
+    for i, params in enumerate(params_list):
+        categories = params.get("categories", [])
+        probabilities = params.get("probabilities", [])
+        if categories and probabilities and len(categories) == len(probabilities):
+            groups.setdefault(len(categories), []).append(i)
+
+    for k, idx in groups.items():
+        probs = np.array([params_list[i]["probabilities"] for i in idx], dtype=float).reshape(len(idx), k)
+        probs = np.clip(probs, 0, None)
+        totals = probs.sum(axis=1, keepdims=True)
+        probs = np.divide(probs, totals, out=np.full_like(probs, 1.0 / k), where=totals > 0)
+        cdf = np.cumsum(probs, axis=1)
+        picks = (rng.random(len(idx))[:, None] > cdf).sum(axis=1)
+        picks = np.minimum(picks, k - 1)
+        for j, i in enumerate(idx):
+            values[i] = params_list[i]["categories"][picks[j]]
+    return values
+
+def sample_batch(records, confounder_name, rng):
+    """
+    对一个数据集的全部记录做向量化采样：分布类型只归类一次，按分布族分组后各用一次NumPy调用完成采样。
+
+    参数:
+        records (list): 数据记录列表，混淆变量字段为参数字典。
+        confounder_name (str): 混淆变量名称。
+        rng (np.random.Generator): 随机数生成器。
+
+    返回:
+        tuple: (values, stats)。values 是与 records 等长的采样值列表，无法采样的记录为 None；
+            stats 记录各分布族的数量以及负标准差、未知类型、参数缺失的计数。
+    """
+    dist_type_key = f"{confounder_name}分布类型"
+    n = len(records)
+    values = [None] * n
+    stats = {"normal": 0, "bernoulli": 0, "uniform": 0, "categorical": 0,
+             "negative_std": 0, "unknown_type": 0, "bad_params": 0, "unknown_types": set()}
+
+    # 按分布族分组记录下标
+    groups = {}
+    for i, record in enumerate(records):
+        params = record.get(confounder_name)
+        if dist_type_key not in record or not isinstance(params, dict):
+            # 已经是最终数据，保持原值
+            values[i] = params
+            continue
+        family = classify_distribution(record[dist_type_key])
+        if family is None:
+            stats["unknown_type"] += 1
+            stats["unknown_types"].add(record[dist_type_key])
+            continue
+        groups.setdefault(family, []).append(i)
+
+    for family, idx in groups.items():
+        idx = np.asarray(idx)
+        params_list = [records[i][confounder_name] for i in idx]
+        stats[family] += len(idx)
+
+        bad = np.zeros(len(idx), dtype=bool)
+        if family == "normal":
+            mean, bad_mean = _param_array(params_list, ("mean", "mu"), 0.0)
+            std, bad_std = _param_array(params_list, ("std", "sigma"), 1.0)
+            bad = bad_mean | bad_std
+            stats["negative_std"] += int((std[~bad] < 0).sum())
+            drawn = rng.normal(loc=mean, scale=np.abs(std))
+        elif family == "bernoulli":
+            p, bad = _param_array(params_list, ("p",), 0.5)
+            drawn = rng.binomial(1, np.clip(p, 0.0, 1.0))
+        elif family == "uniform":
+            low, bad_low = _param_array(params_list, ("low",), 0.0)
+            high, bad_high = _param_array(params_list, ("high",), 1.0)
+            bad = bad_low | bad_high
+            drawn = rng.uniform(low=low, high=high)
+        else:
+            drawn = _sample_categorical(params_list, rng)
+            bad = np.array([v is None for v in drawn], dtype=bool)
+        stats["bad_params"] += int(bad.sum())
+
+        if isinstance(drawn, np.ndarray):
+            # 参数无效的记录不写采样值，保持为 None
+            drawn = [None if b else v for v, b in zip(drawn.tolist(), bad.tolist())]
+
+        for i, v in zip(idx.tolist(), drawn):
+            values[i] = v
+
+    return values, stats
+
+def _param_column(df, confounder_name, names, default):
+    # 列式数据中的参数列为 "<混淆变量>.<参数名>"；同一参数的多个别名按优先级合并
+    result = np.full(len(df), default, dtype=float)
+    for name in reversed(names):
+        col = f"{confounder_name}.{name}"
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+            mask = ~np.isnan(values)
+            result[mask] = values[mask]
+    return result
+
+def sample_frame(df, confounder_name, rng):
+    """
+    列式数据的批量采样：直接在 "<混淆变量>分布类型" 与 "<混淆变量>.<参数名>" 列上做向量化采样，
+    不经过逐条记录的字典。
+
+    返回:
+        tuple: (采样后的 DataFrame, stats)，stats 的含义同 sample_batch。
+    """
+    dist_col = f"{confounder_name}分布类型"
+    stats = {"normal": 0, "bernoulli": 0, "uniform": 0, "categorical": 0,
+             "negative_std": 0, "unknown_type": 0, "bad_params": 0, "unknown_types": set()}
+    if dist_col not in df.columns:
+        # 已经是最终数据
+        return df, stats
+
+    # 分布类型只对去重后的字符串归类一次
+    uniques, inverse = np.unique(df[dist_col].astype(str).to_numpy(), return_inverse=True)
+    families = np.array([classify_distribution(u) or "" for u in uniques], dtype=object)[inverse]
+    values = np.empty(len(df), dtype=object)
+
+    unknown = families == ""
+    stats["unknown_type"] = int(unknown.sum())
+    stats["unknown_types"] = set(uniques[np.unique(inverse[unknown])].tolist()) if unknown.any() else set()
+
+    mask = families == "normal"
+    if mask.any():
+        mean = _param_column(df, confounder_name, ("mean", "mu"), 0.0)[mask]
+        std = _param_column(df, confounder_name, ("std", "sigma"), 1.0)[mask]
+        stats["negative_std"] = int((std < 0).sum())
+        values[mask] = rng.normal(loc=mean, scale=np.abs(std))
+        stats["normal"] = int(mask.sum())
+
+    mask = families == "bernoulli"
+    if mask.any():
+        p = np.clip(_param_column(df, confounder_name, ("p",), 0.5)[mask], 0.0, 1.0)
+        values[mask] = rng.binomial(1, p)
+        stats["bernoulli"] = int(mask.sum())
+
+    mask = families == "uniform"
+    if mask.any():
+        low = _param_column(df, confounder_name, ("low",), 0.0)[mask]
+        high = _param_column(df, confounder_name, ("high",), 1.0)[mask]
+        values[mask] = rng.uniform(low=low, high=high)
+        stats["uniform"] = int(mask.sum())
+
+    mask = families == "categorical"
+    if mask.any():
+        cat_col, prob_col = f"{confounder_name}.categories", f"{confounder_name}.probabilities"
+        rows = df.loc[mask]
+        params_list = [
+            {"categories": list(c) if c is not None else [], "probabilities": list(p) if p is not None else []}
+            for c, p in zip(rows[cat_col] if cat_col in df.columns else [None] * len(rows),
+                            rows[prob_col] if prob_col in df.columns else [None] * len(rows))
+        ]
+        drawn = _sample_categorical(params_list, rng)
+        stats["bad_params"] = sum(v is None for v in drawn)
+        values[np.flatnonzero(mask)] = drawn
+        stats["categorical"] = int(mask.sum())
+
+    param_cols = [c for c in df.columns if c.startswith(f"{confounder_name}.")]
+    out = df.drop(columns=param_cols + [dist_col])
+    sampled = pd.Series(values, index=df.index)
+    numeric = pd.to_numeric(sampled, errors='coerce')
+    # 全部为数值时保存为数值列，便于后续直接标准化
+    out[confounder_name] = numeric if numeric.notna().sum() == sampled.notna().sum() else sampled
+    return out, stats
+
+def _report(confounder_name, total, failed, stats):
+    families = ", ".join(f"{k}={stats[k]}" for k in ("normal", "bernoulli", "uniform", "categorical") if stats[k])
+    print(f"混淆变量 '{confounder_name}': 采样 {total - failed}/{total} 条记录 ({families})")
+    if stats["negative_std"]:
+        print(f"  警告: {stats['negative_std']} 条记录的标准差为负数，已使用其绝对值。")
+    if stats["unknown_type"]:
+        print(f"  警告: {stats['unknown_type']} 条记录的分布类型无法识别: {sorted(stats['unknown_types'])}")
+    if stats["bad_params"]:
+        print(f"  警告: {stats['bad_params']} 条记录的分布参数无效、不完整或不匹配，未进行采样。")
+    if failed:
+        print(f"  错误: {failed} 条记录的参数替换失败！")
+
+def apply_samples(records, confounder_name, values):
+    """
+    用采样值替换记录中的参数字典并移除分布类型字段，返回替换失败的记录数。
+    """
+    dist_type_key = f"{confounder_name}分布类型"
+    failed = 0
+    for record, value in zip(records, values):
+        if value is None:
+            failed += 1
+            continue
+        record[confounder_name] = value
+        record.pop(dist_type_key, None)
+    return failed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="根据LLM给出的分布参数为每条记录采样混淆变量的取值。")
+    parser.add_argument("--input", default='outcome/927_outcome/data_glm_data_test.json', help="包含分布参数的数据文件")
+    parser.add_argument("--output", default='outcome/927_outcome/final_data.json', help="采样后的最终数据文件")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，用于复现采样结果")
+    parser.add_argument("--output-format", choices=("json",) + FORMATS, default="json",
+                        help="输出格式：json，或列式目录 arrow / npz（--output 为目录）")
+    parser.add_argument("--canonical-map", default=None,
+                        help="混淆变量名称的规范化映射（ez_data_alayze.py --save-canonical 生成），为每个数据集标注规范名称与id")
+    return parser.parse_args()
+
 def main():
     """
-    主函数，加载包含分布参数的JSON，进行采样，并保存最终的数据集。
+    主函数，加载包含分布参数的数据（JSON或列式目录），进行采样，并保存最终的数据集。
     """
-    input_path = 'outcome/927_outcome/data_glm_data_test.json'
-    output_path = 'outcome/927_outcome/final_data.json'
+    args = parse_args()
+    input_path = args.input
+    output_path = args.output
 
     if not os.path.exists(input_path):
         print(f"错误: 输入文件 '{input_path}' 不存在。")
         return
 
     print(f"--- 开始处理文件: {input_path} ---")
-    
-    with open(input_path, 'r', encoding='utf-8') as f:
-        all_data = json.load(f)
-
-    # 遍历JSON中的每个部分
-    for run_data in all_data:
-        confounder_name = run_data.get("confounder_variables", [None])[0]
-        if not confounder_name:
-            continue
+    rng = np.random.default_rng(args.seed)
+    index = CanonicalIndex.load(args.canonical_map) if args.canonical_map else None
 
-        data_records = run_data.get("data", [])
-        
-        # 遍历每一条记录进行采样和替换
-        for i, record in enumerate(data_records):
-            original_params = record.get(confounder_name) # 保存原始参数以供检查
-            
-            # 1. 生成采样值
-            new_value = sample_from_distribution(record, confounder_name)
-
-            if new_value is not None:
-                # 2. 用采样值替换参数字典
-                record[confounder_name] = new_value
-                
-                # 3. 移除分布类型字段
-                dist_type_key = f"{confounder_name}分布类型"
-                if dist_type_key in record:
-                    del record[dist_type_key]
-            
-            # 检查替换是否成功，如果不成功则发出明确警告
-            if isinstance(record.get(confounder_name), dict):
-                 print(f"错误: 第 {i+1} 条记录的参数替换失败！")
-                 print(f"  - 混淆变量: {confounder_name}")
-                 print(f"  - 分布类型: {record.get(f'{confounder_name}分布类型', '未找到')}")
-                 print(f"  - 原始参数: {original_params}")
+    def annotate(meta, confounder_name):
+        # 只增加字段，不改动数据列名，下游按 canonical_id 即可合并不同写法的同一混淆变量
+        if index is not None and confounder_name:
+            meta['canonical_id'] = index.canonical_id(confounder_name)
+            meta['canonical_confounder'] = index.labels[meta['canonical_id']]
+
+    if is_columnar(input_path) or args.output_format != "json":
+        # 列式路径：内存映射读取，直接在列上采样
+        frames = []
+        for meta, df in load_frames(input_path):
+            confounder_name = (meta.get("confounder_variables") or [None])[0]
+            annotate(meta, confounder_name)
+            if confounder_name:
+                df, stats = sample_frame(df, confounder_name, rng)
+                failed = int(df[confounder_name].isna().sum()) if confounder_name in df.columns else len(df)
+                _report(confounder_name, len(df), failed, stats)
+            frames.append((meta, df))
+
+        if args.output_format == "json":
+            all_data = [dict(meta, data=frame_to_records(df, meta.get("confounder_variables")))
+                        for meta, df in frames]
+        else:
+            save_frames(frames, output_path, fmt=args.output_format)
+            print(f"最终的采样数据集已以 {args.output_format} 格式保存到: {output_path}")
+            if frames:
+                print("\n最终数据集预览 (前5条记录):")
+                print(frames[0][1].head())
+            return
+    else:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            all_data = json.load(f)
+
+        # 遍历JSON中的每个部分
+        for run_data in all_data:
+            confounder_name = run_data.get("confounder_variables", [None])[0]
+            annotate(run_data, confounder_name)
+            if not confounder_name:
+                continue
+
+            data_records = run_data.get("data", [])
+
+            # 整个数据集一次性批量采样，再写回记录
+            values, stats = sample_batch(data_records, confounder_name, rng)
+            failed = apply_samples(data_records, confounder_name, values)
+            _report(confounder_name, len(data_records), failed, stats)
 
 
     # 保存处理后的完整数据
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(all_data, f, indent=4, ensure_ascii=False)
-        
+
     print(f"最终的采样数据集已成功保存到: {output_path}")
 
     # 打印前5条记录作为预览
@@ -0,0 +1,227 @@
+## PC因果发现步骤的性能基准：asia / cancer / Sachs 数据在不同规模与检验方法下的耗时、CI检验次数与峰值内存
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+from causallearn.utils.cit import CIT, CIT_Base, register_ci_test
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.dataset_store import open_dataset
+from common.pc_batch import discover_causal_structure
+
+DATASETS = {
+    'asia': 'oringnal_data/bnlearn_generate/generated_asia_dataset.csv',
+    'cancer': 'oringnal_data/bnlearn_generate/generated_cancer_dataset.csv',
+    'sachs': 'oringnal_data/bnlearn/Sachs/sachs_dataset.csv',
+}
+# 0 表示原始行数
+SIZES = [0, 10_000, 100_000, 1_000_000]
+TESTS = ['fisherz', 'gsq', 'chisq']
+# Sachs 为连续数据，离散检验前按分位数分为 3 箱
+SACHS_BINS = 3
+# 基线依赖机器，写在 outcome/ 下而不是源码目录
+DEFAULT_BASELINE = 'outcome/benchmark/pc_baseline.json'
+
+# 当前进程内各条件集大小下的CI检验次数（PC 请求的次数，含命中 p 值缓存的调用）
+_CI_CALLS = Counter()
+
+
+def _counting_test(method):
+    class CountingCIT(CIT_Base):
+        # 包装 causallearn 自带的检验，只记录每次调用的条件集大小
+        def __init__(self, data, **kwargs):
+            super().__init__(data, **kwargs)
+            self.inner = CIT(data, method, **kwargs)
+            self.method = self.inner.method
+
+        def __call__(self, X, Y, condition_set=None):
+            _CI_CALLS[len(condition_set) if condition_set is not None else 0] += 1
+            return self.inner(X, Y, condition_set)
+
+    CountingCIT.__name__ = f"Counting_{method}"
+    return CountingCIT
+
+
+for _method in TESTS:
+    register_ci_test(f"counted_{_method}", _counting_test(_method))
+
+
+def load_dataset(name, indep_test):
+    """
+    读取数据集并按检验方法编码：类别数据做标签编码；Sachs 用于离散检验时按分位数离散化。
+
+    返回:
+        tuple: (np.ndarray, 列名列表)
+    """
+    if name == 'sachs' and indep_test != 'fisherz':
+        df = pd.read_csv(DATASETS[name])
+        binned = df.apply(lambda col: pd.qcut(col, SACHS_BINS, labels=False, duplicates='drop'))
+        return binned.to_numpy(dtype=np.int64), df.columns.tolist()
+    # 数值列原样、类别列按排序编号（与 pd.factorize(sort=True) 一致），编码结果缓存为 .npy，各用例子进程内存映射载入
+    dataset = open_dataset(DATASETS[name])
+    dtype = float if indep_test == 'fisherz' else np.int64
+    return dataset.to_numpy().astype(dtype), dataset.columns
+
+
+def _peak_rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(name, size, indep_test, seed=0, repeat=1):
+    """
+    在独立子进程中运行的单个基准用例，保证峰值内存互不影响。耗时取 repeat 次中的最小值。
+    """
+    data, node_names = load_dataset(name, indep_test)
+    native_rows = data.shape[0]
+    if size and size != native_rows:
+        # 有放回重采样扩展到目标行数
+        idx = np.random.default_rng(seed).integers(0, native_rows, size=size)
+        data = data[idx]
+    rss_before = _peak_rss_mb()
+
+    runtime = float('inf')
+    error = None
+    n_edges = None
+    for _ in range(max(1, repeat)):
+        _CI_CALLS.clear()
+        start = time.perf_counter()
+        try:
+            # 计时的是分析脚本共用的 discover_causal_structure，仅检验方法替换为带计数的包装
+            cg = discover_causal_structure(data, node_names, indep_test=f"counted_{indep_test}", show_progress=False)
+            n_edges = len(cg.G.get_graph_edges())
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        finally:
+            runtime = min(runtime, time.perf_counter() - start)
+
+    rss_after = _peak_rss_mb()
+    return {
+        'dataset': name,
+        'rows': int(data.shape[0]),
+        'test': indep_test,
+        'runtime': runtime,
+        'ci_tests': sum(_CI_CALLS.values()),
+        'ci_tests_per_level': {str(k): v for k, v in sorted(_CI_CALLS.items())},
+        'edges': n_edges,
+        'peak_rss_mb': rss_after,
+        'pc_peak_increase_mb': max(0.0, rss_after - rss_before),
+        'error': error,
+    }
+
+
+def case_key(result):
+    return f"{result['dataset']}/{result['rows']}/{result['test']}"
+
+
+def compare_with_baseline(results, baseline, time_tolerance=1.25, memory_tolerance=1.25, min_seconds=0.05,
+                          min_memory_mb=2.0):
+    """
+    将本次结果与基线比较。CI检验次数与边数应完全一致（不一致说明算法行为改变），
+    耗时与PC运行期间的峰值内存增量超过基线的 tolerance 倍视为性能回退；
+    耗时增加不足 min_seconds、内存增量增加不足 min_memory_mb 的用例不计，避免测量噪声。
+    峰值内存总量包含解释器与导入的约 200MB 固定开销，以它比较时PC本身的内存回退几乎不会被发现，因此只比较增量。
+
+    返回:
+        list: 回退或不一致的说明，为空表示通过。
+    """
+    base = {case_key(r): r for r in baseline.get('results', [])}
+    problems = []
+    print(f"\n{'用例':<28} {'耗时(s)':>9} {'基线':>9} {'比值':>6} {'CI检验':>9} {'峰值MB':>8} {'PC增量MB':>9}")
+    for r in results:
+        key = case_key(r)
+        b = base.get(key)
+        if r['error']:
+            problems.append(f"{key}: 运行失败 {r['error']}")
+        if b is None:
+            print(f"{key:<28} {r['runtime']:>9.3f} {'-':>9} {'-':>6} {r['ci_tests']:>9} {r['peak_rss_mb']:>8.1f} "
+                  f"{r['pc_peak_increase_mb']:>9.1f}  (新用例)")
+            continue
+        ratio = r['runtime'] / b['runtime'] if b['runtime'] > 0 else float('inf')
+        flag = ''
+        if ratio > time_tolerance and r['runtime'] - b['runtime'] > min_seconds:
+            flag = ' <- 变慢'
+            problems.append(f"{key}: 耗时 {r['runtime']:.3f}s 为基线 {b['runtime']:.3f}s 的 {ratio:.2f} 倍")
+        increase, base_increase = r['pc_peak_increase_mb'], b['pc_peak_increase_mb']
+        if increase > base_increase * memory_tolerance and increase - base_increase > min_memory_mb:
+            flag += ' <- 内存增加'
+            problems.append(f"{key}: PC峰值内存增量 {increase:.1f}MB 超过基线 {base_increase:.1f}MB")
+        if r['ci_tests_per_level'] != b['ci_tests_per_level'] or r['edges'] != b['edges']:
+            flag += ' <- 结果不一致'
+            problems.append(f"{key}: CI检验次数或边数与基线不一致 "
+                            f"({r['ci_tests_per_level']} vs {b['ci_tests_per_level']}, 边 {r['edges']} vs {b['edges']})")
+        print(f"{key:<28} {r['runtime']:>9.3f} {b['runtime']:>9.3f} {ratio:>6.2f} {r['ci_tests']:>9} "
+              f"{r['peak_rss_mb']:>8.1f} {increase:>9.1f}{flag}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PC因果发现步骤的性能基准。")
+    parser.add_argument("--datasets", default=','.join(DATASETS), help="以逗号分隔的数据集名")
+    parser.add_argument("--sizes", default=','.join(map(str, SIZES)), help="以逗号分隔的行数，0 表示原始行数")
+    parser.add_argument("--tests", default=','.join(TESTS), help="以逗号分隔的检验方法")
+    parser.add_argument("--seed", type=int, default=0, help="扩展行数时的重采样种子")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复运行的次数，耗时取最小值")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线JSON文件，不存在时以本次结果创建")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--time-tolerance", type=float, default=1.25, help="耗时超过基线多少倍视为回退")
+    parser.add_argument("--memory-tolerance", type=float, default=1.25,
+                        help="PC运行期间的峰值内存增量超过基线多少倍视为回退")
+    args = parser.parse_args()
+
+    cases = [(name, int(size), test)
+             for name in args.datasets.split(',')
+             for size in args.sizes.split(',')
+             for test in args.tests.split(',')]
+
+    results = []
+    # 每个用例使用新的子进程，峰值内存（ru_maxrss）不会被之前的用例抬高
+    ctx = get_context('spawn')
+    for name, size, test in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            result = pool.submit(run_case, name, size, test, args.seed, args.repeat).result()
+        status = result['error'] or f"{result['ci_tests']} 次CI检验, {result['edges']} 条边"
+        print(f"[{case_key(result)}] {result['runtime']:.3f}s, 峰值 {result['peak_rss_mb']:.1f}MB "
+              f"(PC增量 {result['pc_peak_increase_mb']:.1f}MB), {status}")
+        results.append(result)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.update_baseline or not os.path.exists(args.baseline):
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n基线已写入: {args.baseline}")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    problems = compare_with_baseline(results, baseline, time_tolerance=args.time_tolerance,
+                                     memory_tolerance=args.memory_tolerance)
+    if problems:
+        print("\n与基线相比发现以下问题:")
+        for p in problems:
+            print(f"  - {p}")
+        return 1
+    print("\n全部用例与基线一致，未发现性能回退。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+## 因果图结构评估：读取 pc_batch 批量分析结果（每个文件为一次实验），与真实结构比较，每个实验输出一张 SHD / 邻接与方向 P/R/F1 汇总表
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.graph_eval import METRICS, evaluate_results, load_truth_graph, print_summary, summarize
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="将PC发现的因果图与真实结构比较，计算 SHD 与邻接/方向的精确率、召回率、F1。")
+    parser.add_argument("inputs", nargs='+',
+                        help="批量分析结果JSON（0927/0925 分析脚本 --batch --output 的输出），每个文件作为一次实验")
+    parser.add_argument("--truth", required=True,
+                        help="真实结构：sachs、asia、cancer、.bif 文件，或 {\"nodes\", \"edges\"} 格式的JSON文件")
+    parser.add_argument("--output", default=None, help="保存各实验汇总与逐图指标的JSON文件")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    truth = load_truth_graph(args.truth)
+    print(f"真实结构: {truth}")
+
+    report = {}
+    for path in args.inputs:
+        with open(path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+        metrics, evaluated = evaluate_results(results, truth)
+        summary = summarize(metrics)
+        label = os.path.splitext(os.path.basename(path))[0]
+        print_summary(summary, label, len(evaluated), failed=len(results) - len(evaluated))
+        report[label] = {
+            'source': path,
+            'summary': summary,
+            'graphs': [dict({'dataset_id': r.get('dataset_id'), 'confounder': r.get('confounder')},
+                            **{name: float(metrics[name][n]) for name in METRICS})
+                       for n, r in enumerate(evaluated)],
+        }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        print(f"\n评估结果已保存到文件: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
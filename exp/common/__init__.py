@@ -0,0 +1 @@
+## 各实验脚本共用的工具模块
@@ -0,0 +1,37 @@
+## 异步并发执行工具
+
+import asyncio
+
+
+async def gather_limited(task_factories, max_concurrency=8):
+    """
+    以有限的并发度执行一组协程，并按提交顺序返回结果。
+
+    参数:
+        task_factories (list): 无参可调用对象列表，每次调用返回一个待执行的协程。
+        max_concurrency (int): 同时运行的协程数量上限。
+
+    返回:
+        list: 与 task_factories 顺序一致的结果列表；执行失败的任务在对应位置返回异常对象。
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(factory):
+        async with semaphore:
+            return await factory()
+
+    return await asyncio.gather(*(_run(factory) for factory in task_factories), return_exceptions=True)
+
+
+async def run_closing(client, coro):
+    """
+    执行 coro，结束后在同一事件循环中关闭异步客户端。
+
+    AsyncOpenAI 的连接池绑定在创建时的事件循环上，asyncio.run 返回后再由垃圾回收关闭会报
+    "Event loop is closed"，因此每个阶段的客户端在该阶段的协程内关闭。client 为 None（仅回放）时直接执行。
+    """
+    try:
+        return await coro
+    finally:
+        if client is not None:
+            await client.close()
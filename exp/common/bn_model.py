@@ -0,0 +1,235 @@
+## 贝叶斯网络模型注册表：.bif 文件只解析一次，编译为拓扑序、CPT数组与状态名的二进制缓存（按文件哈希索引），后续毫秒级载入
+
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+
+# 仓库根目录；注册表中的路径相对于它书写
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CACHE_DIR = os.path.join(ROOT, '.model_cache')
+# 编译格式变化时递增，旧缓存自动失效
+COMPILER_VERSION = 1
+
+MODELS = {
+    'asia': 'oringnal_data/bnlearn/asia/asia.bif',
+    'cancer': 'oringnal_data/bnlearn/cancer/cancer.bif',
+}
+
+_VARIABLE = re.compile(r'variable\s+([^\s{]+)\s*\{[^}]*?type\s+discrete\s*\[\s*(\d+)\s*\]\s*\{([^}]*)\}', re.S)
+_PROBABILITY = re.compile(r'probability\s*\(\s*([^|)]+?)\s*(?:\|\s*([^)]*?))?\s*\)\s*\{(.*?)\}', re.S)
+_ROW = re.compile(r'\(([^)]*)\)\s*([^;]*);')
+_TABLE = re.compile(r'table\s+([^;]*);')
+_DEFAULT = re.compile(r'default\s+([^;]*);')
+
+
+def _split(text):
+    return [item.strip() for item in text.split(',') if item.strip()]
+
+
+class CompiledModel:
+    """
+    编译后的离散贝叶斯网络。
+
+    属性:
+        nodes (list): 拓扑序的节点名。
+        states (dict): 节点 -> 状态名列表（与BIF中的声明顺序一致）。
+        parents (dict): 节点 -> 父节点列表（与BIF中 probability 的声明顺序一致）。
+        cpts (dict): 节点 -> 条件概率数组，形状 (*各父节点状态数, 本节点状态数)。
+    """
+
+    def __init__(self, nodes, states, parents, cpts, source=None):
+        self.nodes = list(nodes)
+        self.states = states
+        self.parents = parents
+        self.cpts = cpts
+        self.source = source
+        self._cdfs = None
+
+    def __repr__(self):
+        return f"CompiledModel({len(self.nodes)} 个节点, {len(self.edges())} 条边, source={self.source!r})"
+
+    def edges(self):
+        """
+        真实因果边 [(父节点, 子节点), ...]，按子节点的拓扑序排列。
+        """
+        return [(parent, node) for node in self.nodes for parent in self.parents[node]]
+
+    def adjacency(self, order=None):
+        """
+        有向邻接矩阵，A[i, j] = 1 表示 order[i] -> order[j]；order 默认为拓扑序。
+        """
+        order = list(order or self.nodes)
+        index = {name: i for i, name in enumerate(order)}
+        matrix = np.zeros((len(order), len(order)), dtype=np.int8)
+        for parent, child in self.edges():
+            if parent in index and child in index:
+                matrix[index[parent], index[child]] = 1
+        return matrix
+
+    def check(self, atol=1e-6):
+        """
+        检查每个CPT在每个父节点取值组合下的概率和为1、且没有负值，相当于 pgmpy 的 check_model。
+        """
+        for node, cpt in self.cpts.items():
+            if (cpt < 0).any() or not np.allclose(cpt.sum(axis=-1), 1.0, atol=atol):
+                raise ValueError(f"节点 {node} 的条件概率表无效")
+        return True
+
+    def forward_sample_codes(self, size, rng):
+        """
+        向量化的祖先采样，返回 {节点: 状态下标数组}。每个节点只需一次随机数生成与一次累积概率比较。
+        """
+        if self._cdfs is None:
+            self._cdfs = {node: np.cumsum(cpt.reshape(-1, cpt.shape[-1]), axis=1) for node, cpt in self.cpts.items()}
+        codes = {}
+        for node in self.nodes:
+            parents = self.parents[node]
+            cdf = self._cdfs[node]
+            if parents:
+                flat = np.ravel_multi_index([codes[p] for p in parents], self.cpts[node].shape[:-1])
+                rows = cdf[flat]
+            else:
+                rows = np.broadcast_to(cdf[0], (size, cdf.shape[1]))
+            u = rng.random(size)
+            code = (u[:, None] > rows).sum(axis=1)
+            codes[node] = np.minimum(code, cdf.shape[1] - 1).astype(np.int16 if cdf.shape[1] > 127 else np.int8)
+        return codes
+
+    def forward_sample(self, size=1000, seed=None):
+        """
+        采样 size 行，返回列为节点名、取值为状态名的 DataFrame，与 pgmpy 的 forward_sample 格式一致。
+        """
+        import pandas as pd
+
+        codes = self.forward_sample_codes(size, np.random.default_rng(seed))
+        return pd.DataFrame({node: np.asarray(self.states[node], dtype=object)[codes[node]] for node in self.nodes})
+
+    def save(self, path):
+        meta = {'version': COMPILER_VERSION, 'nodes': self.nodes, 'states': self.states,
+                'parents': self.parents, 'source': self.source}
+        arrays = {f'cpt_{i}': self.cpts[node] for i, node in enumerate(self.nodes)}
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != COMPILER_VERSION:
+                raise ValueError(f"模型缓存版本 {meta.get('version')} 与当前版本 {COMPILER_VERSION} 不一致")
+            cpts = {node: data[f'cpt_{i}'] for i, node in enumerate(meta['nodes'])}
+        return cls(meta['nodes'], meta['states'], meta['parents'], cpts, source=meta.get('source'))
+
+
+def _topological(nodes, parents):
+    order, state = [], {}
+
+    def visit(node):
+        if state.get(node) == 'done':
+            return
+        if state.get(node) == 'visiting':
+            raise ValueError(f"网络中存在环，涉及节点 {node}")
+        state[node] = 'visiting'
+        for parent in parents[node]:
+            visit(parent)
+        state[node] = 'done'
+        order.append(node)
+
+    for node in nodes:
+        visit(node)
+    return order
+
+
+def compile_bif(text, source=None):
+    """
+    解析 bnlearn 风格的 BIF 文本（离散变量，probability 块使用 table / 父节点取值行 / default）。
+
+    条件概率表的 table 写法与 pgmpy 一致：按本节点状态分行、父节点组合按声明顺序（第一个父节点变化最慢）展开。
+    """
+    text = re.sub(r'//[^\n]*|/\*.*?\*/', '', text, flags=re.S)
+    states = {}
+    for name, card, names in _VARIABLE.findall(text):
+        names = _split(names)
+        if len(names) != int(card):
+            raise ValueError(f"变量 {name} 声明了 {card} 个状态，实际为 {len(names)} 个")
+        states[name] = names
+    if not states:
+        raise ValueError("未找到离散变量声明")
+
+    parents, cpts = {}, {}
+    for child, given, body in _PROBABILITY.findall(text):
+        child = child.strip()
+        parent_list = _split(given) if given else []
+        shape = tuple(len(states[p]) for p in parent_list) + (len(states[child]),)
+        cpt = np.full(shape, np.nan)
+        table = _TABLE.search(body)
+        if table:
+            values = np.array([float(v) for v in _split(table.group(1))])
+            cpt[...] = values.reshape(len(states[child]), -1).T.reshape(shape)
+        default = _DEFAULT.search(body)
+        if default:
+            cpt[np.isnan(cpt).any(axis=-1)] = [float(v) for v in _split(default.group(1))]
+        for assignment, values in _ROW.findall(body):
+            index = tuple(states[p].index(s) for p, s in zip(parent_list, _split(assignment)))
+            cpt[index] = [float(v) for v in _split(values)]
+        if np.isnan(cpt).any():
+            raise ValueError(f"节点 {child} 的条件概率表不完整")
+        parents[child], cpts[child] = parent_list, cpt
+
+    missing = [name for name in states if name not in cpts]
+    if missing:
+        raise ValueError(f"以下变量缺少 probability 块: {missing}")
+    nodes = _topological(list(states), parents)
+    return CompiledModel(nodes, {n: states[n] for n in nodes}, {n: parents[n] for n in nodes},
+                         {n: cpts[n] for n in nodes}, source=source)
+
+
+def resolve(name_or_path):
+    """
+    注册表中的模型名（如 'asia'）或 .bif 文件路径 -> 绝对路径。
+    """
+    path = MODELS.get(name_or_path, name_or_path)
+    if os.path.isabs(path) or os.path.exists(path):
+        return os.path.abspath(path)
+    return os.path.join(ROOT, path)
+
+
+def load_model(name_or_path, cache_dir=DEFAULT_CACHE_DIR, check=True):
+    """
+    载入编译后的模型。缓存文件名为 .bif 内容的 SHA-256，文件改动后自动重新编译；
+    命中缓存时只读取一个 npz 文件，不解析BIF，也不导入 pgmpy。
+
+    参数:
+        name_or_path (str): MODELS 中的名称或 .bif 文件路径。
+        cache_dir (str | None): 缓存目录，None 表示不使用缓存。
+        check (bool): 编译时检查CPT有效性（命中缓存时已检查过，不再重复）。
+    """
+    path = resolve(name_or_path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    source = os.path.relpath(path, ROOT)
+    if cache_dir is None:
+        model = compile_bif(raw.decode('utf-8'), source=source)
+        if check:
+            model.check()
+        return model
+
+    digest = hashlib.sha256(raw).hexdigest()
+    cache_path = os.path.join(cache_dir, f'{digest}.v{COMPILER_VERSION}.npz')
+    if os.path.exists(cache_path):
+        try:
+            model = CompiledModel.load(cache_path)
+            model.source = source
+            return model
+        except (OSError, ValueError, KeyError):
+            pass  # 缓存损坏时重新编译覆盖
+    model = compile_bif(raw.decode('utf-8'), source=source)
+    if check:
+        model.check()
+    os.makedirs(cache_dir, exist_ok=True)
+    model.save(cache_path)
+    return model
@@ -0,0 +1,195 @@
+## 大规模贝叶斯网络数据生成：按固定大小分块，多进程祖先采样，每块使用 SeedSequence 派生的独立随机流，
+## 输出与进程数无关；各块直接写为 CSV / Parquet 分片，内存占用只与块大小有关
+
+import os
+import json
+import time
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .bn_model import DEFAULT_CACHE_DIR, load_model
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 为可选依赖，缺失时只能输出 CSV
+    pa = None
+    pq = None
+
+FORMATS = ('csv', 'parquet')
+# 下划线开头，pyarrow / pandas 把整个目录作为 Parquet 数据集读取时会跳过它
+MANIFEST = '_manifest.json'
+DEFAULT_CHUNK_SIZE = 1_000_000
+# CSV 每次拼接写出的行数，控制单块内字符串的峰值内存
+_CSV_BLOCK = 100_000
+
+# 工作进程内的模型，由 _init_worker 载入一次
+_MODEL = None
+
+
+def chunk_plan(n_rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    将 n_rows 行切分为固定大小的块，返回 [(块序号, 行数), ...]；块的划分只取决于 n_rows 与 chunk_size。
+    """
+    if n_rows < 0 or chunk_size <= 0:
+        raise ValueError("n_rows 不能为负，chunk_size 必须为正")
+    return [(i, min(chunk_size, n_rows - start)) for i, start in enumerate(range(0, n_rows, chunk_size))]
+
+
+def chunk_rng(entropy, index):
+    """
+    第 index 块的随机数生成器，等价于 SeedSequence(entropy).spawn(...)[index]，
+    但无需在主进程中生成全部子序列，工作进程按块序号直接构造。
+    """
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(index,)))
+
+
+def shard_name(index, fmt):
+    return f"part-{index:05d}.{fmt}"
+
+
+def write_csv_shard(path, model, codes, header=True):
+    """
+    将状态下标写为以状态名表示的CSV，分段拼接字符串，避免整块转换为 DataFrame。
+    """
+    names = [np.asarray(model.states[node], dtype=object) for node in model.nodes]
+    size = len(codes[model.nodes[0]]) if model.nodes else 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if header:
+            f.write(','.join(model.nodes) + '\n')
+        for start in range(0, size, _CSV_BLOCK):
+            columns = [names[j][codes[node][start:start + _CSV_BLOCK]] for j, node in enumerate(model.nodes)]
+            f.write('\n'.join(map(','.join, zip(*columns))))
+            f.write('\n')
+
+
+def write_parquet_shard(path, model, codes):
+    """
+    写为 Parquet，每列为字典编码（状态下标 + 状态名表），体积与读取开销都远小于字符串列。
+    """
+    if pa is None:
+        raise ImportError("写入 Parquet 格式需要安装 pyarrow，或改用 fmt='csv'")
+    arrays = [pa.DictionaryArray.from_arrays(codes[node], pa.array(model.states[node])) for node in model.nodes]
+    pq.write_table(pa.Table.from_arrays(arrays, names=model.nodes), path)
+
+
+def sample_chunk(model, index, size, entropy, out_dir, fmt='csv'):
+    """
+    采样一块并写出分片。
+
+    返回:
+        dict: 块序号、行数、分片文件名与各节点的状态计数（用于汇总边际分布）。
+    """
+    codes = model.forward_sample_codes(size, chunk_rng(entropy, index))
+    name = shard_name(index, fmt)
+    path = os.path.join(out_dir, name)
+    tmp = path + '.tmp'
+    if fmt == 'csv':
+        write_csv_shard(tmp, model, codes)
+    else:
+        write_parquet_shard(tmp, model, codes)
+    os.replace(tmp, path)
+    counts = {node: np.bincount(codes[node], minlength=len(model.states[node])).tolist() for node in model.nodes}
+    return {'index': index, 'rows': size, 'file': name, 'counts': counts}
+
+
+def _init_worker(name_or_path, cache_dir):
+    global _MODEL
+    # 模型编译缓存已由主进程写好，这里只读取一个 npz 文件
+    _MODEL = load_model(name_or_path, cache_dir=cache_dir, check=False)
+
+
+def _sample_chunk_worker(index, size, entropy, out_dir, fmt):
+    return sample_chunk(_MODEL, index, size, entropy, out_dir, fmt)
+
+
+def merge_csv(out_dir, shards, path):
+    """
+    按块序号把CSV分片流式拼接为单个文件，只保留第一个分片的表头。
+    """
+    with open(path, 'wb') as out:
+        for n, name in enumerate(shards):
+            with open(os.path.join(out_dir, name), 'rb') as f:
+                if n > 0:
+                    f.readline()
+                shutil.copyfileobj(f, out, 1 << 20)
+    return path
+
+
+def generate(name_or_path, n_rows, out_dir, chunk_size=DEFAULT_CHUNK_SIZE, seed=None, fmt='csv',
+             workers=None, cache_dir=DEFAULT_CACHE_DIR, verbose=True):
+    """
+    采样 n_rows 行并写出分片与 _manifest.json。
+
+    同一 (模型, n_rows, chunk_size, seed) 下，无论 workers 取何值，各分片内容都完全相同。
+
+    参数:
+        name_or_path (str): bn_model.MODELS 中的名称或 .bif 文件路径。
+        n_rows (int): 总行数。
+        out_dir (str): 分片输出目录。
+        chunk_size (int): 每块行数，决定单个进程的峰值内存与分片大小。
+        seed (int | None): 随机种子；None 时取系统熵，实际使用的值写入 manifest 以便复现。
+        fmt (str): 'csv' 或 'parquet'。
+        workers (int | None): 进程数，默认使用全部CPU核心；1 表示在当前进程中顺序执行。
+
+    返回:
+        dict: manifest 内容。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}，可选: {FORMATS}")
+    if fmt == 'parquet' and pa is None:
+        raise ImportError("写入 Parquet 格式需要安装 pyarrow，或改用 fmt='csv'")
+    model = load_model(name_or_path, cache_dir=cache_dir)
+    entropy = np.random.SeedSequence(seed).entropy
+    plan = chunk_plan(n_rows, chunk_size)
+    os.makedirs(out_dir, exist_ok=True)
+    # 清除上一次生成留下的分片，避免块数变少时残留旧文件
+    for name in os.listdir(out_dir):
+        if name.startswith('part-') and name.endswith(tuple(f'.{f}' for f in FORMATS)):
+            os.remove(os.path.join(out_dir, name))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(plan) or 1))
+
+    start = time.perf_counter()
+    results = []
+
+    def report(result):
+        results.append(result)
+        if verbose:
+            done = sum(r['rows'] for r in results)
+            print(f"  分片 {result['file']} 完成 ({len(results)}/{len(plan)} 块, {done:,}/{n_rows:,} 行, "
+                  f"{time.perf_counter() - start:.1f}s)")
+
+    if workers == 1:
+        for index, size in plan:
+            report(sample_chunk(model, index, size, entropy, out_dir, fmt))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(name_or_path, cache_dir)) as pool:
+            futures = [pool.submit(_sample_chunk_worker, index, size, entropy, out_dir, fmt) for index, size in plan]
+            for future in as_completed(futures):
+                report(future.result())
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda r: r['index'])
+    totals = {node: np.sum([r['counts'][node] for r in results], axis=0).tolist() if results else []
+              for node in model.nodes}
+    manifest = {
+        'model': model.source,
+        'nodes': model.nodes,
+        'states': model.states,
+        'rows': n_rows,
+        'chunk_size': chunk_size,
+        'seed': seed,
+        'entropy': entropy,
+        'format': fmt,
+        'workers': workers,
+        'seconds': round(elapsed, 3),
+        'shards': [{'file': r['file'], 'rows': r['rows']} for r in results],
+        'marginals': {node: {state: c / max(1, n_rows) for state, c in zip(model.states[node], totals[node])}
+                      for node in model.nodes},
+    }
+    with open(os.path.join(out_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    return manifest
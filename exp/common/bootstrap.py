@@ -0,0 +1,133 @@
+## 自助重采样的边稳定性选择：多进程并行运行PC，数据矩阵通过共享内存传递而不是逐任务序列化
+
+import os
+import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from causallearn.search.ConstraintBased.PC import pc
+
+from .pc_batch import graph_edges
+
+# 子进程内挂载的共享数据（由进程池的 initializer 设置）
+_WORKER = {}
+
+
+def _attach_shared(shm_name, shape, dtype, node_names, pc_kwargs):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER['shm'] = shm  # 保持引用，避免缓冲区被回收
+    _WORKER['data'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _WORKER['node_names'] = node_names
+    _WORKER['pc_kwargs'] = pc_kwargs
+
+
+def _run_resample(seed):
+    data = _WORKER['data']
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, data.shape[0], size=data.shape[0])
+    try:
+        cg = pc(data[idx], node_names=_WORKER['node_names'], show_progress=False, **_WORKER['pc_kwargs'])
+    except Exception as e:
+        # 重采样后可能出现常数列或奇异矩阵，记为失败而不中断整批
+        return None, f"{type(e).__name__}: {e}"
+    return graph_edges(cg), None
+
+
+def _orientation(edge):
+    # 以字典序较小的节点为 a，返回 ((a, b), 方向)，方向为 'a->b' / 'b->a' / 'a--b' / 'a<->b'
+    node1, end1, end2, node2 = edge
+    if node1 > node2:
+        node1, end1, end2, node2 = node2, end2, end1, node1
+    if end1 == 'TAIL' and end2 == 'ARROW':
+        kind = 'a->b'
+    elif end1 == 'ARROW' and end2 == 'TAIL':
+        kind = 'b->a'
+    elif end1 == 'ARROW' and end2 == 'ARROW':
+        kind = 'a<->b'
+    else:
+        kind = 'a--b'
+    return (node1, node2), kind
+
+
+def bootstrap_edges(data, node_names, n_boot=100, max_workers=None, seed=0, **pc_kwargs):
+    """
+    对数据做 n_boot 次有放回重采样，在进程池中对每个重采样运行PC，统计各边及其方向的出现频率。
+
+    参数:
+        data (np.ndarray): 预处理后的数值矩阵，写入共享内存后由各子进程只读访问。
+        node_names (list): 变量名。
+        n_boot (int): 重采样次数。
+        max_workers (int | None): 进程数，默认使用全部CPU核心。
+        seed (int): 随机种子，各次重采样的种子由 SeedSequence 派生，结果与进程数无关。
+        **pc_kwargs: 传给 pc 的参数，如 alpha、indep_test。
+
+    返回:
+        dict: {'n_boot', 'n_failed', 'errors', 'edges'}，edges 按出现频率降序排列，
+            每项为 {'pair', 'frequency', 'orientations': {方向: 频率}}。
+    """
+    data = np.ascontiguousarray(data)
+    seeds = [s.generate_state(1)[0] for s in np.random.SeedSequence(seed).spawn(n_boot)]
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, n_boot))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+        init_args = (shm.name, data.shape, data.dtype.str, list(node_names), pc_kwargs)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_shared, initargs=init_args) as pool:
+            chunksize = max(1, n_boot // (max_workers * 4))
+            outcomes = list(pool.map(_run_resample, seeds, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    pair_counts = Counter()
+    orientation_counts = {}
+    errors = Counter()
+    n_ok = 0
+    for edges, error in outcomes:
+        if error is not None:
+            errors[error] += 1
+            continue
+        n_ok += 1
+        for edge in edges:
+            pair, kind = _orientation(edge)
+            pair_counts[pair] += 1
+            orientation_counts.setdefault(pair, Counter())[kind] += 1
+
+    summary = []
+    for pair, count in pair_counts.most_common():
+        summary.append({
+            'pair': list(pair),
+            'frequency': count / n_ok,
+            'orientations': {k: v / n_ok for k, v in orientation_counts[pair].most_common()},
+        })
+    return {'n_boot': n_boot, 'n_failed': n_boot - n_ok, 'errors': dict(errors), 'edges': summary}
+
+
+def print_stability_table(result, threshold=0.0):
+    """
+    打印边的出现频率及各方向的频率，只显示频率不低于 threshold 的边。
+    """
+    n_ok = result['n_boot'] - result['n_failed']
+    print(f"自助重采样 {result['n_boot']} 次，成功 {n_ok} 次，失败 {result['n_failed']} 次")
+    for error, count in result['errors'].items():
+        print(f"  失败原因 ({count} 次): {error}")
+    shown = [e for e in result['edges'] if e['frequency'] >= threshold]
+    if not shown:
+        print("  -> 没有达到阈值的边。")
+        return
+    for entry in shown:
+        a, b = entry['pair']
+        parts = []
+        for kind, freq in entry['orientations'].items():
+            label = {'a->b': f"{a}->{b}", 'b->a': f"{b}->{a}", 'a<->b': f"{a}<->{b}", 'a--b': f"{a}--{b}"}[kind]
+            parts.append(f"{label}: {freq:.2f}")
+        print(f"  -> {a} -- {b}  出现频率 {entry['frequency']:.2f}  [" + ", ".join(parts) + "]")
+
+
+def save_stability_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
+    print(f"\n稳定性选择结果已保存到: {path}")
@@ -0,0 +1,340 @@
+## 混淆变量名称的规范化：文本归一化 + 同义词表 + 字符n-gram MinHash 局部敏感哈希聚类，为指标与采样输出统一的规范id
+
+import os
+import re
+import sys
+import json
+import zlib
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+# 同义词表：规范名称 -> 变体。中英文名称、缩写与常见的不同说法映射到同一个规范名称
+DEFAULT_SYNONYMS = {
+    "Lung Cancer": ["肺癌", "lung carcinoma", "lung tumor", "肺部肿瘤"],
+    "Cancer": ["癌症", "恶性肿瘤", "malignancy"],
+    "Chronic Obstructive Pulmonary Disease": ["COPD", "慢性阻塞性肺疾病", "慢阻肺", "慢性阻塞性肺病"],
+    "Pneumonia": ["肺炎", "肺部感染", "lung infection", "pulmonary infection"],
+    "Heart Failure": ["心力衰竭", "心衰", "congestive heart failure", "CHF", "充血性心力衰竭"],
+    "Tuberculosis": ["肺结核", "结核病", "TB", "pulmonary tuberculosis"],
+    "Pulmonary Embolism": ["肺栓塞", "PE"],
+    "Pulmonary Edema": ["肺水肿"],
+    "Bronchitis": ["支气管炎", "慢性支气管炎", "chronic bronchitis"],
+    "Asthma": ["哮喘", "支气管哮喘"],
+    "Smoking": ["吸烟", "长期吸烟", "smoking status", "smoker", "tobacco use"],
+    "Air Pollution": ["空气污染", "pollution", "pollution level", "环境污染"],
+    "Inflammatory Response": ["炎症反应", "inflammation", "炎症"],
+    "Cellular Stress": ["细胞应激", "cell stress"],
+}
+
+_PAREN = re.compile(r'\([^()]*\)|\[[^\[\]]*\]|【[^【】]*】')
+_NON_WORD = re.compile(r'[^\w\s]+|_')
+_CJK = re.compile(r'[一-鿿]')
+_ASCII_TOKEN = re.compile(r'[a-z0-9]+')
+# 只在一边出现、且不超过该长度或含数字的英文词，视为区分不同实体的标记（PKA/PKC、PIP2/PIP3、Akt/Erk 等）
+_SHORT_TOKEN = 4
+
+
+def normalize(name):
+    """
+    名称归一化：NFKC（全角转半角）、小写、去掉括号内的补充说明（如 "(early stage)"、"（COPD）"）、
+    标点替换为空格并合并空白。去掉括号后为空时保留括号内的内容。
+    """
+    text = unicodedata.normalize('NFKC', str(name)).lower()
+    stripped = _PAREN.sub(' ', text)
+    if stripped.strip():
+        text = stripped
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def compatible(a, b):
+    """
+    两个归一化名称能否合并。字符n-gram相似度对只差一个字母的短名称很高（"pka activity" 与 "pkc activity"），
+    因此只在一边出现的英文词若很短或含数字，就认为两者是不同的实体；较长的词（如复数、拼写差异）不受影响。
+    """
+    left, right = Counter(_ASCII_TOKEN.findall(a)), Counter(_ASCII_TOKEN.findall(b))
+    return not any(len(token) <= _SHORT_TOKEN or any(c.isdigit() for c in token)
+                   for token in (left - right) + (right - left))
+
+
+def shingles(key, ngram=3):
+    """
+    字符n-gram集合的哈希值；含中文时使用二元组（中文名称较短），两端补空格使词首词尾也成为特征。
+    """
+    n = 2 if _CJK.search(key) else ngram
+    padded = f' {key} '
+    grams = {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+    return [zlib.crc32(g.encode('utf-8')) for g in grams]
+
+
+class MinHasher:
+    """
+    批量计算 MinHash 签名。哈希族为 multiply-shift：h_i(x) = ((a_i * x + b_i) mod 2^64) >> 32，
+    在 uint64 上按溢出回绕计算，整批名称的全部n-gram一次矩阵运算后用 minimum.reduceat 按名称取最小值。
+    """
+
+    def __init__(self, num_perm=64, seed=0):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signatures(self, shingle_lists, max_cells=8_000_000):
+        """
+        返回 (len(shingle_lists), num_perm) 的 uint32 签名矩阵。
+        """
+        out = np.empty((len(shingle_lists), self.num_perm), dtype=np.uint32)
+        start = 0
+        while start < len(shingle_lists):
+            end, cells = start, 0
+            while end < len(shingle_lists) and (cells == 0 or cells + len(shingle_lists[end]) * self.num_perm <= max_cells):
+                cells += len(shingle_lists[end]) * self.num_perm
+                end += 1
+            chunk = shingle_lists[start:end]
+            values = np.fromiter((h for hs in chunk for h in hs), dtype=np.uint64)
+            offsets = np.cumsum([0] + [len(hs) for hs in chunk[:-1]])
+            with np.errstate(over='ignore'):
+                hashed = (self.a[:, None] * values[None, :] + self.b[:, None]) >> np.uint64(32)
+            out[start:end] = np.minimum.reduceat(hashed, offsets, axis=1).T
+            start = end
+        return out
+
+
+class CanonicalIndex:
+    """
+    混淆变量名称的规范化索引。
+
+    处理顺序：归一化 -> 同义词表 -> MinHash LSH 聚类。LSH 把签名切成 bands 段，任一段完全相同的名称成为候选，
+    候选与桶内代表的签名一致率（Jaccard 估计）不低于 threshold 且通过 compatible 的词级检查时合并，
+    比较次数与名称数线性相关而不是平方。不同同义词条目的簇不会被合并。
+
+    参数:
+        synonyms (dict | None): 规范名称 -> 变体列表，默认 DEFAULT_SYNONYMS。
+        threshold (float): 合并所需的 Jaccard 相似度估计。
+        num_perm (int): MinHash 签名长度。
+        bands (int): LSH 段数，需整除 num_perm；段数越多召回越高、候选越多。
+        ngram (int): 非中文名称的字符n-gram长度。
+    """
+
+    def __init__(self, synonyms=None, threshold=0.6, num_perm=64, bands=16, ngram=3, seed=0):
+        if num_perm % bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.synonyms = DEFAULT_SYNONYMS if synonyms is None else synonyms
+        self.anchors = {}
+        for label, variants in self.synonyms.items():
+            for variant in [label] + list(variants):
+                self.anchors[normalize(variant)] = label
+        self.threshold = threshold
+        self.bands = bands
+        self.ngram = ngram
+        self.hasher = MinHasher(num_perm, seed)
+        self.counts = Counter()
+        self.labels = []
+        self.key_ids = {}
+        self._signatures = {}
+        self._buckets = [{} for _ in range(bands)]
+
+    def _key(self, name):
+        # 返回 (归一化键, 同义词表中的规范名称或 None)；同义词条目的键统一为规范名称的归一化形式
+        key = normalize(name)
+        label = self.anchors.get(key)
+        return (normalize(label), label) if label else (key, None)
+
+    def add(self, name, count=1):
+        self.counts[str(name)] += count
+
+    def add_all(self, names):
+        for name in names:
+            self.add(name)
+        return self
+
+    def _band_hashes(self, signatures):
+        """
+        每个名称每段签名的哈希，形状 (n, bands)；段内各行乘以不同的奇数后相加（uint64 回绕），
+        偶然碰撞的候选会在相似度校验中被排除。
+        """
+        rows = signatures.shape[1] // self.bands
+        banded = signatures.reshape(len(signatures), self.bands, rows).astype(np.uint64)
+        with np.errstate(over='ignore'):
+            return (banded * self.hasher.a[:rows]).sum(axis=2, dtype=np.uint64)
+
+    def build(self):
+        """
+        对已添加的名称聚类，之后可用 canonical / canonical_id 查询。
+        """
+        key_counts, spellings, anchored = Counter(), {}, {}
+        for name, count in self.counts.items():
+            key, label = self._key(name)
+            key_counts[key] += count
+            spellings.setdefault(key, Counter())[name.strip()] += count
+            anchored[key] = label
+        keys = list(key_counts)
+        signatures = self.hasher.signatures([shingles(k, self.ngram) for k in keys])
+
+        parent = list(range(len(keys)))
+        anchor = [anchored[k] for k in keys]
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # 每段内按哈希排序，同一个桶内的名称与桶内第一个名称组成候选对，相似度校验整批向量化完成
+        band_hashes = self._band_hashes(signatures)
+        for band in range(self.bands):
+            order = np.argsort(band_hashes[:, band], kind='stable')
+            sorted_hashes = band_hashes[order, band]
+            starts = np.flatnonzero(np.r_[True, sorted_hashes[1:] != sorted_hashes[:-1]])
+            heads = order[np.repeat(starts, np.diff(np.r_[starts, len(order)]))]
+            members = order
+            candidate = heads != members
+            heads, members = heads[candidate], members[candidate]
+            similar = (signatures[heads] == signatures[members]).mean(axis=1) >= self.threshold
+            for head, other in zip(heads[similar].tolist(), members[similar].tolist()):
+                if not compatible(keys[head], keys[other]):
+                    continue
+                ra, rb = find(head), find(other)
+                if ra == rb or anchor[ra] and anchor[rb] and anchor[ra] != anchor[rb]:
+                    continue
+                parent[rb] = ra
+                anchor[ra] = anchor[ra] or anchor[rb]
+
+        clusters = {}
+        for i in range(len(keys)):
+            clusters.setdefault(find(i), []).append(i)
+        # 簇的标签：同义词表的规范名称，否则为簇内出现次数最多的原始写法；簇按总出现次数降序编号
+        ordered = sorted(clusters.items(), key=lambda item: -sum(key_counts[keys[i]] for i in item[1]))
+        self.labels, self.key_ids = [], {}
+        for cid, (root, members) in enumerate(ordered):
+            if anchor[root]:
+                label = anchor[root]
+            else:
+                merged = Counter()
+                for i in members:
+                    merged.update(spellings[keys[i]])
+                label = merged.most_common(1)[0][0]
+            self.labels.append(label)
+            for i in members:
+                self.key_ids[keys[i]] = cid
+        self._index_signatures(keys, signatures)
+        return self
+
+    def _index_signatures(self, keys, signatures):
+        self._signatures = dict(zip(keys, signatures))
+        band_hashes = self._band_hashes(signatures).T.tolist() if len(keys) else [[] for _ in range(self.bands)]
+        # 反向构造使每个桶保留最先出现的名称
+        self._buckets = [dict(zip(reversed(hashes), reversed(keys))) for hashes in band_hashes]
+
+    def canonical_id(self, name):
+        """
+        返回名称的规范id。建立索引后出现的新名称：同义词条目归入同名的簇，其余通过LSH查询归入最相近的簇，
+        找不到时新建一个簇。
+        """
+        key, label = self._key(name)
+        cid = self.key_ids.get(key)
+        if cid is not None:
+            return cid
+        signature = self.hasher.signatures([shingles(key, self.ngram)])[0]
+        if label is not None:
+            cid = self.labels.index(label) if label in self.labels else None
+        else:
+            best_sim = self.threshold
+            for band, band_hash in enumerate(self._band_hashes(signature[None, :])[0].tolist()):
+                other = self._buckets[band].get(band_hash)
+                if other is None:
+                    continue
+                sim = float(np.mean(self._signatures[other] == signature))
+                if sim >= best_sim and compatible(key, other):
+                    cid, best_sim = self.key_ids[other], sim
+        if cid is None:
+            cid = len(self.labels)
+            self.labels.append(label or str(name).strip())
+        self.key_ids[key] = cid
+        self._signatures[key] = signature
+        for band, band_hash in enumerate(self._band_hashes(signature[None, :])[0].tolist()):
+            self._buckets[band].setdefault(band_hash, key)
+        return cid
+
+    def canonical(self, name):
+        return self.labels[self.canonical_id(name)]
+
+    def clusters(self):
+        """
+        返回 [(规范名称, 出现次数, [原始写法...]), ...]，按出现次数降序。
+        """
+        members = [Counter() for _ in self.labels]
+        for name, count in self.counts.items():
+            members[self.canonical_id(name)][name] += count
+        return sorted(((self.labels[c], sum(m.values()), [n for n, _ in m.most_common()])
+                       for c, m in enumerate(members) if m), key=lambda item: -item[1])
+
+    def save(self, path):
+        """
+        保存规范化映射：{"labels": [...], "keys": {归一化名称: id}, "threshold": ...}。
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'labels': self.labels, 'keys': self.key_ids, 'threshold': self.threshold,
+                       'synonyms': self.synonyms}, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        读取 save 保存的映射，保持原有的簇划分；新名称仍可通过LSH归入已有的簇。
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        index = cls(synonyms=raw.get('synonyms'), threshold=raw.get('threshold', 0.6), **kwargs)
+        index.labels = list(raw['labels'])
+        index.key_ids = {k: int(v) for k, v in raw['keys'].items()}
+        keys = list(index.key_ids)
+        index._index_signatures(keys, index.hasher.signatures([shingles(k, index.ngram) for k in keys]))
+        return index
+
+
+def hypothesis_names(record):
+    """
+    一条假设记录或数据集中出现的全部混淆变量名称。
+    """
+    names = [h.get('confounder') for h in record.get('confounder_hypotheses') or []]
+    names += [p.get('confounder') for p in record.get('Probability') or [] if isinstance(p, dict)]
+    names += list(record.get('confounder_variables') or [])
+    return [n for n in names if isinstance(n, str) and n.strip()]
+
+
+def check_sachs_names(threshold=0.6):
+    """
+    回归检查：Sachs 数据集的各蛋白质（PKA/PKC、PIP2/PIP3 等只差一个字母或数字）在聚类后必须仍是不同的簇。
+
+    返回:
+        list: 被错误合并的 (名称, 名称) 对，为空表示通过。
+    """
+    from .pair_scan import DATASETS
+
+    names = []
+    for column, full_name in DATASETS['sachs']['names'].items():
+        names += [column, column.upper(), f"{column.upper()} activity", full_name]
+    index = CanonicalIndex(threshold=threshold).add_all(names).build()
+    groups = [[column, column.upper(), f"{column.upper()} activity", full_name]
+              for column, full_name in DATASETS['sachs']['names'].items()]
+    merged = []
+    for i, group in enumerate(groups):
+        for other in groups[i + 1:]:
+            for a in group:
+                for b in other:
+                    if index.canonical_id(a) == index.canonical_id(b):
+                        merged.append((a, b))
+    return merged
+
+
+if __name__ == '__main__':
+    # 作为脚本运行时以包的形式重新导入，check_sachs_names 中的相对导入才能生效
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from common.canonical import check_sachs_names
+
+    problems = check_sachs_names()
+    for a, b in problems:
+        print(f"错误合并: {a} <-> {b}")
+    print("Sachs 蛋白质名称聚类检查" + ("通过" if not problems else f"失败 ({len(problems)} 对)"))
+    sys.exit(1 if problems else 0)
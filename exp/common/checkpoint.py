@@ -0,0 +1,173 @@
+## 追加写入的JSONL检查点：每完成一条结果立即落盘，崩溃或中断后可跳过已完成的运行继续
+
+import os
+import sys
+import json
+import time
+import argparse
+
+
+def read_jsonl(path):
+    """
+    读取检查点文件，返回 (条目列表, 完整行结束处的字节偏移)。
+
+    进程在写入中途被杀时最后一行可能不完整，这样的行会被忽略，偏移停在最后一个完整行之后。
+    """
+    entries, good_bytes = [], 0
+    if not os.path.exists(path):
+        return entries, good_bytes
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            good_bytes += len(line)
+    return entries, good_bytes
+
+
+class JsonlCheckpoint:
+    """
+    每行一个 {"key": 运行标识, "result": 结果, ...} 的追加写检查点。
+
+    每条记录写入后立即 flush 到操作系统，进程被杀不会丢失；fsync 按批进行
+    （每 fsync_every 条或每 fsync_interval 秒一次，关闭时再做一次），兼顾断电安全与写入开销。
+
+    参数:
+        path (str): 检查点文件路径。
+        resume (bool): 为 True 时载入已有记录并在其后追加；否则已有文件改名为 .prev 后重新开始。
+        fsync_every (int): 每写入多少条记录 fsync 一次。
+        fsync_interval (float): 距上次 fsync 超过该秒数时也会 fsync。
+    """
+
+    def __init__(self, path, resume=False, fsync_every=20, fsync_interval=5.0):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self.done = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if resume:
+            entries, good_bytes = read_jsonl(path)
+            for entry in entries:
+                self.done[entry['key']] = entry
+            if os.path.exists(path) and os.path.getsize(path) > good_bytes:
+                # 截掉崩溃时写了一半的最后一行，否则后续追加会与其拼在一起
+                with open(path, 'r+b') as f:
+                    f.truncate(good_bytes)
+        elif os.path.exists(path) and os.path.getsize(path) > 0:
+            os.replace(path, path + '.prev')
+        self._file = open(path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def write(self, key, result, **extra):
+        entry = {'key': key, 'result': result, **extra}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.done[key] = entry
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def is_done(self, key):
+        """
+        key 已有完整结果时返回 True；带 missing 标记的部分结果（分批模式补发后仍缺行）在恢复时重新生成。
+        """
+        entry = self.done.get(key)
+        return entry is not None and not entry.get('missing')
+
+    def sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def collect(self, keys=None, field='result'):
+        """
+        按 keys 的顺序（默认按写入顺序）取出各条记录的 field，跳过为 null 的结果。
+        结果为列表时展开拼接（数据阶段每个假设对应多个数据集），否则逐条收集。
+        """
+        collected = []
+        for key in (keys if keys is not None else list(self.done)):
+            value = self.done.get(key, {}).get(field)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                collected.extend(value)
+            else:
+                collected.append(value)
+        return collected
+
+
+def _confounder_name(hypothesis):
+    probability = hypothesis.get('Probability') or [{}]
+    return probability[0].get('confounder')
+
+
+def import_outcome(hypotheses_path, data_path, out_dir, final_path=None):
+    """
+    将已有的 outcome JSON 结果转换为检查点，之后以 --resume 运行即可跳过这些运行。
+
+    假设记录按其 id 作为 key。数据文件不含假设 id，按混淆变量名称与各假设 Probability[0] 中的
+    confounder 对应；无法对应的数据集归入文件中位于其前面的最近一个已对应假设（数据按假设顺序写出）。
+
+    返回:
+        tuple: (假设检查点条数, 数据检查点条数)
+    """
+    with open(hypotheses_path, 'r', encoding='utf-8') as f:
+        hypotheses = json.load(f)
+    with JsonlCheckpoint(os.path.join(out_dir, 'hypotheses.jsonl')) as ckpt:
+        for hypothesis in hypotheses:
+            ckpt.write(hypothesis['id'], hypothesis)
+
+    if data_path is None:
+        return len(hypotheses), 0
+
+    def group(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            datasets = json.load(f)
+        groups, current = {}, None
+        for dataset in datasets:
+            names = set(dataset.get('confounder_variables', []))
+            match = next((h['id'] for h in hypotheses
+                          if _confounder_name(h) in names and (h['id'] not in groups or h['id'] == current)), None)
+            current = match if match is not None else (current if current is not None else hypotheses[0]['id'])
+            groups.setdefault(current, []).append(dataset)
+        return groups
+
+    groups = group(data_path)
+    finals = group(final_path) if final_path else {}
+    with JsonlCheckpoint(os.path.join(out_dir, 'data.jsonl')) as ckpt:
+        for key, datasets in groups.items():
+            extra = {'final': finals[key]} if key in finals else {}
+            ckpt.write(key, datasets, **extra)
+    return len(hypotheses), len(groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将已有的 outcome JSON 结果导入为JSONL检查点。")
+    parser.add_argument("hypotheses", help="混淆变量假设结果，如 outcome/927_outcome/var_glm_output_test.json")
+    parser.add_argument("--data", default=None, help="数据生成结果，如 outcome/927_outcome/data_glm_data_test.json")
+    parser.add_argument("--final", default=None, help="流式模式采样后的最终数据，如 outcome/927_outcome/final_data.json")
+    parser.add_argument("--out", required=True, help="检查点目录，与实验脚本的 --checkpoint-dir 一致")
+    args = parser.parse_args()
+
+    n_hyp, n_data = import_outcome(args.hypotheses, args.data, args.out, final_path=args.final)
+    print(f"已导入 {n_hyp} 条假设记录、{n_data} 个假设的数据结果到 {args.out}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
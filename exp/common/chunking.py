@@ -0,0 +1,159 @@
+## 按行分批生成数据并按 id 合并
+
+from .async_runner import gather_limited
+
+
+def attach_row_ids(var_list, start=0):
+    """
+    为观察数据的每一行附加全局行号 id（已有 id 的行保持不变），便于分批返回后按 id 对齐。
+    """
+    rows = []
+    for offset, row in enumerate(var_list):
+        if 'id' in row:
+            rows.append(row)
+        else:
+            rows.append({**row, 'id': start + offset})
+    return rows
+
+
+def split_batches(var_list, batch_size):
+    """
+    将观察数据按行切分为若干批次。
+
+    参数:
+        var_list (list): 观察数据的记录列表，每条记录需带有 id。
+        batch_size (int): 每批的行数，小于等于0时不切分。
+
+    返回:
+        list: 批次列表，每个批次是记录列表。
+    """
+    if batch_size <= 0 or len(var_list) <= batch_size:
+        return [var_list]
+    return [var_list[i:i + batch_size] for i in range(0, len(var_list), batch_size)]
+
+
+def _normalize_id(value):
+    # LLM 经常把数字 id 输出为字符串，如 "12"
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class BatchMerger:
+    """
+    收集各批次的LLM返回结果，按混淆变量分组合并 data 记录，并跟踪缺失与重复的 id。
+
+    参数:
+        expected_ids (iterable): 观察数据中全部行的 id。
+    """
+
+    def __init__(self, expected_ids):
+        self.expected_ids = [_normalize_id(i) for i in expected_ids]
+        self.datasets = {}
+        self.duplicate_ids = set()
+        self.unexpected_ids = set()
+
+    def add(self, json_run_data):
+        """
+        合并一个批次的解析结果（形如 [{"variables", "confounder_variables", "data"}, ...]）。
+        """
+        expected = set(self.expected_ids)
+        for dataset in json_run_data:
+            key = tuple(dataset.get('confounder_variables', []))
+            entry = self.datasets.setdefault(key, {
+                'variables': dataset.get('variables', []),
+                'confounder_variables': list(key),
+                'records': {},
+            })
+            for record in dataset.get('data', []):
+                row_id = _normalize_id(record.get('id'))
+                if row_id not in expected:
+                    self.unexpected_ids.add(row_id)
+                    continue
+                if row_id in entry['records']:
+                    # 同一 id 只保留第一次出现的记录
+                    self.duplicate_ids.add(row_id)
+                    continue
+                record['id'] = row_id
+                entry['records'][row_id] = record
+
+    def missing_ids(self):
+        """
+        返回至少在一个混淆变量数据集中缺失的 id（按原始顺序）。尚未收到任何结果时全部视为缺失。
+        """
+        if not self.datasets:
+            return list(self.expected_ids)
+        return [i for i in self.expected_ids
+                if any(i not in entry['records'] for entry in self.datasets.values())]
+
+    def result(self):
+        """
+        返回与原 chat_data 输出结构一致的数据集列表，data 按 id 排序。
+        """
+        merged = []
+        for entry in self.datasets.values():
+            merged.append({
+                'variables': entry['variables'],
+                'confounder_variables': entry['confounder_variables'],
+                'data': [entry['records'][i] for i in self.expected_ids if i in entry['records']],
+            })
+        return merged
+
+
+async def generate_in_batches(jobs, request_fn, parse_fn, batch_size, max_concurrency=8, max_retries=2):
+    """
+    对多个生成任务按行分批并发调用LLM，按 id 合并结果，并对缺失的 id 重新请求。
+
+    参数:
+        jobs (list): 任务列表，每个任务是包含 'key'（运行标识）与 'var_list'（带 id 的观察数据）的字典。
+        request_fn (callable): request_fn(job, batch, tag) 返回一个协程，结果为LLM原始文本；
+            tag 唯一标识该批次请求，可作为缓存的采样序号。
+        parse_fn (callable): 将LLM原始文本解析为数据集列表，解析失败时抛出异常。
+        batch_size (int): 每批的行数。
+        max_concurrency (int): 同时在途的请求数上限。
+        max_retries (int): 对缺失 id 重新请求的最大轮数。
+
+    返回:
+        list: 与 jobs 顺序一致的合并结果，每项为 (数据集列表, 缺失的 id 列表, 重复的 id 集合)。
+    """
+    mergers = [BatchMerger(row['id'] for row in job['var_list']) for job in jobs]
+    rows_by_id = [{_normalize_id(row['id']): row for row in job['var_list']} for job in jobs]
+    pending = [(n, job['var_list']) for n, job in enumerate(jobs)]
+
+    for round_no in range(max_retries + 1):
+        factories, owners = [], []
+        for n, rows in pending:
+            for b, batch in enumerate(split_batches(rows, batch_size)):
+                tag = f"{jobs[n]['key']}-r{round_no}-b{b}"
+                factories.append(lambda job=jobs[n], batch=batch, tag=tag: request_fn(job, batch, tag))
+                owners.append(n)
+
+        label = "首轮" if round_no == 0 else f"第 {round_no} 轮补发"
+        print(f"{label}: 并发发出 {len(factories)} 个分批数据生成请求 (每批最多 {batch_size} 行, 并发上限 {max_concurrency})...")
+        results = await gather_limited(factories, max_concurrency=max_concurrency)
+
+        for n, data_str in zip(owners, results):
+            if isinstance(data_str, Exception):
+                print(f"  任务 {jobs[n]['key']} 的一个批次调用失败: {data_str}")
+                continue
+            try:
+                json_run_data = parse_fn(data_str)
+            except Exception as e:
+                print(f"  任务 {jobs[n]['key']} 的一个批次解析失败: {e}")
+                continue
+            if json_run_data:
+                mergers[n].add(json_run_data)
+
+        pending = []
+        for n, merger in enumerate(mergers):
+            missing = merger.missing_ids()
+            if missing:
+                pending.append((n, [rows_by_id[n][i] for i in missing]))
+        if not pending:
+            break
+        if round_no < max_retries:
+            total_missing = sum(len(rows) for _, rows in pending)
+            print(f"  {len(pending)} 个任务共缺失 {total_missing} 条记录，重新请求缺失的 id...")
+
+    return [(merger.result(), merger.missing_ids(), merger.duplicate_ids) for merger in mergers]
@@ -0,0 +1,214 @@
+## PC算法条件独立性检验的充分统计量缓存：同一数据集在不同 alpha 下重复运行时复用统计量与 p 值
+
+import hashlib
+from math import log, sqrt
+
+import numpy as np
+from scipy.stats import chi2, norm
+from causallearn.search.ConstraintBased.PC import pc
+from causallearn.utils.cit import CIT_Base, register_ci_test, NO_SPECIFIED_PARAMETERS_MSG
+
+from .pc_batch import graph_edges
+
+# 数据集哈希 -> 充分统计量（相关矩阵 / 编码后的离散数据与列联表计数）及各检验方法的 p 值
+_STATS = {}
+_COUNTERS = {'stats_hits': 0, 'stats_misses': 0, 'pvalue_hits': 0, 'pvalue_misses': 0}
+
+
+def dataset_hash(data):
+    """
+    基于数组的完整字节内容计算数据集哈希（causallearn 自带的哈希使用 str(data)，大数组会被截断）。
+    """
+    data = np.ascontiguousarray(data)
+    h = hashlib.sha256()
+    h.update(str((data.shape, data.dtype.str)).encode('utf-8'))
+    h.update(data.tobytes())
+    return h.hexdigest()
+
+
+def _get_stats(data, kind):
+    key = (dataset_hash(data), kind)
+    stats = _STATS.get(key)
+    if stats is not None:
+        _COUNTERS['stats_hits'] += 1
+        return stats
+    _COUNTERS['stats_misses'] += 1
+    if kind == 'gaussian':
+        stats = {'n': data.shape[0], 'corr': np.corrcoef(data.T)}
+    else:
+        # 每列重新编码为 0..k-1，列联表计数按变量组合缓存，chisq 与 gsq 共用
+        encoded = np.column_stack([np.unique(col, return_inverse=True)[1] for col in data.T]).astype(np.int64)
+        stats = {'n': data.shape[0], 'encoded': encoded, 'cards': encoded.max(axis=0) + 1, 'counts': {}}
+    stats['pvalues'] = {}
+    _STATS[key] = stats
+    return stats
+
+
+def _contingency_counts(stats, indexes):
+    """
+    返回条件集取值组合 × X × Y 的三维计数表（仅保留出现过的条件集取值组合）。
+    """
+    indexes = tuple(indexes)
+    counts = stats['counts'].get(indexes)
+    if counts is not None:
+        return counts
+    data = stats['encoded'][:, indexes]
+    cards = stats['cards'][list(indexes)]
+    card_x, card_y = cards[-2:]
+    if len(indexes) == 2:
+        s_index = np.zeros(stats['n'], dtype=np.int64)
+        n_s = 1
+    else:
+        _, s_index = np.unique(data[:, :-2], axis=0, return_inverse=True)
+        s_index = s_index.reshape(-1)
+        n_s = int(s_index.max()) + 1
+    flat = (s_index * card_x + data[:, -2]) * card_y + data[:, -1]
+    counts = np.bincount(flat, minlength=n_s * card_x * card_y).reshape((n_s, card_x, card_y))
+    stats['counts'][indexes] = counts
+    return counts
+
+
+def _pvalue_from_counts(counts, g_sq):
+    # 与 causallearn 的 Chisq_or_Gsq 计算方式一致，只是输入改为缓存的计数表
+    s_marginal = counts.sum(axis=(1, 2))
+    counts = counts[s_marginal > 0]
+    s_marginal = s_marginal[s_marginal > 0]
+    sx = counts.sum(axis=2)
+    sy = counts.sum(axis=1)
+    expected = sx[:, :, None] * sy[:, None, :] / s_marginal[:, None, None]
+
+    zero = expected == 0
+    safe = np.where(zero, 1, expected)
+    if g_sq:
+        ratio = counts / safe
+        ratio[ratio == 0] = 1
+        statistic = 2 * np.sum(counts * np.log(ratio))
+    else:
+        statistic = np.sum((counts - expected) ** 2 / safe)
+    zero_rows = zero.all(axis=2).sum(axis=1)
+    zero_cols = zero.all(axis=1).sum(axis=1)
+    dof = np.sum((counts.shape[1] - 1 - zero_rows) * (counts.shape[2] - 1 - zero_cols))
+    return 1 if dof == 0 else chi2.sf(statistic, dof)
+
+
+class _CachedCIT(CIT_Base):
+    # 子类设置 METHOD / KIND；p 值字典按 (数据集哈希, 方法) 在所有实例之间共享
+    METHOD = None
+    KIND = None
+
+    def __init__(self, data, **kwargs):
+        super().__init__(data, **kwargs)
+        self.stats = _get_stats(data, self.KIND)
+        self.pvalue_cache = self.stats['pvalues'].setdefault(self.METHOD, {'data_hash': self.data_hash})
+        self.check_cache_method_consistent(self.METHOD, NO_SPECIFIED_PARAMETERS_MSG)
+        self.assert_input_data_is_valid()
+
+    def __call__(self, X, Y, condition_set=None):
+        Xs, Ys, condition_set, cache_key = self.get_formatted_XYZ_and_cachekey(X, Y, condition_set)
+        if cache_key in self.pvalue_cache:
+            _COUNTERS['pvalue_hits'] += 1
+            return self.pvalue_cache[cache_key]
+        _COUNTERS['pvalue_misses'] += 1
+        p = self.compute(Xs, Ys, condition_set)
+        self.pvalue_cache[cache_key] = p
+        return p
+
+
+class CachedFisherZ(_CachedCIT):
+    METHOD = 'fisherz'
+    KIND = 'gaussian'
+
+    def compute(self, Xs, Ys, condition_set):
+        var = Xs + Ys + condition_set
+        sub_corr_matrix = self.stats['corr'][np.ix_(var, var)]
+        try:
+            inv = np.linalg.inv(sub_corr_matrix)
+        except np.linalg.LinAlgError:
+            raise ValueError('数据的相关矩阵奇异，无法进行 fisherz 检验，请检查数据。')
+        r = -inv[0, 1] / sqrt(abs(inv[0, 0] * inv[1, 1]))
+        if abs(r) >= 1:
+            r = (1. - np.finfo(float).eps) * np.sign(r)
+        z = 0.5 * log((1 + r) / (1 - r))
+        statistic = sqrt(self.stats['n'] - len(condition_set) - 3) * abs(z)
+        return 2 * (1 - norm.cdf(abs(statistic)))
+
+
+class CachedChisq(_CachedCIT):
+    METHOD = 'chisq'
+    KIND = 'discrete'
+
+    def compute(self, Xs, Ys, condition_set):
+        counts = _contingency_counts(self.stats, condition_set + Xs + Ys)
+        return _pvalue_from_counts(counts, g_sq=self.METHOD == 'gsq')
+
+
+class CachedGsq(CachedChisq):
+    METHOD = 'gsq'
+
+
+CACHED_TESTS = {'fisherz': 'fisherz_cached', 'chisq': 'chisq_cached', 'gsq': 'gsq_cached'}
+register_ci_test('fisherz_cached', CachedFisherZ)
+register_ci_test('chisq_cached', CachedChisq)
+register_ci_test('gsq_cached', CachedGsq)
+
+
+def cached_test_name(indep_test):
+    """
+    将 'fisherz' / 'chisq' / 'gsq' 映射为带缓存的检验名，可直接作为 pc(..., indep_test=...) 的参数。
+    """
+    if indep_test not in CACHED_TESTS:
+        raise ValueError(f"没有可缓存的检验方法: {indep_test}，可选: {list(CACHED_TESTS)}")
+    return CACHED_TESTS[indep_test]
+
+
+def alpha_sweep(data, node_names, alphas, indep_test='fisherz', **pc_kwargs):
+    """
+    在多个 alpha 下对同一数据集运行PC算法；统计量与 p 值只在第一次运行时计算。
+
+    参数:
+        data (np.ndarray): 预处理后的数据矩阵。
+        node_names (list): 变量名。
+        alphas (list): 显著性水平列表。
+        indep_test (str): 'fisherz'、'chisq' 或 'gsq'。
+
+    返回:
+        dict: alpha -> 边列表（格式同 pc_batch.graph_edges）。
+    """
+    test_name = cached_test_name(indep_test)
+    results = {}
+    for alpha in alphas:
+        cg = pc(data, alpha=alpha, indep_test=test_name, node_names=node_names,
+                show_progress=False, **pc_kwargs)
+        results[alpha] = graph_edges(cg)
+    return results
+
+
+def print_sensitivity_table(results):
+    """
+    打印边 × alpha 的敏感性表，"●" 表示该 alpha 下出现此边。
+    """
+    alphas = list(results)
+    rows = []
+    for alpha in alphas:
+        for edge in results[alpha]:
+            label = f"{edge[0]} {edge[1]}--{edge[2]} {edge[3]}"
+            if label not in rows:
+                rows.append(label)
+    width = max([len(r) for r in rows] + [4])
+    print(f"{'边':<{width}} | " + " | ".join(f"{a:>7g}" for a in alphas))
+    print("-" * (width + 10 * len(alphas) + 1))
+    for label in rows:
+        marks = []
+        for alpha in alphas:
+            present = any(f"{e[0]} {e[1]}--{e[2]} {e[3]}" == label for e in results[alpha])
+            marks.append(f"{'●' if present else '':>7}")
+        print(f"{label:<{width}} | " + " | ".join(marks))
+    if not rows:
+        print("所有 alpha 下均未发现因果边。")
+
+
+def cache_info():
+    """
+    返回统计量与 p 值缓存的命中计数。
+    """
+    return dict(_COUNTERS, datasets=len(_STATS))
@@ -0,0 +1,193 @@
+## 统一命令行入口：generate / replay / sample / analyze / metrics 子命令按需载入对应脚本，入口本身只导入标准库；
+## imports 子命令用 `python -X importtime` 测量各子命令的启动耗时，并按顶层包汇总导入开销
+
+import os
+import sys
+import json
+import time
+import runpy
+import argparse
+import subprocess
+
+# 仓库根目录；脚本路径相对于它书写，与直接运行各脚本时的工作目录一致
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 子命令 -> {目标: (脚本, 追加在用户参数之前的参数)}；只有一个脚本的子命令目标为 None
+COMMANDS = {
+    'generate': {
+        'continuous': ('exp/0927exp/llm_continua.py', ()),
+        'discrete': ('exp/0926exp/llm_disperate.py', ()),
+        'network': ('exp/0914exp/generate_llm_data.py', ()),
+        'bn': ('oringnal_data/bnlearn_generate/generate_large_dataset.py', ()),
+    },
+    'replay': {
+        'continuous': ('exp/0927exp/llm_continua.py', ('--replay-only',)),
+        'discrete': ('exp/0926exp/llm_disperate.py', ('--replay-only',)),
+    },
+    'sample': {None: ('exp/0927exp/final_sampler.py', ())},
+    'analyze': {
+        'continuous': ('exp/0927exp/0927_analyze_llm_data.py', ()),
+        'discrete': ('exp/0926exp/0925_analyze_llm_data.py', ()),
+        'benchmark': ('exp/benchmark/bench_pc.py', ()),
+        'graphs': ('exp/benchmark/eval_graphs.py', ()),
+    },
+    'metrics': {None: ('exp/0912exp/ez_data_alayze.py', ())},
+}
+DESCRIPTIONS = {
+    'generate': "调用LLM生成混淆变量假设与数据（continuous: Sachs, discrete: cancer/asia），或由假设构造贝叶斯网络采样 (network)，"
+                "或按块多进程采样 asia/cancer 网络生成大规模数据 (bn)",
+    'replay': "仅回放LLM响应缓存重建结果，不创建客户端、不导入 openai",
+    'sample': "对LLM给出的分布参数采样得到最终数据集",
+    'analyze': "对生成的数据运行PC因果发现 (continuous / discrete)，或运行PC性能基准 (benchmark)，"
+               "或将批量分析结果与真实结构比较 (graphs)",
+    'metrics': "统计混淆变量假设的命中率、MRR、hit@k 与提出频次",
+}
+# 需要满足启动预算的子命令及预算 (ms)：从进程启动到解析完命令行参数
+STARTUP_BUDGET_MS = {'metrics': 200, 'replay': 200}
+
+
+def resolve(command, argv):
+    """
+    解析子命令的目标，返回 (脚本绝对路径, 传给脚本的参数列表)。
+    """
+    targets = COMMANDS[command]
+    if None in targets:
+        script, extra = targets[None]
+    else:
+        if not argv or argv[0] not in targets:
+            given = f"未知目标 {argv[0]!r}，" if argv and not argv[0].startswith('-') else ''
+            raise SystemExit(f"{command}: {given}请指定目标: {', '.join(targets)}")
+        script, extra = targets[argv[0]]
+        argv = argv[1:]
+    return os.path.join(ROOT, script), list(extra) + list(argv)
+
+
+def run_script(path, argv):
+    """
+    在当前进程中以 __main__ 身份运行脚本，效果与 `python <脚本> <参数>` 相同：
+    sys.path 首位由入口所在目录换成脚本所在目录（脚本之间的同目录导入依赖它），脚本的依赖在此时才被导入。
+    """
+    sys.argv = [path] + list(argv)
+    sys.path[0] = os.path.dirname(path)
+    runpy.run_path(path, run_name='__main__')
+
+
+def parse_importtime(stderr):
+    """
+    解析 `-X importtime` 的输出。
+
+    返回:
+        tuple: (顶层导入的累计耗时之和 (us), {顶层包名: 自身耗时之和 (us)}, 其余非 importtime 的输出行)
+    """
+    total, packages, other = 0, {}, []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            other.append(line)
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2]
+        if not name.startswith('  '):
+            total += cumulative_us
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return total, packages, other
+
+
+def measure(command, target=None, repeat=3):
+    """
+    以 `<子命令> [目标] --help` 启动一个新的解释器，测量启动耗时（取 repeat 次中的最小值）与导入开销。
+    --help 在参数解析处退出，此时脚本顶层的全部导入已经完成，实际运行的启动开销与之相同。
+    """
+    cmd = [sys.executable, '-X', 'importtime', os.path.abspath(__file__), command]
+    cmd += ([target] if target else []) + ['--help']
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+        wall_ms = (time.perf_counter() - start) * 1000
+        if best is None or wall_ms < best[0]:
+            best = (wall_ms, proc)
+    wall_ms, proc = best
+    total, packages, other = parse_importtime(proc.stderr)
+    errors = [line for line in other if line.strip()]
+    return {
+        'command': ' '.join(filter(None, [command, target])),
+        'ok': proc.returncode == 0,
+        'error': errors[-1] if proc.returncode != 0 and errors else None,
+        'startup_ms': round(wall_ms, 1),
+        'import_ms': round(total / 1000, 1),
+        'budget_ms': STARTUP_BUDGET_MS.get(command),
+        'packages': {name: round(us / 1000, 1) for name, us in
+                     sorted(packages.items(), key=lambda item: item[1], reverse=True)},
+    }
+
+
+def import_report(argv):
+    parser = argparse.ArgumentParser(prog='cli.py imports',
+                                     description="测量各子命令的启动耗时与导入开销，并与启动预算比较。")
+    parser.add_argument("commands", nargs='*', metavar="COMMAND[/TARGET]",
+                        help="要测量的子命令，如 metrics、replay/continuous；默认全部子命令及目标")
+    parser.add_argument("--top", type=int, default=5, help="每个子命令列出导入自身耗时最高的包的个数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个子命令的测量次数，取最小值")
+    parser.add_argument("--check", action="store_true", help="有预算的子命令超出预算或无法启动时返回非零退出码")
+    parser.add_argument("--output", default=None, help="保存测量结果的JSON文件")
+    args = parser.parse_args(argv)
+
+    selected = []
+    for spec in args.commands or list(COMMANDS):
+        command, _, target = spec.partition('/')
+        if command not in COMMANDS or (target and target not in COMMANDS[command]):
+            parser.error(f"未知子命令或目标: {spec}")
+        targets = [target] if target else list(COMMANDS[command])
+        selected.extend((command, t) for t in targets)
+
+    results = [measure(command, target, repeat=args.repeat) for command, target in selected]
+    print(f"{'子命令':<22}{'启动(ms)':>10}{'导入(ms)':>10}{'预算(ms)':>10}  状态")
+    over = 0
+    for r in results:
+        budget = r['budget_ms']
+        if not r['ok']:
+            status, over = f"无法启动: {r['error']}", over + (budget is not None)
+        elif budget is not None and r['startup_ms'] > budget:
+            status, over = "超出预算", over + 1
+        else:
+            status = "ok"
+        print(f"{r['command']:<24}{r['startup_ms']:>10.1f}{r['import_ms']:>10.1f}{budget or '-':>10}  {status}")
+        top = list(r['packages'].items())[:args.top]
+        if top:
+            print("    " + ", ".join(f"{name} {ms:.1f}" for name, ms in top))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+        print(f"\n测量结果已保存到文件: {args.output}")
+    return 1 if args.check and over else 0
+
+
+def parse_args(argv=None):
+    commands = '\n'.join(
+        f"  {name:<10}{' {' + ','.join(targets) + '}' if None not in targets else '':<36}{DESCRIPTIONS[name]}"
+        for name, targets in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="实验脚本的统一入口：各子命令的依赖（pgmpy、causallearn、sklearn、pandas、openai）只在运行该子命令时导入。",
+        epilog=f"子命令:\n{commands}\n  {'imports':<46}测量各子命令的启动耗时与导入开销\n\n"
+               "子命令之后的参数原样传给对应脚本，如 `cli.py metrics --help`。",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=list(COMMANDS) + ['imports'], metavar="COMMAND", help="子命令")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="目标及传给脚本的参数")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.command == 'imports':
+        return import_report(args.args)
+    path, argv = resolve(args.command, args.args)
+    run_script(path, argv)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+## 各混淆变量数据集的列式二进制存储（Arrow IPC / npz），替代逐阶段的缩进JSON文件
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # pyarrow 为可选依赖，缺失时只能使用 npz 格式
+    pa = None
+    pa_ipc = None
+
+MANIFEST = 'manifest.json'
+FORMATS = ('arrow', 'npz')
+
+
+def _flatten_record(record):
+    # 将 {"混淆变量": {"mu": 1, "sigma": 2}} 展开为 "混淆变量.mu" / "混淆变量.sigma" 两列
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                flat[f"{key}.{sub_key}"] = sub_value
+        else:
+            flat[key] = value
+    return flat
+
+
+def records_to_frame(records):
+    """
+    将 data 记录列表转换为 DataFrame，分布参数字典展开为 "<混淆变量>.<参数名>" 列。
+    """
+    return pd.DataFrame([_flatten_record(r) for r in records])
+
+
+def _nested_columns(columns, confounders):
+    # "<混淆变量>.<参数名>" 列 -> (混淆变量, 参数名)；只按清单中的混淆变量名匹配，其他含 '.' 的列名（如 "p38 M.A.P.K."）原样保留
+    nested = {}
+    for confounder in sorted(confounders or [], key=len, reverse=True):
+        prefix = f"{confounder}."
+        for column in columns:
+            if column not in nested and column.startswith(prefix) and '.' not in column[len(prefix):]:
+                nested[column] = (confounder, column[len(prefix):])
+    return nested
+
+
+def frame_to_records(df, confounders=()):
+    """
+    records_to_frame 的逆操作，将 "<混淆变量>.<参数名>" 列还原为参数字典（缺失值不还原）。
+
+    参数:
+        df (DataFrame): 数据表。
+        confounders (list): 数据集的 confounder_variables；只有这些混淆变量的参数列会被还原，
+            观察变量或其他名称中含 '.' 的列保持不变。
+    """
+    nested = _nested_columns(df.columns, confounders)
+    records = []
+    for row in df.to_dict(orient='records'):
+        record = {}
+        for key, value in row.items():
+            if isinstance(value, float) and np.isnan(value):
+                continue
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            if key in nested:
+                head, sub_key = nested[key]
+                record.setdefault(head, {})[sub_key] = value
+                continue
+            record[key] = value
+        records.append(record)
+    return records
+
+
+def _dataset_meta(dataset):
+    # data 之外的数据集级字段（variables、confounder_variables 等）保存到清单中
+    return {k: v for k, v in dataset.items() if k != 'data'}
+
+
+def save_frames(frames, path, fmt='arrow'):
+    """
+    将 [(meta, DataFrame), ...] 写为列式目录。
+
+    参数:
+        frames (list): 每项为数据集级字段（variables、confounder_variables 等）与数据表。
+        path (str): 输出目录，其中包含 manifest.json 与每个数据集一个的数据文件。
+        fmt (str): 'arrow'（需要 pyarrow，支持内存映射）或 'npz'（仅依赖 NumPy）。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}，可选: {FORMATS}")
+    if fmt == 'arrow' and pa is None:
+        raise ImportError("写入 Arrow 格式需要安装 pyarrow，或改用 fmt='npz'")
+
+    os.makedirs(path, exist_ok=True)
+    manifest = {'format': fmt, 'datasets': []}
+    for n, (meta, df) in enumerate(frames):
+        filename = f"dataset_{n:04d}.{fmt}"
+        file_path = os.path.join(path, filename)
+        if fmt == 'arrow':
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa_ipc.new_file(file_path, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            columns = {}
+            for col in df.columns:
+                values = df[col].to_numpy()
+                if values.dtype == object:
+                    # 列表与字符串等非数值列以JSON字符串保存，避免依赖pickle
+                    values = np.array([json.dumps(v, ensure_ascii=False) for v in values], dtype=np.str_)
+                    col = f"{col}#json"
+                columns[col] = values
+            np.savez(file_path, **{f"c{i}": v for i, v in enumerate(columns.values())})
+            manifest.setdefault('npz_columns', {})[filename] = list(columns.keys())
+        manifest['datasets'].append({'file': filename, 'rows': len(df), 'meta': meta})
+
+    with open(os.path.join(path, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+def save_datasets(all_data, path, fmt='arrow'):
+    """
+    将 [{"variables", "confounder_variables", "data": [...]}, ...] 结构写为列式目录。
+    """
+    save_frames([(_dataset_meta(d), records_to_frame(d.get('data', []))) for d in all_data], path, fmt=fmt)
+
+
+def _read_frame(path, manifest, entry, memory_map):
+    file_path = os.path.join(path, entry['file'])
+    if manifest['format'] == 'arrow':
+        if pa is None:
+            raise ImportError("读取 Arrow 格式需要安装 pyarrow")
+        source = pa.memory_map(file_path, 'r') if memory_map else pa.OSFile(file_path, 'rb')
+        table = pa_ipc.open_file(source).read_all()
+        # 每列单独一个 block：无缺失值的数值列直接是内存映射缓冲区上的只读视图，不会复制到进程内存
+        return table.to_pandas(split_blocks=True)
+
+    names = manifest['npz_columns'][entry['file']]
+    with np.load(file_path) as npz:
+        columns = {}
+        for i, name in enumerate(names):
+            values = npz[f"c{i}"]
+            if name.endswith('#json'):
+                name = name[:-len('#json')]
+                values = [json.loads(v) for v in values]
+            columns[name] = values
+    return pd.DataFrame(columns)
+
+
+def is_columnar(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST))
+
+
+def load_frames(path, memory_map=True):
+    """
+    读取数据集，返回 [(meta, DataFrame), ...]。
+
+    path 可以是列式目录（Arrow 文件通过内存映射打开），也可以是原有的JSON文件，
+    因此分析脚本可以用同一个入口读取两种格式。
+    """
+    if is_columnar(path):
+        with open(os.path.join(path, MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return [(entry['meta'], _read_frame(path, manifest, entry, memory_map)) for entry in manifest['datasets']]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        all_data = json.load(f)
+    return [(_dataset_meta(d), records_to_frame(d.get('data', []))) for d in all_data]
+
+
+def load_datasets(path, memory_map=True):
+    """
+    读取数据集并还原为与JSON文件相同的 [{"variables", "confounder_variables", "data": [...]}, ...] 结构。
+    """
+    if not is_columnar(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return [dict(meta, data=frame_to_records(df, meta.get('confounder_variables')))
+            for meta, df in load_frames(path, memory_map=memory_map)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 outcome/*_outcome/*.json 转换为列式数据目录。")
+    parser.add_argument("input", help="输入的JSON文件")
+    parser.add_argument("output", help="输出目录")
+    parser.add_argument("--format", choices=FORMATS, default='arrow' if pa is not None else 'npz')
+    args = parser.parse_args()
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        all_data = json.load(f)
+    save_datasets(all_data, args.output, fmt=args.format)
+    print(f"已将 {len(all_data)} 个数据集以 {args.format} 格式写入: {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
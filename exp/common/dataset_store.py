@@ -0,0 +1,308 @@
+## 共享数据集存储：把 Sachs CSV、bnlearn 生成的CSV（含 bn_sampling 分片目录）与 LLM outcome 数据集转换为标签编码的
+## .npy 数组与元数据，按源文件缓存；各进程用 np.memmap 打开同一文件，零拷贝共享，再次运行时直接载入
+
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+
+# 仓库根目录；缓存默认放在它下面
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_STORE_DIR = os.path.join(ROOT, '.dataset_store')
+# 存储格式变化时递增，旧缓存自动失效
+STORE_VERSION = 1
+META = 'meta.json'
+# 'auto': 只对非数值列做标签编码；'all': 所有列都做标签编码（离散检验 gsq/chisq 使用）
+ENCODINGS = ('auto', 'all')
+CHUNK_ROWS = 1_000_000
+
+
+class _Column:
+    """
+    单列的流式编码器。类别列按首次出现的顺序编号，全部数据读完后再重排为排序后的编号，
+    与 LabelEncoder / pd.factorize(sort=True) 的结果一致。
+    """
+
+    def __init__(self, name, categorical):
+        self.name = name
+        self.categorical = categorical
+        self.codes = {}
+
+    def encode(self, values):
+        if not self.categorical:
+            try:
+                return values.astype(np.float64)
+            except (TypeError, ValueError):
+                raise ValueError(f"列 {self.name} 在前面的数据块中为数值型，后续出现了非数值取值") from None
+        if values.dtype == object or values.dtype.kind in 'USb':
+            values = values.astype(str)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        lut = np.array([self.codes.setdefault(u, len(self.codes)) for u in uniques.tolist()], dtype=np.int64)
+        return lut[inverse.reshape(-1)]
+
+    def finalize(self):
+        """
+        返回 (排序后的类别列表, 首次出现编号 -> 排序编号 的映射数组)。
+        """
+        try:
+            classes = sorted(self.codes)
+        except TypeError:
+            raise ValueError(f"列 {self.name} 同时包含数值与字符串取值，无法排序编码") from None
+        remap = np.empty(len(classes), dtype=np.int64)
+        remap[[self.codes[c] for c in classes]] = np.arange(len(classes))
+        return classes, remap
+
+
+def _compact_int(cardinality):
+    for dtype in (np.int8, np.int16, np.int32):
+        if cardinality <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+def _is_numeric(series):
+    return series.dtype.kind in 'iuf'
+
+
+def _write_dataset(chunks, out_path, encode='auto', chunk_rows=CHUNK_ROWS):
+    """
+    将 DataFrame 块序列编码后写为一个二维 .npy（行为样本、列为变量）。
+
+    先把各块按首次出现编号追加到临时文件，读完后才知道每列的全部类别，再分块重排编号、
+    压缩为最小的整数类型写入最终文件；任何时刻内存中只有一个块。
+    """
+    tmp_path = out_path + '.raw'
+    columns, temp_dtype, rows = None, None, 0
+    with open(tmp_path, 'wb') as raw:
+        for df in chunks:
+            if columns is None:
+                columns = [_Column(str(name), encode == 'all' or not _is_numeric(df[name])) for name in df.columns]
+                temp_dtype = np.int64 if all(c.categorical for c in columns) else np.float64
+            elif [str(name) for name in df.columns] != [c.name for c in columns]:
+                raise ValueError("各数据块的列不一致")
+            block = np.empty((len(df), len(columns)), dtype=temp_dtype)
+            for j, (name, column) in enumerate(zip(df.columns, columns)):
+                block[:, j] = column.encode(df[name].to_numpy())
+            raw.write(block.tobytes())
+            rows += len(df)
+    columns = columns or []
+
+    classes, remaps = {}, {}
+    for j, column in enumerate(columns):
+        if column.categorical:
+            classes[column.name], remaps[j] = column.finalize()
+    if temp_dtype == np.int64:
+        dtype = _compact_int(max((len(c) for c in classes.values()), default=1))
+    else:
+        dtype = np.float64
+
+    shape = (rows, len(columns))
+    if rows == 0 or not columns:
+        np.save(out_path, np.zeros(shape, dtype=dtype))
+    else:
+        src = np.memmap(tmp_path, dtype=temp_dtype, mode='r', shape=shape)
+        out = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=shape)
+        for start in range(0, rows, chunk_rows):
+            block = np.array(src[start:start + chunk_rows])
+            for j, remap in remaps.items():
+                block[:, j] = remap[block[:, j].astype(np.int64)]
+            out[start:start + chunk_rows] = block
+        out.flush()
+        del src, out
+    os.remove(tmp_path)
+    return {
+        'rows': rows,
+        'dtype': np.dtype(dtype).name,
+        'columns': [c.name for c in columns],
+        'categorical': [c.name for c in columns if c.categorical],
+        'classes': {name: [v if isinstance(v, str) else float(v) for v in values] for name, values in classes.items()},
+    }
+
+
+def _sources(path, chunk_rows=CHUNK_ROWS):
+    """
+    逐个产出源中的数据集 (数据集级元数据, DataFrame 块迭代器)：
+    bn_sampling 分片目录与CSV文件各为一个数据集，分块读取；outcome JSON 与列式目录中每个数据集一项。
+    """
+    import pandas as pd
+    from .bn_sampling import MANIFEST as SHARD_MANIFEST
+
+    shard_manifest = os.path.join(path, SHARD_MANIFEST)
+    if os.path.isdir(path) and os.path.exists(shard_manifest):
+        with open(shard_manifest, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        def shards():
+            for shard in manifest['shards']:
+                file_path = os.path.join(path, shard['file'])
+                if file_path.endswith('.parquet'):
+                    yield pd.read_parquet(file_path)
+                else:
+                    yield from pd.read_csv(file_path, chunksize=chunk_rows)
+
+        yield {'model': manifest.get('model'), 'seed': manifest.get('seed')}, shards()
+    elif path.endswith('.csv'):
+        yield {}, pd.read_csv(path, chunksize=chunk_rows)
+    else:
+        from .columnar import load_frames
+
+        for meta, df in load_frames(path):
+            yield meta, iter([df])
+
+
+def source_key(path, encode='auto'):
+    """
+    源文件（或目录内各文件）的路径、大小与修改时间的哈希。只读取文件状态，不读取内容，
+    因此检查上亿行的CSV是否已缓存也是瞬时的；文件被改写后修改时间变化，缓存自动失效。
+    """
+    path = os.path.realpath(path)
+    h = hashlib.sha256(f"v{STORE_VERSION}|{encode}|{path}".encode('utf-8'))
+    files = [path] if os.path.isfile(path) else sorted(os.path.join(path, n) for n in os.listdir(path))
+    for file_path in files:
+        if os.path.isfile(file_path):
+            st = os.stat(file_path)
+            h.update(f"|{os.path.basename(file_path)}:{st.st_size}:{st.st_mtime_ns}".encode('utf-8'))
+    return h.hexdigest()
+
+
+def _entry(path, store_dir, encode):
+    key = source_key(path, encode)
+    stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    return os.path.join(store_dir, f"{stem}-{key[:16]}"), key
+
+
+class StoredDataset:
+    """
+    存储中的一个数据集。对象只持有 .npy 路径与元数据，传给子进程时不会复制数组；
+    首次访问 data 时才用内存映射打开文件，多个进程共享操作系统页缓存中的同一份数据。
+
+    提供 columns 与 to_numpy()，可以直接传给接收 DataFrame 的 discover_causal_structure。
+
+    属性:
+        path (str): .npy 文件路径。
+        columns (list): 列名（经 select 后为选中的列）。
+        classes (dict): 类别列 -> 排序后的类别列表，编号即列表下标。
+        meta (dict): 数据集级字段（variables、confounder_variables 等）。
+        rows (int): 行数。
+    """
+
+    def __init__(self, path, columns, classes=None, meta=None, rows=0, index=None):
+        self.path = path
+        self.columns = list(columns)
+        self.classes = classes or {}
+        self.meta = meta or {}
+        self.rows = rows
+        self._index = index
+        self._data = None
+
+    def __repr__(self):
+        return f"StoredDataset({self.rows} 行 x {len(self.columns)} 列, path={self.path!r})"
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_data'] = None
+        return state
+
+    @property
+    def shape(self):
+        return (self.rows, len(self.columns))
+
+    @property
+    def data(self):
+        """
+        只读的 np.memmap。所选列是连续的一段时为视图（零拷贝），否则按列复制一份。
+        """
+        if self._data is None:
+            data = np.load(self.path, mmap_mode='r')
+            index = self._index
+            if index is not None and len(index) and list(index) == list(range(index[0], index[-1] + 1)):
+                data = data[:, index[0]:index[-1] + 1]
+            elif index is not None:
+                data = data[:, index]
+            self._data = data
+        return self._data
+
+    def to_numpy(self):
+        # 普通 ndarray 视图，仍指向映射的内存；供只接受 np.ndarray 的库使用
+        return np.asarray(self.data)
+
+    def select(self, columns=None, drop=()):
+        """
+        返回只包含指定列（默认全部）并去掉 drop 中各列的数据集，如 select(drop=['id'])。
+        """
+        names = [c for c in (columns or self.columns) if c not in set(drop)]
+        missing = [c for c in names if c not in self.columns]
+        if missing:
+            raise KeyError(f"数据集中没有列: {missing}")
+        base = self._index if self._index is not None else list(range(len(self.columns)))
+        index = [base[self.columns.index(c)] for c in names]
+        return StoredDataset(self.path, names, {c: v for c, v in self.classes.items() if c in names},
+                             self.meta, self.rows, index=index)
+
+
+def build(path, store_dir=DEFAULT_STORE_DIR, encode='auto', chunk_rows=CHUNK_ROWS):
+    """
+    将源转换为存储目录 <store_dir>/<源文件名>-<键前缀>/，包含每个数据集一个的 .npy 与 meta.json。
+
+    先写入临时目录再整体改名，中断或多个进程同时构建时都不会留下不完整的缓存。
+
+    返回:
+        str: 存储目录。
+    """
+    if encode not in ENCODINGS:
+        raise ValueError(f"不支持的编码方式: {encode}，可选: {ENCODINGS}")
+    entry, key = _entry(path, store_dir, encode)
+    tmp = f"{entry}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        datasets = []
+        for n, (meta, chunks) in enumerate(_sources(path, chunk_rows)):
+            filename = f"data_{n:04d}.npy"
+            info = _write_dataset(chunks, os.path.join(tmp, filename), encode=encode, chunk_rows=chunk_rows)
+            datasets.append(dict(info, file=filename, meta=meta))
+        with open(os.path.join(tmp, META), 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION, 'source': os.path.realpath(path), 'key': key, 'encode': encode,
+                       'datasets': datasets}, f, indent=2, ensure_ascii=False)
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            if not os.path.exists(os.path.join(entry, META)):
+                raise
+            # 另一个进程已先完成构建，使用它的结果
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return entry
+
+
+def open_datasets(path, store_dir=DEFAULT_STORE_DIR, encode='auto', rebuild=False, chunk_rows=CHUNK_ROWS):
+    """
+    打开源对应的全部数据集，缓存不存在（或源文件已变化）时先构建。
+
+    参数:
+        path (str): CSV 文件、bn_sampling 分片目录、outcome JSON 文件或 columnar 列式目录。
+        store_dir (str): 缓存根目录。
+        encode (str): 'auto' 或 'all'，见 ENCODINGS。
+        rebuild (bool): 忽略已有缓存重新构建。
+
+    返回:
+        list: StoredDataset 列表。
+    """
+    entry, _ = _entry(path, store_dir, encode)
+    if rebuild:
+        shutil.rmtree(entry, ignore_errors=True)
+    if not os.path.exists(os.path.join(entry, META)):
+        entry = build(path, store_dir=store_dir, encode=encode, chunk_rows=chunk_rows)
+    with open(os.path.join(entry, META), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return [StoredDataset(os.path.join(entry, d['file']), d['columns'], d['classes'], d['meta'], d['rows'])
+            for d in manifest['datasets']]
+
+
+def open_dataset(path, **kwargs):
+    """
+    打开只包含一个数据集的源（CSV 文件或分片目录）。
+    """
+    return open_datasets(path, **kwargs)[0]
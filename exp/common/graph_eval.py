@@ -0,0 +1,275 @@
+## 因果图结构评估：把发现的图（causallearn 的 causal_graph.G 或 pc_batch 结果中的边列表）与真实结构转换为邻接矩阵数组，
+## 用NumPy对成千上万个图一次性计算 SHD 与邻接/方向的精确率、召回率、F1，并按实验输出汇总表
+
+import os
+import json
+
+import numpy as np
+
+# Sachs 蛋白信号网络的公认结构（Sachs et al. 2005；与 bnlearn 的 sachs.bif 相同的 17 条边），节点名为 sachs_dataset.csv 的列名
+SACHS_NODES = ['raf', 'mek', 'plc', 'pip2', 'pip3', 'erk', 'akt', 'pka', 'pkc', 'p38', 'jnk']
+SACHS_EDGES = [
+    ('pkc', 'pka'), ('pkc', 'raf'), ('pka', 'raf'), ('pkc', 'mek'), ('pka', 'mek'), ('raf', 'mek'),
+    ('mek', 'erk'), ('pka', 'erk'), ('erk', 'akt'), ('pka', 'akt'), ('pkc', 'p38'), ('pka', 'p38'),
+    ('pkc', 'jnk'), ('pka', 'jnk'), ('plc', 'pip3'), ('plc', 'pip2'), ('pip3', 'pip2'),
+]
+METRICS = ('shd', 'shd_cpdag', 'adj_precision', 'adj_recall', 'adj_f1',
+           'orient_precision', 'orient_recall', 'orient_f1')
+_STATS = ('mean', 'std', 'median', 'min', 'max')
+
+
+def dag_to_cpdag(dag):
+    """
+    DAG 的马尔可夫等价类（CPDAG）：保留 v-结构的方向，再反复应用 Meek 规则 R1–R3 传播方向，其余边为无向边。
+
+    参数:
+        dag (np.ndarray): (n, n)，dag[i, j] = 1 表示 i -> j。
+
+    返回:
+        np.ndarray: (n, n) int8，cp[i, j] = cp[j, i] = 1 表示无向边 i — j。
+    """
+    dag = np.asarray(dag, dtype=bool)
+    n = dag.shape[0]
+    skel = dag | dag.T
+    cp = skel.copy()
+    for k in range(n):
+        parents = np.flatnonzero(dag[:, k])
+        for a, i in enumerate(parents):
+            for j in parents[a + 1:]:
+                if not skel[i, j]:
+                    cp[k, i] = cp[k, j] = False
+
+    def directed(i, j):
+        return cp[i, j] and not cp[j, i]
+
+    changed = True
+    while changed:
+        changed = False
+        for i, j in zip(*np.nonzero(cp & cp.T)):
+            if not (cp[i, j] and cp[j, i]):
+                continue  # 本轮已被定向
+            others = [k for k in range(n) if k != i and k != j]
+            r1 = any(directed(k, i) and not skel[k, j] for k in others)
+            r2 = any(directed(i, k) and directed(k, j) for k in others)
+            r3 = any(cp[i, k] and cp[k, i] and cp[i, l] and cp[l, i] and directed(k, j) and directed(l, j)
+                     and not skel[k, l] for a, k in enumerate(others) for l in others[a + 1:])
+            if r1 or r2 or r3:
+                cp[j, i] = False
+                changed = True
+    return cp.astype(np.int8)
+
+
+class TruthGraph:
+    """
+    真实因果结构。
+
+    属性:
+        nodes (list): 节点名，决定评估数组的行列顺序。
+        dag (np.ndarray): (n, n) int8 有向邻接矩阵。
+        cpdag (np.ndarray): dag 的等价类，用于 shd_cpdag。
+        aliases (dict): 其他写法（如 LLM 数据中的变量全称）-> 节点名。
+    """
+
+    def __init__(self, nodes, edges, aliases=None, name=None):
+        self.nodes = list(nodes)
+        self.name = name
+        self._lookup = {node.lower(): i for i, node in enumerate(self.nodes)}
+        for alias, node in (aliases or {}).items():
+            self._lookup.setdefault(alias.strip().lower(), self.nodes.index(node))
+        self.dag = np.zeros((len(self.nodes), len(self.nodes)), dtype=np.int8)
+        for parent, child in edges:
+            self.dag[self.nodes.index(parent), self.nodes.index(child)] = 1
+        self.cpdag = dag_to_cpdag(self.dag)
+
+    def __repr__(self):
+        return f"TruthGraph({self.name!r}, {len(self.nodes)} 个节点, {int(self.dag.sum())} 条边)"
+
+    def index(self, name):
+        """
+        节点名或别名 -> 行列下标（不区分大小写），不在真实结构中的变量（如LLM提出的混淆变量）返回 -1。
+        """
+        return self._lookup.get(str(name).strip().lower(), -1)
+
+
+def load_truth_graph(spec):
+    """
+    读取真实结构：'sachs'、bn_model.MODELS 中的模型名、.bif 文件，
+    或 {"nodes": [...], "edges": [[父, 子], ...], "aliases": {...}} 格式的JSON文件。
+    pair_scan.DATASETS 中登记的变量全称自动作为别名，LLM生成数据的列名因此可以直接对齐。
+    """
+    from .bn_model import MODELS, load_model
+    from .pair_scan import DATASETS
+
+    stem = os.path.splitext(os.path.basename(spec))[0]
+    aliases = {full: column for column, full in DATASETS.get(stem, {}).get('names', {}).items()}
+    if spec == 'sachs':
+        return TruthGraph(SACHS_NODES, SACHS_EDGES, aliases, name='sachs')
+    if spec in MODELS or spec.endswith('.bif'):
+        model = load_model(spec)
+        return TruthGraph(model.nodes, model.edges(), aliases, name=stem)
+    with open(spec, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    return TruthGraph(raw['nodes'], raw['edges'], dict(aliases, **raw.get('aliases', {})), name=stem)
+
+
+def _endpoint(value):
+    # causallearn 的 Endpoint 可能被序列化为 'ARROW' 或 'Endpoint.ARROW'
+    return str(value).split('.')[-1].upper()
+
+
+def graph_matrix(G):
+    """
+    causallearn GeneralGraph -> (节点名列表, 邻接矩阵)。
+
+    矩阵 A 的约定与真实结构一致：A[i, j] = 1 且 A[j, i] = 0 表示 i -> j；A[i, j] = A[j, i] = 1 表示未定向的边
+    （无向边，以及 PC 方向冲突产生的双向边）。G.graph 中 graph[i, j] = -1 且 graph[j, i] = 1 表示 i -> j。
+    """
+    g = np.asarray(G.graph)
+    names = [node.get_name() for node in G.get_nodes()]
+    unoriented = (g != 0) & (g == g.T)
+    return names, (((g == -1) | (g == 2)) & (g.T != 0) | unoriented).astype(np.int8)
+
+
+def stack_graphs(graphs, truth):
+    """
+    将一批图对齐到真实结构的节点顺序，返回 (est, present)：
+    est 为 (B, n, n) 的邻接数组，present 为 (B, n) 表示每个图包含哪些真实节点。真实结构之外的节点被忽略。
+
+    参数:
+        graphs (list): 每项为 pc_batch 结果格式的 (节点名列表, 边列表 [[节点1, 端点1, 端点2, 节点2], ...])。
+    """
+    n = len(truth.nodes)
+    present = np.zeros((len(graphs), n), dtype=bool)
+    marks = []
+    index = {}  # 同一批图中节点名大量重复，缓存查找结果
+
+    def lookup(name):
+        code = index.get(name)
+        if code is None:
+            code = index[name] = truth.index(name)
+        return code
+
+    for b, (nodes, edges) in enumerate(graphs):
+        idx = np.array([lookup(name) for name in nodes], dtype=np.int64)
+        present[b, idx[idx >= 0]] = True
+        for node1, end1, end2, node2 in edges:
+            i, j = lookup(node1), lookup(node2)
+            if i < 0 or j < 0:
+                continue
+            end1, end2 = _endpoint(end1), _endpoint(end2)
+            both_arrows = end1 == 'ARROW' and end2 == 'ARROW'
+            # 非箭头端点一侧记为 1：i -> j 记 A[i, j]；无向边与双向边两侧都记
+            if end1 != 'ARROW' or both_arrows:
+                marks.append((b, i, j))
+            if end2 != 'ARROW' or both_arrows:
+                marks.append((b, j, i))
+    est = np.zeros((len(graphs), n, n), dtype=bool)
+    if marks:
+        b_idx, i_idx, j_idx = np.asarray(marks, dtype=np.int64).T
+        est[b_idx, i_idx, j_idx] = True
+    return est, present
+
+
+def stack_matrices(graphs, truth):
+    """
+    与 stack_graphs 相同，输入为 (节点名列表, 邻接矩阵) 的列表，如 graph_matrix 的返回值。
+    """
+    n = len(truth.nodes)
+    est = np.zeros((len(graphs), n, n), dtype=bool)
+    present = np.zeros((len(graphs), n), dtype=bool)
+    for b, (nodes, matrix) in enumerate(graphs):
+        idx = np.array([truth.index(name) for name in nodes], dtype=np.int64)
+        keep = idx >= 0
+        est[b][np.ix_(idx[keep], idx[keep])] = np.asarray(matrix, dtype=bool)[np.ix_(keep, keep)]
+        present[b, idx[keep]] = True
+    return est, present
+
+
+def _ratio(num, den):
+    return np.divide(num, den, out=np.full(num.shape, np.nan), where=den > 0)
+
+
+def _f1(precision, recall):
+    # 精确率或召回率本身无定义时为 NaN；两者都有定义但都为 0（没有一条边正确）时为 0，而不是从均值中剔除
+    total = precision + recall
+    out = np.where(np.isnan(total), np.nan, 0.0)
+    return np.divide(2 * precision * recall, total, out=out, where=total > 0)
+
+
+def evaluate_graphs(est, present, truth):
+    """
+    逐图计算结构指标，所有图在一次数组运算中完成。只统计两端节点都出现在该图中的节点对（真实结构取诱导子图）。
+
+    - shd: 状态（无边 / i->j / j->i / 无向）与真实 DAG 不同的节点对数；shd_cpdag 与真实 CPDAG 比较，
+      PC 只能确定到等价类，后者不惩罚无法定向的边。
+    - adj_*: 骨架上的精确率 / 召回率 / F1。
+    - orient_*: 已定向的边中方向与真实 DAG 一致的比例，以及真实有向边中被正确定向的比例。
+    精确率 / 召回率的分母为 0 时为 NaN，F1 在其中之一为 NaN 时为 NaN，两者都为 0 时为 0。
+
+    返回:
+        dict: 指标名 -> 长度 B 的数组。
+    """
+    est = np.asarray(est, dtype=bool)
+    n = est.shape[1]
+    offdiag = ~np.eye(n, dtype=bool)
+    pairs = present[:, :, None] & present[:, None, :] & offdiag
+    upper = pairs & np.triu(offdiag)
+    est_t = est.transpose(0, 2, 1)
+
+    def shd(truth_adj):
+        t = truth_adj.astype(bool)[None]
+        return (((est != t) | (est_t != t.transpose(0, 2, 1))) & upper).sum(axis=(1, 2))
+
+    dag = truth.dag.astype(bool)[None]
+    skel_est, skel_true = est | est_t, dag | dag.transpose(0, 2, 1)
+    adj_tp = (skel_est & skel_true & upper).sum(axis=(1, 2))
+    adj_precision = _ratio(adj_tp, (skel_est & upper).sum(axis=(1, 2)))
+    adj_recall = _ratio(adj_tp, (skel_true & upper).sum(axis=(1, 2)))
+
+    dir_est = est & ~est_t & pairs
+    orient_tp = (dir_est & dag).sum(axis=(1, 2))
+    orient_precision = _ratio(orient_tp, dir_est.sum(axis=(1, 2)))
+    orient_recall = _ratio(orient_tp, (dag & pairs).sum(axis=(1, 2)))
+    return {
+        'shd': shd(truth.dag),
+        'shd_cpdag': shd(truth.cpdag),
+        'adj_precision': adj_precision,
+        'adj_recall': adj_recall,
+        'adj_f1': _f1(adj_precision, adj_recall),
+        'orient_precision': orient_precision,
+        'orient_recall': orient_recall,
+        'orient_f1': _f1(orient_precision, orient_recall),
+    }
+
+
+def evaluate_results(results, truth):
+    """
+    评估 pc_batch 的结果列表（run_pc_batch 的返回值或 save_batch_results 写出的JSON），跳过运行失败的数据集。
+
+    返回:
+        tuple: (逐图指标字典, 参与评估的结果列表)
+    """
+    ok = [r for r in results if not r.get('error')]
+    est, present = stack_graphs([(r['nodes'], r['edges']) for r in ok], truth)
+    return evaluate_graphs(est, present, truth), ok
+
+
+def summarize(metrics):
+    """
+    各指标在所有图上的 mean / std / median / min / max（忽略 NaN），以及有效值个数 n。
+    """
+    summary = {}
+    for name in METRICS:
+        values = np.asarray(metrics[name], dtype=np.float64)
+        valid = values[~np.isnan(values)]
+        stats = {stat: float(getattr(np, stat)(valid)) if len(valid) else float('nan') for stat in _STATS}
+        summary[name] = dict(stats, n=int(len(valid)))
+    return summary
+
+
+def print_summary(summary, title, graphs, failed=0):
+    print(f"\n[{title}]  {graphs} 个图" + (f"，{failed} 个运行失败未计入" if failed else ''))
+    print(f"  {'指标':<16}" + ''.join(f"{stat:>9}" for stat in _STATS) + f"{'n':>7}")
+    for name in METRICS:
+        row = summary[name]
+        print(f"  {name:<18}" + ''.join(f"{row[stat]:>9.3f}" for stat in _STATS) + f"{row['n']:>7}")
@@ -0,0 +1,260 @@
+## 混淆变量假设的排序指标：流式读取JSON/JSONL结果，按观察变量组合与模型分组，用NumPy计算命中率、MRR、hit@k、频次表与自助置信区间
+
+import os
+import json
+
+import numpy as np
+
+from .llm_decode import loads
+
+DEFAULT_TOPK = (1, 3, 5)
+# 真值表中对所有变量组合生效的键
+ANY_PAIR = '*'
+_SEPARATORS = ' \t\r\n,'
+
+
+def iter_json_array(f, chunk_size=1 << 20):
+    """
+    逐个产出顶层JSON数组中的元素，按块读取文件，内存占用与单条记录大小相当而不是整个文件。
+    顶层不是数组时（单个对象）整体解析后产出一次。
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof, started = '', 0, False, False
+    while True:
+        while pos < len(buf) and buf[pos] in _SEPARATORS:
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                if started:
+                    raise ValueError("JSON数组未闭合，文件可能被截断")
+                return
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+            continue
+        if not started:
+            if buf[pos] != '[':
+                yield loads(buf[pos:] + f.read())
+                return
+            started, pos = True, pos + 1
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = f.read(chunk_size)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield value
+        pos = end
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def iter_records(path):
+    """
+    流式读取一次运行结果文件中的假设记录。支持 outcome 中的JSON列表与JSONL；
+    检查点文件（每行 {"key", "result"}）会取出 result，结果为 null 的运行（LLM判断无混淆变量）原样保留为空记录。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = loads(line)
+                if isinstance(entry, dict) and 'key' in entry and 'result' in entry:
+                    entry = entry['result'] or {}
+                yield entry
+        else:
+            for entry in iter_json_array(f):
+                yield entry
+
+
+def pair_key(variables):
+    """
+    观察变量组合的键，与变量顺序无关。
+    """
+    return ' | '.join(sorted(variables or []))
+
+
+def load_truth(spec):
+    """
+    读取真值集合。spec 为JSON文件路径时，内容为 {"变量1 | 变量2": ["肺癌", "Lung Cancer"], "*": [...]}，
+    键中的变量顺序任意，"*" 对未列出的组合生效；否则按逗号分隔的名称列表，对所有组合生效。
+
+    返回:
+        dict: pair_key -> 名称元组（保留原大小写，是否区分大小写由 RankTable 的 ignore_case 决定）
+    """
+    if os.path.isfile(spec):
+        with open(spec, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        return {(k if k == ANY_PAIR else pair_key([v.strip() for v in k.split('|')])):
+                tuple(name.strip() for name in names)
+                for k, names in raw.items()}
+    return {ANY_PAIR: tuple(name.strip() for name in spec.split(',') if name.strip())}
+
+
+def first_hit_rank(names, ranks, truth, ignore_case=False):
+    """
+    返回第一个命中真值的假设的排名（未命中为 0）。命中规则与原分析脚本一致：真值名称是假设名称的子串，区分大小写；
+    ignore_case 为 True 时不区分大小写（如英文结果中的 "Lung Cancer" 与真值 "lung cancer"）。
+    """
+    if ignore_case:
+        truth = [ans.lower() for ans in truth]
+    for name, rank in zip(names, ranks):
+        if ignore_case:
+            name = name.lower()
+        if any(ans in name for ans in truth):
+            return rank
+    return 0
+
+
+class RankTable:
+    """
+    将假设记录压缩为定长数组：每次运行一个首个命中排名（0 表示未命中）与分组编号，
+    每个假设一个名称编号，指标与频次表都在这些数组上用NumPy计算。
+
+    参数:
+        truth (dict): load_truth 的返回值。
+        canonicalize (callable | None): 假设名称的规范化函数，用于频次表与命中判断，默认只去除首尾空白。
+        ignore_case (bool): 命中判断是否不区分大小写，默认与原分析脚本一致区分大小写。
+    """
+
+    def __init__(self, truth, canonicalize=None, ignore_case=False):
+        self.truth = truth
+        self.canonicalize = canonicalize or str.strip
+        self.ignore_case = ignore_case
+        self.groups = {}
+        self.names = {}
+        self._ranks = []
+        self._run_groups = []
+        self._name_ids = []
+        self._name_groups = []
+
+    def _code(self, table, key):
+        code = table.get(key)
+        if code is None:
+            code = table[key] = len(table)
+        return code
+
+    def add(self, record, source=''):
+        variables = record.get('variables') or []
+        key = pair_key(variables)
+        group = self._code(self.groups, (key, record.get('model') or source))
+        truth = self.truth.get(key, self.truth.get(ANY_PAIR, ()))
+        hypotheses = record.get('confounder_hypotheses') or []
+        names = [self.canonicalize(str(h.get('confounder', ''))) for h in hypotheses]
+        for name in names:
+            self._name_ids.append(self._code(self.names, name))
+            self._name_groups.append(group)
+        ranks = [int(h.get('rank') or n + 1) for n, h in enumerate(hypotheses)]
+        self._ranks.append(first_hit_rank(names, ranks, truth, ignore_case=self.ignore_case))
+        self._run_groups.append(group)
+
+    def extend(self, path, source=None):
+        source = source if source is not None else os.path.splitext(os.path.basename(path))[0]
+        for record in iter_records(path):
+            self.add(record, source)
+        return self
+
+    def arrays(self):
+        return (np.asarray(self._ranks, dtype=np.int32), np.asarray(self._run_groups, dtype=np.int32),
+                np.asarray(self._name_ids, dtype=np.int64), np.asarray(self._name_groups, dtype=np.int64))
+
+    @property
+    def group_labels(self):
+        return [label for label, _ in sorted(self.groups.items(), key=lambda item: item[1])]
+
+    @property
+    def name_labels(self):
+        return [label for label, _ in sorted(self.names.items(), key=lambda item: item[1])]
+
+
+def metric_columns(ranks, ks=DEFAULT_TOPK):
+    """
+    每次运行的指标取值矩阵 (n_runs, 2 + len(ks))：列依次为命中、倒数排名、hit@k。对列按组求均值即得各指标。
+    """
+    hit = ranks > 0
+    rr = np.divide(1.0, ranks, out=np.zeros(ranks.shape, dtype=np.float64), where=hit)
+    columns = [hit, rr] + [hit & (ranks <= k) for k in ks]
+    return np.column_stack(columns).astype(np.float64) if len(ranks) else np.zeros((0, 2 + len(ks)))
+
+
+def group_means(values, codes, n_groups):
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.stack([np.bincount(codes, weights=values[:, j], minlength=n_groups) for j in range(values.shape[1])],
+                    axis=1)
+    return sums / np.maximum(counts, 1)[:, None], counts
+
+
+def bootstrap_ci(values, n_boot=1000, ci=0.95, seed=0):
+    """
+    对一组运行的指标矩阵做自助重采样，返回各列均值的 (下界, 上界)，形状 (2, n_cols)。
+
+    指标只由首个命中排名决定，不同的行只有十几种。n 次有放回抽样等价于对这些不同行的
+    多项分布抽样，因此每次重采样只需一次多项分布抽样与一次小矩阵乘法，耗时与运行次数无关。
+    """
+    n, m = values.shape
+    if n == 0 or n_boot <= 0:
+        return np.full((2, m), np.nan)
+    rng = np.random.default_rng(seed)
+    unique_rows, counts = np.unique(values, axis=0, return_counts=True)
+    draws = rng.multinomial(n, counts / n, size=n_boot)
+    means = draws @ unique_rows / n
+    tail = (1 - ci) / 2 * 100
+    return np.percentile(means, [tail, 100 - tail], axis=0)
+
+
+def frequency_table(name_ids, name_groups, n_names, n_groups):
+    """
+    各组内每个假设名称被提出的次数，返回 (n_groups, n_names) 的计数矩阵。
+    """
+    flat = np.bincount(name_groups * n_names + name_ids, minlength=n_groups * n_names)
+    return flat.reshape(n_groups, n_names)
+
+
+def evaluate(table, ks=DEFAULT_TOPK, n_boot=1000, ci=0.95, seed=0, top_n=10):
+    """
+    计算每个 (变量组合, 模型) 分组的指标。
+
+    返回:
+        list: 每组一个字典，包含 pair、model、runs、hit_rate、mrr、hit@k、各指标的置信区间 ci 与频次最高的 top_n 个假设。
+    """
+    ranks, run_groups, name_ids, name_groups = table.arrays()
+    labels, names = table.group_labels, table.name_labels
+    values = metric_columns(ranks, ks)
+    means, counts = group_means(values, run_groups, len(labels))
+    freq = frequency_table(name_ids, name_groups, len(names), len(labels))
+    metric_names = ['hit_rate', 'mrr'] + [f'hit@{k}' for k in ks]
+
+    order = np.argsort(run_groups, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    results = []
+    for g, (pair, model) in enumerate(labels):
+        rows = values[order[bounds[g]:bounds[g + 1]]]
+        low, high = bootstrap_ci(rows, n_boot=n_boot, ci=ci, seed=seed + g)
+        top = np.argsort(-freq[g], kind='stable')[:top_n]
+        results.append({
+            'pair': pair,
+            'model': model,
+            'runs': int(counts[g]),
+            **{name: float(means[g, j]) for j, name in enumerate(metric_names)},
+            'ci': {name: [float(low[j]), float(high[j])] for j, name in enumerate(metric_names)},
+            'frequency': [{'confounder': names[i], 'count': int(freq[g, i]),
+                           'share': float(freq[g, i] / max(1, counts[g]))} for i in top if freq[g, i]],
+        })
+    return results
+
+
+def print_report(results, ci=0.95):
+    for r in results:
+        print(f"\n[{r['model']}] {r['pair']}  ({r['runs']} 次运行)")
+        for item in r['frequency']:
+            print(f"  - {item['confounder']:<25}: 提出了 {item['count']:>2} 次 (频率: {item['share'] * 100:.1f}%)")
+        for name in [k for k in r['ci']]:
+            low, high = r['ci'][name]
+            interval = f"  {ci:.0%} CI [{low:.3f}, {high:.3f}]" if not np.isnan(low) else ''
+            print(f"  {name:<10} {r[name]:.4f}{interval}")
@@ -0,0 +1,189 @@
+## LLM响应的磁盘缓存（内容寻址 + LRU淘汰）
+
+import os
+import time
+import json
+import sqlite3
+import hashlib
+
+
+class CacheMissError(RuntimeError):
+    """仅回放模式下请求未命中缓存时抛出。"""
+
+
+class ResponseCache:
+    """
+    以 (模型名, 渲染后的prompt, 采样参数) 的哈希为键，将LLM原始返回内容持久化到SQLite文件中。
+
+    参数:
+        cache_dir (str): 缓存目录，索引与内容保存在其中的 responses.sqlite。
+        max_bytes (int): 缓存内容的总字节上限，超过后按最近最少使用顺序淘汰。
+        replay_only (bool): 仅回放模式。未命中时抛出 CacheMissError 而不是调用API，用于离线复现分析。
+    """
+
+    def __init__(self, cache_dir='.llm_cache', max_bytes=512 * 1024 * 1024, replay_only=False):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'responses.sqlite')
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.discarded = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, content TEXT,"
+            " size INTEGER, created REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, prompt, params):
+        """
+        计算缓存键。params 中包含温度等采样参数以及 sample_index（同一prompt的第几次独立采样）。
+        """
+        payload = json.dumps({"model": model, "prompt": prompt, "params": params},
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return row[0]
+
+    def put(self, key, model, content):
+        now = time.time()
+        size = len(content.encode('utf-8'))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, content, size, created, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, content, size, now, now),
+        )
+        self._conn.commit()
+        self.writes += 1
+        self._evict()
+
+    def discard(self, key):
+        """
+        删除一条校验失败的缓存内容，本次查找改记为未命中，之后会重新调用API。
+        """
+        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._conn.commit()
+        self.discarded += 1
+        self.hits -= 1
+        self.misses += 1
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+        self._conn.commit()
+
+    def stats(self):
+        entries, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "discarded": self.discarded,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"LLM缓存: 命中 {s['hits']} 次, 未命中 {s['misses']} 次 (命中率 {s['hit_rate']:.1%}), "
+              f"写入 {s['writes']} 条, 淘汰 {s['evictions']} 条, 丢弃无效 {s['discarded']} 条, 当前 {s['entries']} 条 / {s['bytes'] / 1024:.1f} KB")
+
+
+def _lookup(cache, model, prompt, params, validate=None):
+    if cache is None:
+        return None, None
+    key = cache.make_key(model, prompt, params)
+    content = cache.get(key)
+    if content is not None and not _is_valid(validate, content):
+        # 校验前写入的无法解码的内容：丢弃后重新请求，否则以相同 sample_index 恢复的运行会一直拿到同一个坏结果
+        cache.discard(key)
+        content = None
+    if content is None and cache.replay_only:
+        raise CacheMissError(f"仅回放模式下缓存未命中 (model={model}, key={key[:12]})")
+    return key, content
+
+
+def _is_valid(validate, content):
+    if not content:
+        return False
+    if validate is None:
+        return True
+    try:
+        validate(content)
+        return True
+    except Exception:
+        return False
+
+
+def cached_completion(client, model, prompt, cache=None, sample_index=0, validate=None, **params):
+    """
+    带缓存的单轮对话调用，返回LLM的文本内容。
+
+    参数:
+        client: OpenAI 客户端；仅回放模式下可以为 None。
+        model (str): 模型名称。
+        prompt (str): 渲染后的完整prompt。
+        cache (ResponseCache | None): 响应缓存，为 None 时直接调用API。
+        sample_index (int): 同一prompt的独立采样序号（如运行id），保证重复采样不会被缓存折叠为同一结果。
+        validate (callable | None): validate(content) 抛出异常表示内容无法解码或不符合约定，这样的内容不写入缓存，
+            否则被截断或格式错误的返回会在每次重跑与回放中重现。为 None 时缓存任何非空内容。
+        **params: 透传给 chat.completions.create 的采样参数（如 temperature）。
+    """
+    key, content = _lookup(cache, model, prompt, dict(params, sample_index=sample_index), validate)
+    if content is not None:
+        return content
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        **params,
+    )
+    content = response.choices[0].message.content
+    if cache is not None and _is_valid(validate, content):
+        cache.put(key, model, content)
+    return content
+
+
+async def acached_completion(client, model, prompt, cache=None, sample_index=0, validate=None, **params):
+    """
+    cached_completion 的异步版本，client 为 AsyncOpenAI。
+    """
+    key, content = _lookup(cache, model, prompt, dict(params, sample_index=sample_index), validate)
+    if content is not None:
+        return content
+
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        **params,
+    )
+    content = response.choices[0].message.content
+    if cache is not None and _is_valid(validate, content):
+        cache.put(key, model, content)
+    return content
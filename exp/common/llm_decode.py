@@ -0,0 +1,295 @@
+## LLM返回内容的统一解码：快速JSON后端 + 预编译的修复流程 + 混淆变量假设/数据集的结构校验
+
+import re
+import json
+import threading
+from collections import Counter
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时退回标准库 json
+    orjson = None
+
+
+def loads(text):
+    """
+    使用可用的最快后端解析JSON。orjson 的 JSONDecodeError 是 json.JSONDecodeError 的子类，调用方无需区分。
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class SchemaError(ValueError):
+    """JSON 可以解析，但结构不符合混淆变量假设或数据集的约定。"""
+
+
+class DecodeStats:
+    """
+    线程安全的解码计数：fast 为未经修复直接解析成功的次数，repaired 为修复后解析成功的次数，
+    failed 为修复后仍无法解析的次数，schema_error 为解析成功但结构校验失败的次数，其余键为各类缺陷被修复的次数。
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, key, n=1):
+        if n:
+            with self.lock:
+                self.counters[key] += n
+
+    def print_stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        if not counters:
+            return
+        parsed = counters.get('fast', 0) + counters.get('repaired', 0)
+        total = parsed + counters.get('failed', 0)
+        ok = parsed - counters.get('schema_error', 0)
+        defects = {k: v for k, v in counters.items() if k not in ('fast', 'repaired', 'failed', 'schema_error')}
+        print(f"LLM输出解码: {ok}/{total} 成功 (直接解析 {counters.get('fast', 0)}, 修复后解析 {counters.get('repaired', 0)}, "
+              f"结构校验失败 {counters.get('schema_error', 0)}), 修复的缺陷: {defects or '无'}")
+
+
+# 所有解码默认累计到同一个计数器，脚本结束时统一打印
+STATS = DecodeStats()
+
+_FENCE_OPEN = re.compile(r'```[a-zA-Z]*[ \t]*\r?\n?')
+# 已知的键名缺陷：分布参数键写成 "std=1.2" / "std= 1.2" / "std=": 1.2 而不是 "std": 1.2
+_BAD_KEY = re.compile(r'"(std|sigma|mu|mean|var|variance|p|lambda|rate|scale|shape|loc|low|high|alpha|beta)'
+                      r'=(?:"\s*:)?\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"?')
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+# 两个值之间只有空白（常见于换行分隔的对象或键值对）：补上逗号
+_MISSING_COMMA = re.compile(r'([}\]"]|\d|true|false|null)(\s*\n\s*)(?=["{\[])')
+_ADJACENT_OBJECTS = re.compile(r'}(\s*){')
+_PYTHON_LITERAL = re.compile(r'(?<=[:\[,\s])(True|False|None)(?=\s*[,}\]])')
+_PYTHON_LITERAL_MAP = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+def _extract_payload(text, stats):
+    """
+    去掉代码块标记与JSON前后的解释文字，只做查找与一次切片，不对全文做替换。
+    """
+    start = text.find('```')
+    if start != -1:
+        match = _FENCE_OPEN.match(text, start)
+        body_start = match.end()
+        end = text.find('```', body_start)
+        stats.add('fence')
+        text = text[body_start:end if end != -1 else len(text)]
+    first = min((i for i in (text.find('{'), text.find('[')) if i != -1), default=-1)
+    if first == -1:
+        return text.strip()
+    last = max(text.rfind('}'), text.rfind(']'))
+    if first > 0 and text[:first].strip() or last != -1 and text[last + 1:].strip():
+        stats.add('preamble')
+    return text[first:last + 1] if last > first else text[first:]
+
+
+def _close_truncated(text):
+    """
+    处理被截断的返回：回退到最后一个完整闭合的对象/数组之后，丢弃不完整的尾部元素，再补齐未闭合的括号。
+    无法恢复时返回 None。
+    """
+    stack, in_string, escape = [], False, False
+    safe_end, safe_stack = None, None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append(ch)
+        elif ch in '}]':
+            if not stack:
+                return None
+            stack.pop()
+            safe_end, safe_stack = i + 1, list(stack)
+    if not stack and not in_string:
+        return None
+    if safe_end is None or not safe_stack:
+        return None
+    head = text[:safe_end].rstrip()
+    closers = ''.join('}' if b == '{' else ']' for b in reversed(safe_stack))
+    return head + closers
+
+
+def repair_text(text, stats=None):
+    """
+    对已去除代码块与前后说明的JSON文本依次应用已知缺陷的修复，并按缺陷类型计数。
+    """
+    stats = stats or STATS
+    for key, pattern, repl in (
+        ('bad_key', _BAD_KEY, r'"\1": \2'),
+        ('python_literal', _PYTHON_LITERAL, lambda m: _PYTHON_LITERAL_MAP[m.group(1)]),
+        ('trailing_comma', _TRAILING_COMMA, r'\1'),
+        ('missing_comma', _MISSING_COMMA, r'\1,\2'),
+        ('missing_comma', _ADJACENT_OBJECTS, r'},\1{'),
+    ):
+        text, n = pattern.subn(repl, text)
+        stats.add(key, n)
+    return text
+
+
+def repair_record(text):
+    """
+    流式模式下单条 data 记录的修复（键名缺陷、尾随逗号），供 DataRecordStream 的 repair_fn 使用。
+    """
+    for pattern, repl in ((_BAD_KEY, r'"\1": \2'), (_TRAILING_COMMA, r'\1')):
+        text, n = pattern.subn(repl, text)
+        STATS.add('record_' + ('bad_key' if pattern is _BAD_KEY else 'trailing_comma'), n)
+    return text
+
+
+def decode_json(text, stats=None):
+    """
+    解析LLM返回的JSON：先直接解析原文（绝大多数情况下只有这一步），失败后提取JSON主体、
+    应用预编译修复，最后尝试补齐被截断的结构。
+
+    异常:
+        json.JSONDecodeError: 所有修复后仍无法解析。
+    """
+    stats = stats or STATS
+    try:
+        value = loads(text)
+        stats.add('fast')
+        return value
+    except ValueError:
+        pass
+    payload = _extract_payload(text, stats)
+    try:
+        value = loads(payload)
+        stats.add('repaired')
+        return value
+    except ValueError:
+        pass
+    payload = repair_text(payload, stats)
+    try:
+        value = loads(payload)
+    except ValueError as e:
+        closed = _close_truncated(payload)
+        if closed is None:
+            stats.add('failed')
+            raise json.JSONDecodeError(f"修复后仍无法解析: {e}", payload, 0) from e
+        try:
+            value = loads(repair_text(closed, stats))
+        except ValueError as e2:
+            stats.add('failed')
+            raise json.JSONDecodeError(f"补齐截断结构后仍无法解析: {e2}", closed, 0) from e2
+        stats.add('truncated')
+    stats.add('repaired')
+    return value
+
+
+def _as_list(value, field):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list):
+        raise SchemaError(f"字段 {field} 应为列表，实际为 {type(value).__name__}")
+    return value
+
+
+def _as_bool(value, stats):
+    if isinstance(value, bool):
+        return value
+    stats.add('coerced_bool')
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 'yes', '是', '1')
+    return bool(value)
+
+
+def validate_hypothesis(obj, stats=None):
+    """
+    校验混淆变量假设：
+        variables: list[str]
+        is_confounder: bool（"是"/"否"、"true" 等会被转换）
+        confounder_variables: list[str]
+        Probability: list[{"confounder": str, ...}]（存在混淆变量时必填）
+        confounder_hypotheses: list[dict]
+    """
+    stats = stats or STATS
+    if isinstance(obj, list) and len(obj) == 1 and isinstance(obj[0], dict):
+        stats.add('unwrapped_list')
+        obj = obj[0]
+    if not isinstance(obj, dict):
+        raise SchemaError(f"假设应为JSON对象，实际为 {type(obj).__name__}")
+    obj['variables'] = _as_list(obj.get('variables'), 'variables')
+    obj['is_confounder'] = _as_bool(obj.get('is_confounder', False), stats)
+    if not obj['is_confounder']:
+        return obj
+    obj['confounder_variables'] = _as_list(obj.get('confounder_variables'), 'confounder_variables')
+    probability = obj.get('Probability')
+    if isinstance(probability, dict):
+        stats.add('unwrapped_list')
+        probability = [probability]
+    if not probability or not all(isinstance(p, dict) and 'confounder' in p for p in probability):
+        raise SchemaError("存在混淆变量时 Probability 必须是包含 confounder 键的对象列表")
+    obj['Probability'] = probability
+    obj['confounder_hypotheses'] = _as_list(obj.get('confounder_hypotheses'), 'confounder_hypotheses')
+    return obj
+
+
+def validate_datasets(obj, stats=None):
+    """
+    校验数据生成结果，返回数据集列表，每个数据集:
+        variables: list[str]
+        confounder_variables: list[str]（单个字符串会被包成列表）
+        data: list[dict]
+    单个数据集对象或 {"datasets": [...]} 形式会被展开为列表。
+    """
+    stats = stats or STATS
+    if isinstance(obj, dict):
+        stats.add('unwrapped_list')
+        obj = obj['datasets'] if isinstance(obj.get('datasets'), list) else [obj]
+    if not isinstance(obj, list):
+        raise SchemaError(f"数据生成结果应为数据集列表，实际为 {type(obj).__name__}")
+    for n, dataset in enumerate(obj):
+        if not isinstance(dataset, dict):
+            raise SchemaError(f"第 {n} 个数据集不是JSON对象")
+        dataset['variables'] = _as_list(dataset.get('variables'), 'variables')
+        dataset['confounder_variables'] = _as_list(dataset.get('confounder_variables'), 'confounder_variables')
+        data = dataset.get('data')
+        if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+            raise SchemaError(f"第 {n} 个数据集的 data 必须是对象列表")
+    return obj
+
+
+def decode_hypothesis(text, stats=None):
+    """
+    解码并校验一次混淆变量生成调用的返回内容。
+    """
+    stats = stats or STATS
+    try:
+        return validate_hypothesis(decode_json(text, stats), stats)
+    except SchemaError:
+        stats.add('schema_error')
+        raise
+
+
+def decode_datasets(text, stats=None):
+    """
+    解码并校验一次数据生成调用的返回内容。
+    """
+    stats = stats or STATS
+    try:
+        return validate_datasets(decode_json(text, stats), stats)
+    except SchemaError:
+        stats.add('schema_error')
+        raise
+
+
+def validator(decode):
+    """
+    返回供 ResponseCache 写入前校验用的函数，如 validator(decode_hypothesis)。
+    使用独立的计数器解码，调用方随后的正式解码不会被重复计入 STATS。
+    """
+    return lambda text: decode(text, stats=DecodeStats())
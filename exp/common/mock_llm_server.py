@@ -0,0 +1,368 @@
+## 本地 OpenAI 兼容的模拟LLM服务：回放 outcome/*_outcome/*.json 中的记录，并可注入延迟与各类故障，用于离线压测整个流水线
+
+import io
+import sys
+import csv
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 数据生成prompt中观察数据的位置标记（llm_continua.py / llm_disperate.py 共用）
+DATA_PROMPT_MARKER = '观察变量对应的数据：'
+# 数据生成prompt中混淆变量所在行的标记，后接“分布类型”（连续）或“先验概率”（离散）
+CONFOUNDER_PROMPT_MARKER = '隐混杂变量及其'
+DEFAULT_REPLAY = ['outcome/927_outcome/var_glm_output_test.json', 'outcome/927_outcome/data_glm_data_test.json']
+
+
+def parse_latency(spec):
+    """
+    解析延迟分布描述，返回无参的采样函数（单位: 秒）。
+
+    支持 'fixed:0.5'、'uniform:0.2,1.5'、'normal:1.0,0.3'、'lognormal:0,0.5'、'exp:0.8'，'0' 或空表示无延迟。
+    """
+    if not spec or spec == '0':
+        return lambda: 0.0
+    kind, _, args = spec.partition(':')
+    params = [float(x) for x in args.split(',')] if args else []
+    samplers = {
+        'fixed': lambda: params[0],
+        'uniform': lambda: random.uniform(params[0], params[1]),
+        'normal': lambda: max(0.0, random.gauss(params[0], params[1])),
+        'lognormal': lambda: random.lognormvariate(params[0], params[1]),
+        'exp': lambda: random.expovariate(1.0 / params[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"不支持的延迟分布: {kind}，可选: {list(samplers)}")
+    return samplers[kind]
+
+
+def load_replay_pools(paths):
+    """
+    读取记录的结果文件，按内容分为混淆变量回放池与数据回放池。
+
+    返回:
+        tuple: (confounder_pool, data_pool)，前者每项为一次混淆变量调用的返回对象，后者为各混淆变量的数据集。
+    """
+    confounder_pool, data_pool = [], []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        for entry in entries:
+            if 'is_confounder' in entry:
+                confounder_pool.append({k: v for k, v in entry.items() if k != 'id'})
+            elif entry.get('data'):
+                data_pool.append(entry)
+    return confounder_pool, data_pool
+
+
+def _csv_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+def _requested_rows(prompt):
+    # 从数据生成prompt中取回观察数据：JSON数组或CSV表格（见 common/prompt_encoding.py），前面可能有一行格式说明
+    start = prompt.find(DATA_PROMPT_MARKER)
+    if start == -1:
+        return None
+    text = prompt[start + len(DATA_PROMPT_MARKER):].lstrip()
+    if text.startswith('（'):
+        text = text[text.find('\n') + 1:].lstrip()
+    try:
+        rows, _ = json.JSONDecoder().raw_decode(text)
+        return rows if isinstance(rows, list) else None
+    except json.JSONDecodeError:
+        pass
+    lines = iter(csv.reader(io.StringIO(text)))
+    header = next(lines, None)
+    if not header or len(header) < 2:
+        return None
+    rows = []
+    for fields in lines:
+        if len(fields) != len(header):
+            break
+        rows.append({k: _csv_value(v) for k, v in zip(header, fields)})
+    return rows
+
+
+def _requested_confounder(prompt):
+    # 取回数据生成prompt中的混淆变量说明行，如 "{'confounder': 'Inflammatory Response', 'Distributed': ...}"
+    start = prompt.find(CONFOUNDER_PROMPT_MARKER)
+    if start == -1:
+        return ''
+    line = prompt[start:].split('\n', 1)[0]
+    return line.split(':', 1)[-1]
+
+
+class MockLLM:
+    """
+    根据请求内容生成回放结果，并按配置注入故障。
+
+    参数:
+        confounder_pool (list): 混淆变量调用的回放对象。
+        data_pool (list): 数据集回放对象。
+        latency (str): 首字节前的延迟分布，见 parse_latency。
+        chunk_latency (str): 流式返回时每个分块之间的延迟分布。
+        rate_429 (float): 返回 429 的概率。
+        rate_5xx (float): 返回 500/502/503 的概率。
+        retry_after (float): 429 响应的 Retry-After 秒数。
+        truncate_rate (float): 返回内容在中途被截断的概率。
+        fence_rate (float): 返回内容被包在 ```json 代码块中并附带解释文字的概率。
+        chunk_size (int): 流式返回每个分块的字符数。
+        seed (int | None): 故障注入的随机种子。
+    """
+
+    def __init__(self, confounder_pool, data_pool, latency='0', chunk_latency='0', rate_429=0.0, rate_5xx=0.0,
+                 retry_after=1.0, truncate_rate=0.0, fence_rate=0.0, chunk_size=40, seed=None):
+        self.confounder_pool = confounder_pool
+        self.data_pool = data_pool
+        self.latency = parse_latency(latency)
+        self.chunk_latency = parse_latency(chunk_latency)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.truncate_rate = truncate_rate
+        self.fence_rate = fence_rate
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.sequence = 0
+
+    def _draw(self):
+        # 在锁内取随机数与序号，多线程下同一种子的故障序列保持可复现
+        with self.lock:
+            self.sequence += 1
+            return self.sequence, self.rng.random(), self.rng.random(), self.rng.random(), self.rng.random()
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    def decide(self):
+        """
+        决定本次请求的处理方式，返回 (HTTP状态码, 序号, 是否截断, 是否包代码块, 截断位置比例)。
+        """
+        seq, r_error, r_truncate, r_fence, r_cut = self._draw()
+        if r_error < self.rate_429:
+            return 429, seq, False, False, 0
+        if r_error < self.rate_429 + self.rate_5xx:
+            return (500, 502, 503)[seq % 3], seq, False, False, 0
+        return 200, seq, r_truncate < self.truncate_rate, r_fence < self.fence_rate, 0.1 + 0.8 * r_cut
+
+    def content_for(self, prompt, seq):
+        rows = _requested_rows(prompt)
+        if rows is None:
+            if not self.confounder_pool:
+                return '{"is_confounder": false}'
+            return json.dumps(self.confounder_pool[(seq - 1) % len(self.confounder_pool)], ensure_ascii=False)
+
+        if not self.data_pool:
+            return '[]'
+        # 真实响应只包含prompt中给出的混淆变量的数据集：优先回放混淆变量与之相同的记录，没有时按序号取一个
+        confounder = _requested_confounder(prompt)
+        matched = [d for d in self.data_pool
+                   if d.get('confounder_variables') and all(str(c) in confounder for c in d['confounder_variables'])]
+        candidates = matched or self.data_pool
+        dataset = candidates[(seq - 1) % len(candidates)]
+        self.count('replay_matched' if matched else 'replay_fallback')
+
+        records = dataset['data']
+        if rows:
+            # 以记录的数据为模板，观察变量取值与 id 替换为本次请求的观察数据，分批模式可按 id 合并
+            data = [{**records[j % len(records)], **row} for j, row in enumerate(rows)]
+        else:
+            data = records
+        return json.dumps([{'variables': dataset.get('variables', []),
+                            'confounder_variables': dataset.get('confounder_variables', []),
+                            'data': data}], ensure_ascii=False, indent=2)
+
+    def render(self, content, truncate, fence, cut):
+        if fence:
+            content = f"以下是生成的结果：\n```json\n{content}\n```\n以上数据仅供参考。"
+            self.count('fenced')
+        if truncate:
+            content = content[:max(1, int(len(content) * cut))]
+            self.count('truncated')
+        return content
+
+
+def _completion_body(model, content, prompt):
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        # 粗略按4个字符一个token估算
+        'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4,
+                  'total_tokens': (len(prompt) + len(content)) // 4},
+    }
+
+
+def _chunk_body(chunk_id, model, delta, finish_reason=None):
+    return {
+        'id': chunk_id,
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/stats'):
+                with mock.lock:
+                    self._send_json(200, dict(mock.counters))
+            else:
+                self._send_json(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'not found'}})
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            model = request.get('model', 'mock')
+            prompt = '\n'.join(str(m.get('content', '')) for m in request.get('messages', []))
+            mock.count('requests')
+
+            time.sleep(mock.latency())
+            status, seq, truncate, fence, cut = mock.decide()
+            if status != 200:
+                mock.count(f"status_{status}")
+                headers = {'Retry-After': f"{mock.retry_after:g}"} if status == 429 else None
+                message = 'Rate limit reached' if status == 429 else 'Injected server error'
+                self._send_json(status, {'error': {'message': message, 'type': 'mock_fault', 'code': status}}, headers)
+                return
+
+            content = mock.render(mock.content_for(prompt, seq), truncate, fence, cut)
+            mock.count('status_200')
+            if not request.get('stream'):
+                self._send_json(200, _completion_body(model, content, prompt))
+                return
+
+            mock.count('streamed')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            try:
+                self._send_event(_chunk_body(chunk_id, model, {'role': 'assistant', 'content': ''}))
+                for i in range(0, len(content), mock.chunk_size):
+                    time.sleep(mock.chunk_latency())
+                    self._send_event(_chunk_body(chunk_id, model, {'content': content[i:i + mock.chunk_size]}))
+                self._send_event(_chunk_body(chunk_id, model, {}, finish_reason='stop'))
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端中途取消流（如 StreamAbort），属正常情况
+                mock.count('client_aborted')
+
+        def _send_event(self, body):
+            self.wfile.write(f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+    return Handler
+
+
+class MockLLMServer:
+    """
+    在后台线程中运行的模拟服务，可用作上下文管理器：
+
+        with MockLLMServer(mock) as server:
+            client = OpenAI(base_url=server.base_url, api_key='mock')
+    """
+
+    def __init__(self, mock, host='127.0.0.1', port=0):
+        self.mock = mock
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(mock))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地模拟LLM服务，回放记录的结果并注入延迟与故障。")
+    parser.add_argument("--replay", nargs='+', default=DEFAULT_REPLAY, help="用于回放的结果JSON文件")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default='0', help="首字节前延迟分布，如 fixed:0.5、uniform:0.2,1.5、lognormal:0,0.5")
+    parser.add_argument("--chunk-latency", default='0', help="流式返回各分块之间的延迟分布")
+    parser.add_argument("--chunk-size", type=int, default=40, help="流式返回每个分块的字符数")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="返回 500/502/503 的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应中 Retry-After 的秒数")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="返回JSON被截断的概率")
+    parser.add_argument("--fence-rate", type=float, default=0.0, help="返回内容包在 ```json 代码块中的概率")
+    parser.add_argument("--seed", type=int, default=None, help="故障注入的随机种子")
+    args = parser.parse_args()
+
+    confounder_pool, data_pool = load_replay_pools(args.replay)
+    mock = MockLLM(confounder_pool, data_pool, latency=args.latency, chunk_latency=args.chunk_latency,
+                   rate_429=args.rate_429, rate_5xx=args.rate_5xx, retry_after=args.retry_after,
+                   truncate_rate=args.truncate_rate, fence_rate=args.fence_rate, chunk_size=args.chunk_size,
+                   seed=args.seed)
+    server = MockLLMServer(mock, host=args.host, port=args.port)
+    print(f"模拟LLM服务已启动: {server.base_url}  (混淆变量回放 {len(confounder_pool)} 条, 数据集回放 {len(data_pool)} 个)")
+    print("各脚本使用 --base-url 指向该地址即可；GET /v1/stats 查看请求与故障计数。")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"请求统计: {dict(mock.counters)}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
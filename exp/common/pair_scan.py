@@ -0,0 +1,259 @@
+## 全变量组合的混淆变量扫描：枚举观察变量的两两组合（或指定的k元组），通过共享工作队列调度假设与数据生成
+
+import os
+import json
+import asyncio
+import itertools
+from functools import lru_cache
+
+# 各数据集的观察数据文件与列名对应的变量全称（用于prompt）
+DATASETS = {
+    'sachs': {
+        'csv': 'oringnal_data/bnlearn/Sachs/sachs_dataset.csv',
+        'names': {
+            'raf': 'Raf kinase',
+            'mek': 'MEK (MAPK/ERK kinase)',
+            'plc': 'phospholipase C-gamma',
+            'pip2': 'phosphatidylinositol 4,5-bisphosphate',
+            'pip3': 'phosphatidylinositol 3,4,5-trisphosphate',
+            'erk': 'extracellular signal-regulated kinase',
+            'akt': 'protein kinase B (Akt)',
+            'pka': 'protein kinase A',
+            'pkc': 'protein kinase C',
+            'p38': 'p38 mitogen-activated protein kinases',
+            'jnk': 'c-Jun N-terminal kinase',
+        },
+    },
+    'cancer': {
+        'csv': 'oringnal_data/bnlearn_generate/generated_cancer_dataset.csv',
+        'names': {
+            'Pollution': 'Pollution Level',
+            'Smoker': 'Smoking Status',
+            'Cancer': 'Lung Cancer',
+            'Xray': 'X-ray Result',
+            'Dyspnoea': 'Dyspnea Symptom',
+        },
+    },
+    'asia': {
+        'csv': 'oringnal_data/bnlearn_generate/generated_asia_dataset.csv',
+        'names': {
+            'asia': 'Visit to Asia',
+            'tub': 'Tuberculosis',
+            'smoke': 'Smoking',
+            'lung': 'Lung Cancer',
+            'bronc': 'Bronchitis',
+            'either': 'Tuberculosis or Lung Cancer',
+            'xray': 'X-ray Result',
+            'dysp': 'Dyspnea Symptom',
+        },
+    },
+}
+
+
+@lru_cache(maxsize=None)
+def read_observations(csv_path):
+    """
+    读取观察数据CSV并在进程内缓存，扫描时各组合共用同一份 DataFrame（调用方只做列选取，不会修改它）。
+    """
+    import pandas as pd
+
+    return pd.read_csv(csv_path)
+
+
+def enumerate_subsets(columns, k=2, selected=None):
+    """
+    枚举需要扫描的变量组合。
+
+    参数:
+        columns (list): 数据集的全部列名，决定组合内的列顺序。
+        k (int): 组合大小，默认两两组合。
+        selected (list | None): 用户指定的组合，如 [['p38', 'jnk'], ['raf', 'mek', 'erk']]；为 None 时枚举全部 k 元组。
+
+    返回:
+        list: 去重后的组合（元组，列按数据集列顺序排列），保持首次出现的顺序。
+    """
+    order = {c: n for n, c in enumerate(columns)}
+    if selected is None:
+        return list(itertools.combinations(columns, k))
+    subsets, seen = [], set()
+    for subset in selected:
+        unknown = [c for c in subset if c not in order]
+        if unknown:
+            raise ValueError(f"未知的列: {unknown}，可选: {list(columns)}")
+        key = tuple(sorted(set(subset), key=order.get))
+        if len(key) < 2:
+            raise ValueError(f"组合至少需要两个不同的变量: {subset}")
+        if key not in seen:
+            seen.add(key)
+            subsets.append(key)
+    return subsets
+
+
+def parse_subsets(spec):
+    """
+    解析命令行的组合列表，如 'p38+jnk,raf+mek+erk'。
+    """
+    return [part.split('+') for part in spec.split(',') if part.strip()]
+
+
+def subset_dir(out_dir, subset):
+    return os.path.join(out_dir, '__'.join(subset))
+
+
+class WorkQueue:
+    """
+    asyncio 共享工作队列：固定数量的 worker 协程从同一个队列取任务，任务执行中可以继续提交后续任务
+    （如假设完成后提交对应的数据生成），同一 key 的任务只会执行一次。
+
+    参数:
+        max_concurrency (int): worker 数量，即同时在途的LLM请求上限。
+    """
+
+    def __init__(self, max_concurrency=8):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue = asyncio.Queue()
+        self.submitted = set()
+        self.duplicates = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, key, factory, on_done=None):
+        """
+        提交任务。factory 为无参可调用对象，返回协程；on_done(result) 在任务完成后调用，失败时传入异常对象。
+
+        返回:
+            bool: 是否为新任务；重复的 key 被忽略并返回 False。
+        """
+        if key in self.submitted:
+            self.duplicates += 1
+            return False
+        self.submitted.add(key)
+        self.queue.put_nowait((key, factory, on_done))
+        return True
+
+    async def _worker(self):
+        while True:
+            key, factory, on_done = await self.queue.get()
+            try:
+                result = await factory()
+                self.completed += 1
+            except Exception as e:
+                result = e
+                self.failed += 1
+            try:
+                if on_done is not None:
+                    on_done(result)
+            except Exception as e:
+                # 回调出错只记录，worker 继续取任务，否则 worker 全部退出后 run 中的 join 会一直等待
+                print(f"任务 {key} 的完成回调出错: {type(e).__name__}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run(self):
+        """
+        运行直到队列中（包括执行过程中新提交的）所有任务完成。
+        """
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        try:
+            await self.queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+def _write_json(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=4, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+async def scan_subsets(subsets, num_runs, hypothesis_fn, data_fn, out_dir, max_concurrency=8, resume=False):
+    """
+    对所有变量组合运行两阶段生成：每个组合 num_runs 次混淆变量假设调用，每个有混淆变量的假设再生成一次数据。
+    所有组合的两类任务共用一个 WorkQueue，假设一完成就提交其数据生成任务，无需等待其他组合。
+
+    每个组合完成后立即写出 out_dir/<列1>__<列2>/var_glm_output.json 与 data_glm_data.json，
+    结构与单组合脚本的输出一致；结束时写出汇总 out_dir/scan_index.json。
+
+    参数:
+        subsets (list): enumerate_subsets 返回的组合。
+        num_runs (int): 每个组合的假设调用次数。
+        hypothesis_fn (callable): hypothesis_fn(subset, run_id) 返回协程，结果为带 id 的假设记录或 None。
+        data_fn (callable): data_fn(subset, hypothesis) 返回协程，结果为数据集列表或 None。
+        out_dir (str): 输出目录。
+        max_concurrency (int): 同时在途的请求数上限。
+        resume (bool): 为 True 时跳过已有结果文件且没有失败任务的组合，有失败的组合重新运行。
+
+    返回:
+        dict: 组合目录名 -> {'hypotheses': 条数, 'datasets': 个数, 'failed': 失败任务数}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    queue = WorkQueue(max_concurrency)
+    index_path = os.path.join(out_dir, 'scan_index.json')
+    index = {}
+    if resume and os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    state = {}
+
+    def finish_task(subset):
+        entry = state[subset]
+        entry['pending'] -= 1
+        if entry['pending']:
+            return
+        hypotheses = sorted(entry['hypotheses'], key=lambda h: h['id'])
+        datasets = [d for h in hypotheses for d in entry['data'].get(h['id'], [])]
+        path = subset_dir(out_dir, subset)
+        os.makedirs(path, exist_ok=True)
+        _write_json(os.path.join(path, 'var_glm_output.json'), hypotheses)
+        _write_json(os.path.join(path, 'data_glm_data.json'), datasets)
+        index[os.path.basename(path)] = {'hypotheses': len(hypotheses), 'datasets': len(datasets),
+                                         'failed': entry['failed']}
+        print(f"组合 {'+'.join(subset)} 完成: {len(hypotheses)} 条假设, {len(datasets)} 个数据集, 失败 {entry['failed']} 个任务")
+
+    def on_data(subset, hypothesis):
+        def done(result):
+            if isinstance(result, Exception) or not result:
+                state[subset]['failed'] += 1
+                if isinstance(result, Exception):
+                    print(f"组合 {'+'.join(subset)} 的假设 {hypothesis['id']} 数据生成失败: {result}")
+            else:
+                state[subset]['data'][hypothesis['id']] = result
+            finish_task(subset)
+        return done
+
+    def on_hypothesis(subset):
+        def done(result):
+            if isinstance(result, Exception):
+                state[subset]['failed'] += 1
+                print(f"组合 {'+'.join(subset)} 的假设调用失败: {result}")
+            elif result is not None:
+                state[subset]['hypotheses'].append(result)
+                state[subset]['pending'] += 1
+                queue.submit(('data', subset, result['id']),
+                             lambda: data_fn(subset, result), on_data(subset, result))
+            finish_task(subset)
+        return done
+
+    skipped = 0
+    for subset in subsets:
+        name = os.path.basename(subset_dir(out_dir, subset))
+        if resume and not index.get(name, {'failed': 1})['failed'] \
+                and os.path.exists(os.path.join(out_dir, name, 'data_glm_data.json')):
+            skipped += 1
+            continue
+        state[subset] = {'pending': 0, 'hypotheses': [], 'data': {}, 'failed': 0}
+        for run_id in range(1, num_runs + 1):
+            if queue.submit(('hypothesis', subset, run_id),
+                            lambda s=subset, r=run_id: hypothesis_fn(s, r), on_hypothesis(subset)):
+                state[subset]['pending'] += 1
+
+    print(f"扫描 {len(state)} 个组合 (跳过已完成 {skipped} 个), 每个组合 {num_runs} 次假设调用, 并发上限 {max_concurrency}...")
+    try:
+        await queue.run()
+    finally:
+        _write_json(index_path, index)
+    print(f"扫描完成: 执行 {queue.completed} 个任务, 失败 {queue.failed} 个, 忽略重复任务 {queue.duplicates} 个")
+    return index
@@ -0,0 +1,89 @@
+## 使用进程池对多个数据集并行运行PC算法
+
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from causallearn.search.ConstraintBased.PC import pc
+
+
+def discover_causal_structure(data, node_names, indep_test='fisherz', alpha=0.05, show_progress=True):
+    """
+    对给定的数据集运行PC因果发现算法。分析脚本与性能基准共用此函数，基准测得的即为实际运行的代码路径。
+
+    参数:
+        data (pd.DataFrame | np.ndarray): 预处理后的数据集；带 to_numpy() 的对象先转换为数组。
+        node_names (list): 变量名称列表。
+        indep_test (str): 独立性检验方法，可为 causallearn 注册的任意检验名。
+        alpha (float): 独立性检验的显著性水平。
+        show_progress (bool): 是否显示进度条。
+
+    返回:
+        causallearn.graph.GraphClass.CausalGraph: 发现的因果图对象。
+    """
+    data_np = data.to_numpy() if hasattr(data, 'to_numpy') else data
+    return pc(data_np, alpha=alpha, indep_test=indep_test, node_names=node_names, show_progress=show_progress)
+
+
+def graph_edges(causal_graph):
+    """
+    将 causallearn 返回的因果图转换为可序列化的边列表，每条边为 [节点1, 端点1, 端点2, 节点2]。
+    """
+    edges = []
+    for edge in causal_graph.G.get_graph_edges():
+        edges.append([edge.get_node1().get_name(), str(edge.get_endpoint1()),
+                      str(edge.get_endpoint2()), edge.get_node2().get_name()])
+    return edges
+
+
+def _run_one(discover_fn, dataset_id, confounder, data, node_names):
+    # 在子进程中执行，返回结构化结果；异常被捕获并记录，避免一个数据集失败中断整批任务
+    start = time.perf_counter()
+    result = {'dataset_id': dataset_id, 'confounder': confounder, 'nodes': node_names,
+              'edges': [], 'runtime': 0.0, 'error': None}
+    try:
+        causal_graph = discover_fn(data, node_names, show_progress=False)
+        result['edges'] = graph_edges(causal_graph)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['runtime'] = time.perf_counter() - start
+    return result
+
+
+def run_pc_batch(tasks, discover_fn, max_workers=None):
+    """
+    将每个数据集的 discover_fn 调用分发到进程池。
+
+    参数:
+        tasks (list): 每项为 (dataset_id, confounder, data, node_names)，data 为预处理后的数据。
+        discover_fn (callable): 模块顶层定义的函数 discover_fn(data, node_names, show_progress=False)。
+        max_workers (int | None): 进程数，默认使用全部CPU核心。
+
+    返回:
+        list: 按 dataset_id 排序的结果字典，包含 dataset_id、confounder、nodes、edges、runtime、error。
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(tasks)))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_run_one, discover_fn, *task) for task in tasks]
+        results = [f.result() for f in futures]
+    return sorted(results, key=lambda r: r['dataset_id'])
+
+
+def print_batch_results(results):
+    for r in results:
+        print(f"\n[数据集 {r['dataset_id']}] 混淆变量: {r['confounder']}  耗时 {r['runtime']:.2f} 秒")
+        if r['error']:
+            print(f"  -> 运行失败: {r['error']}")
+        elif not r['edges']:
+            print("  -> 算法未发现任何因果边。")
+        else:
+            for node1, end1, end2, node2 in r['edges']:
+                print(f"  -> {node1} {end1}--{end2} {node2}")
+
+
+def save_batch_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
+    print(f"\n批量分析结果已保存到: {path}")
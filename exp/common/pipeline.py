@@ -0,0 +1,456 @@
+## 实验流水线运行器：声明各阶段脚本及其输入/输出产物，按内容哈希只重跑输入发生变化的阶段，独立分支并行执行
+
+import os
+import sys
+import ast
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# 仓库根目录；所有路径相对于它书写，阶段脚本也在此目录下运行
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_STATE = 'outcome/pipeline_state.json'
+DEFAULT_LOG_DIR = 'outcome/pipeline_logs'
+
+
+class Stage:
+    """
+    流水线中的一个阶段：以 `python <script> <参数>` 的形式运行。
+
+    参数:
+        name (str): 阶段名，如 '927/sample'。
+        script (str): 阶段脚本路径。
+        inputs (list): 读取的数据文件或目录；若是其他阶段的输出，则自动依赖该阶段。
+        outputs (list): 产出的文件或目录。
+        params (dict): 命令行参数，键为不带 -- 的参数名，值为 True 时只传开关，为 None/False 时不传。
+        after (list): 没有产物关系但需要先完成的阶段。
+    """
+
+    def __init__(self, name, script, inputs=(), outputs=(), params=None, after=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = dict(params or {})
+        self.after = list(after)
+
+    def command(self):
+        cmd = [sys.executable, self.script]
+        for key, value in self.params.items():
+            if value is None or value is False:
+                continue
+            cmd.append(f'--{key}')
+            if value is not True:
+                cmd.append(str(value))
+        return cmd
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, {self.script!r})"
+
+
+def _stages_927():
+    out = 'outcome/927_outcome'
+    return [
+        Stage('927/llm', 'exp/0927exp/llm_continua.py',
+              inputs=['oringnal_data/bnlearn/Sachs/sachs_dataset.csv'],
+              outputs=[f'{out}/var_glm_output_test.json', f'{out}/data_glm_data_test.json'],
+              params={'num-runs': 10, 'async': True}),
+        Stage('927/sample', 'exp/0927exp/final_sampler.py',
+              inputs=[f'{out}/data_glm_data_test.json'], outputs=[f'{out}/final_data.json'],
+              params={'input': f'{out}/data_glm_data_test.json', 'output': f'{out}/final_data.json', 'seed': 0}),
+        Stage('927/analyze', 'exp/0927exp/0927_analyze_llm_data.py',
+              inputs=[f'{out}/final_data.json'], outputs=[f'{out}/pc_results.json'],
+              params={'input': f'{out}/final_data.json', 'batch': True, 'output': f'{out}/pc_results.json'}),
+    ]
+
+
+def _stages_926():
+    out = 'outcome/926_outcome'
+    return [
+        Stage('926/llm', 'exp/0926exp/llm_disperate.py',
+              inputs=['oringnal_data/bnlearn_generate/generated_cancer_dataset.csv'],
+              outputs=[f'{out}/var_glm_output_test.json', f'{out}/data_glm_data_test.json'],
+              params={'num-runs': 10, 'async': True}),
+        Stage('926/analyze', 'exp/0926exp/0925_analyze_llm_data.py',
+              inputs=[f'{out}/data_glm_data_test.json'], outputs=[f'{out}/pc_results.json'],
+              params={'input': f'{out}/data_glm_data_test.json', 'batch': True, 'output': f'{out}/pc_results.json'}),
+    ]
+
+
+def _stages_914():
+    out = 'outcome/914_outcome'
+    return [
+        Stage('914/generate', 'exp/0914exp/generate_llm_data.py',
+              inputs=[f'{out}/ez_glm_output_test.json'], outputs=[f'{out}/llm_generated_data'],
+              params={'input': f'{out}/ez_glm_output_test.json', 'output-dir': f'{out}/llm_generated_data', 'seed': 42}),
+    ]
+
+
+def _stages_benchmark():
+    out = 'outcome/benchmark'
+    stages = []
+    for name in ('asia', 'cancer'):
+        csv = f'oringnal_data/bnlearn_generate/generated_{name}_dataset.csv'
+        stages.append(Stage(f'benchmark/{name}', 'oringnal_data/var_bnlearn/analyze_benchmark_data.py',
+                            inputs=[csv], outputs=[f'{out}/{name}_stability.json'],
+                            params={'input': csv, 'bootstrap': 100, 'seed': 0, 'output': f'{out}/{name}_stability.json'}))
+    return stages
+
+
+# 各实验分支；分支之间没有产物依赖，运行多个分支时并行执行
+PIPELINES = {
+    '927': _stages_927,
+    '926': _stages_926,
+    '914': _stages_914,
+    'benchmark': _stages_benchmark,
+}
+
+
+def local_imports(script, root=ROOT):
+    """
+    找出脚本（递归地）导入的仓库内模块文件，它们的改动同样会使阶段重新执行。
+    按脚本目录、exp/ 目录两个搜索路径解析 import，包内的相对导入按所在包解析；第三方库被忽略。
+    """
+    search = [os.path.join(root, 'exp')]
+    found, pending = set(), [os.path.join(root, script)]
+    while pending:
+        path = pending.pop()
+        if path in found or not os.path.exists(path):
+            continue
+        found.add(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read(), filename=path)
+        except (SyntaxError, UnicodeDecodeError):
+            continue
+        here = os.path.dirname(path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [(0, alias.name) for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ''
+                names = [(node.level, base)] + [(node.level, f'{base}.{alias.name}' if base else alias.name)
+                                                for alias in node.names]
+            else:
+                continue
+            for level, name in names:
+                if level:
+                    bases = [here]
+                    for _ in range(level - 1):
+                        bases = [os.path.dirname(bases[0])]
+                else:
+                    bases = [here] + search
+                parts = name.split('.') if name else []
+                for base in bases:
+                    # 包的 __init__.py 在导入其子模块时同样会执行
+                    targets = [os.path.join(base, *parts[:n], '__init__.py') for n in range(1, len(parts) + 1)]
+                    targets.append(os.path.join(base, *parts) + '.py')
+                    hits = [t for t in targets if parts and os.path.isfile(t)]
+                    if hits:
+                        pending.extend(hits)
+                        break
+    return sorted(os.path.relpath(p, root) for p in found)
+
+
+class ContentHasher:
+    """
+    文件内容哈希，按 (路径, 大小, 修改时间) 记忆上次的结果，未改动的大文件不必重新读取。
+    目录的哈希由其中所有文件的相对路径与内容哈希组合而成；不存在的路径哈希为 None。
+    """
+
+    def __init__(self, memo=None):
+        self.memo = dict(memo or {})
+        self.lock = threading.Lock()
+
+    def file(self, path):
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        key = os.path.relpath(path, ROOT)
+        with self.lock:
+            cached = self.memo.get(key)
+        if cached and cached[:2] == stamp:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        with self.lock:
+            self.memo[key] = stamp + [digest]
+        return digest
+
+    def path(self, path):
+        full = os.path.join(ROOT, path)
+        if os.path.isfile(full):
+            return self.file(full)
+        if not os.path.isdir(full):
+            return None
+        h = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(full):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_path = os.path.join(dirpath, filename)
+                h.update(os.path.relpath(file_path, full).encode('utf-8') + b'\0')
+                h.update(self.file(file_path).encode('ascii'))
+        return h.hexdigest()
+
+
+def stage_fingerprint(stage, hasher):
+    """
+    阶段的指纹：脚本及其导入的仓库内模块、输入产物的内容哈希，以及命令行参数。
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(stage.command()[1:], ensure_ascii=False).encode('utf-8'))
+    for path in local_imports(stage.script):
+        h.update(f'code:{path}:{hasher.path(path)}\n'.encode('utf-8'))
+    for path in stage.inputs:
+        h.update(f'input:{path}:{hasher.path(path)}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+
+class Pipeline:
+    """
+    由若干 Stage 组成的有向无环图。依赖关系由产物推出：某阶段的输入是另一阶段的输出时，前者依赖后者。
+
+    运行状态（每个阶段上次成功运行时的指纹与输出哈希、文件哈希缓存）保存在 state_path 中。
+    阶段在以下情况下重新执行：指纹变化、输出缺失或被外部修改、或被 force 指定。
+    上游重跑后输出内容不变时（如LLM响应从缓存回放），下游指纹不变，不会被连带重跑。
+    """
+
+    def __init__(self, stages, state_path=DEFAULT_STATE, log_dir=DEFAULT_LOG_DIR):
+        self.stages = {s.name: s for s in stages}
+        producers = {}
+        for stage in stages:
+            for path in stage.outputs:
+                if path in producers:
+                    raise ValueError(f"产物 {path} 同时由 {producers[path]} 与 {stage.name} 产出")
+                producers[path] = stage.name
+        self.deps = {s.name: sorted({producers[p] for p in s.inputs if p in producers} | set(s.after))
+                     for s in stages}
+        for name, deps in self.deps.items():
+            unknown = [d for d in deps if d not in self.stages]
+            if unknown:
+                raise ValueError(f"阶段 {name} 依赖未知阶段: {unknown}")
+        self._check_acyclic()
+        self.state_path = os.path.join(ROOT, state_path)
+        self.log_dir = os.path.join(ROOT, log_dir)
+        self.state = {'stages': {}, 'hashes': {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        self.hasher = ContentHasher(self.state.get('hashes'))
+        self.lock = threading.Lock()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name, chain):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"阶段依赖存在环: {' -> '.join(chain + [name])}")
+            visiting.add(name)
+            for dep in self.deps[name]:
+                visit(dep, chain + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name, [])
+
+    def select(self, targets):
+        """
+        返回 targets（阶段名或分支前缀，如 '927'）及其全部上游阶段的名称集合。
+        """
+        selected, pending = set(), []
+        for target in targets:
+            matched = [n for n in self.stages if n == target or n.startswith(target.rstrip('/') + '/')]
+            if not matched:
+                raise ValueError(f"未知的阶段或分支: {target}，可选: {sorted(self.stages)}")
+            pending.extend(matched)
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.deps[name])
+        return selected
+
+    def status(self, name):
+        """
+        返回 (是否需要执行, 原因, 当前指纹)。
+        """
+        stage = self.stages[name]
+        fingerprint = stage_fingerprint(stage, self.hasher)
+        record = self.state['stages'].get(name)
+        if record is None:
+            return True, '从未运行', fingerprint
+        if record['fingerprint'] != fingerprint:
+            return True, '脚本、输入或参数已变化', fingerprint
+        for path in stage.outputs:
+            if self.hasher.path(path) != record['outputs'].get(path):
+                return True, f'输出 {path} 缺失或被修改', fingerprint
+        return False, '未变化', fingerprint
+
+    def _save_state(self):
+        with self.lock:
+            self.state['hashes'] = self.hasher.memo
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp = self.state_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.state_path)
+
+    def _execute(self, stage):
+        os.makedirs(self.log_dir, exist_ok=True)
+        log_path = os.path.join(self.log_dir, stage.name.replace('/', '_') + '.log')
+        for path in stage.outputs:
+            os.makedirs(os.path.dirname(os.path.join(ROOT, path)) or ROOT, exist_ok=True)
+        start = time.perf_counter()
+        with open(log_path, 'w', encoding='utf-8') as log:
+            log.write(' '.join(stage.command()) + '\n\n')
+            log.flush()
+            returncode = subprocess.run(stage.command(), cwd=ROOT, stdout=log, stderr=subprocess.STDOUT).returncode
+        return returncode, time.perf_counter() - start, os.path.relpath(log_path, ROOT)
+
+    def run(self, targets=None, jobs=2, force=(), dry_run=False):
+        """
+        按依赖顺序运行 targets 及其上游中需要执行的阶段，最多 jobs 个阶段同时运行。
+        阶段是否执行在其所有上游完成后才判断，这样才能看到上游新产出的内容。
+        某阶段失败时，依赖它的下游阶段被跳过，其他分支继续运行。
+
+        返回:
+            dict: 阶段名 -> 'ran' / 'cached' / 'failed' / 'blocked' / 'planned'
+        """
+        selected = self.select(targets) if targets else set(self.stages)
+        force = self.select(force) & selected if force else set()
+        results = {}
+
+        if dry_run:
+            # 预演时上游尚未重跑，只能按当前文件判断；上游需要执行时，下游标记为将随之检查
+            for name in self._topological(selected):
+                needed, reason, _ = self.status(name)
+                upstream = [d for d in self.deps[name] if results.get(d) == 'planned']
+                if name in force or needed or upstream:
+                    results[name] = 'planned'
+                    why = '强制执行' if name in force else (reason if needed else f'待上游 {", ".join(upstream)} 重跑后检查')
+                    print(f"[计划] {name}: {why}")
+                else:
+                    results[name] = 'cached'
+                    print(f"[跳过] {name}: 未变化")
+            return results
+
+        pending = set(selected)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            while pending or running:
+                for name in sorted(pending):
+                    deps = self.deps[name]
+                    if any(results.get(d) in ('failed', 'blocked') for d in deps):
+                        pending.discard(name)
+                        results[name] = 'blocked'
+                        print(f"[阻塞] {name}: 上游阶段失败")
+                        continue
+                    if len(running) >= max(1, jobs) or not all(d in results for d in deps if d in selected):
+                        continue
+                    pending.discard(name)
+                    needed, reason, fingerprint = self.status(name)
+                    if name not in force and not needed:
+                        results[name] = 'cached'
+                        print(f"[跳过] {name}: 未变化")
+                        continue
+                    print(f"[运行] {name}: {'强制执行' if name in force else reason}")
+                    running[pool.submit(self._execute, self.stages[name])] = (name, fingerprint)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, fingerprint = running.pop(future)
+                    returncode, elapsed, log_path = future.result()
+                    stage = self.stages[name]
+                    missing = [p for p in stage.outputs if self.hasher.path(p) is None]
+                    if returncode != 0 or missing:
+                        results[name] = 'failed'
+                        detail = f"退出码 {returncode}" if returncode else f"缺少输出 {missing}"
+                        print(f"[失败] {name}: {detail}，耗时 {elapsed:.1f}s，日志 {log_path}")
+                        continue
+                    results[name] = 'ran'
+                    with self.lock:
+                        self.state['stages'][name] = {
+                            'fingerprint': fingerprint,
+                            'outputs': {p: self.hasher.path(p) for p in stage.outputs},
+                            'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                            'seconds': round(elapsed, 3),
+                        }
+                    self._save_state()
+                    print(f"[完成] {name}: 耗时 {elapsed:.1f}s，日志 {log_path}")
+        self._save_state()
+        return results
+
+    def _topological(self, names):
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.deps[name]:
+                if dep in names:
+                    visit(dep)
+            order.append(name)
+
+        for name in sorted(names):
+            visit(name)
+        return order
+
+
+def build_pipeline(overrides=(), state_path=DEFAULT_STATE, log_dir=DEFAULT_LOG_DIR):
+    """
+    构建包含全部分支的流水线。overrides 为 'STAGE.PARAM=VALUE' 形式的参数覆盖，
+    如 '927/llm.num-runs=50'；VALUE 为 true/false 时作为开关处理。
+    """
+    stages = [stage for factory in PIPELINES.values() for stage in factory()]
+    by_name = {s.name: s for s in stages}
+    for override in overrides:
+        target, sep, value = override.partition('=')
+        name, dot, key = target.rpartition('.')
+        if not sep or not dot or name not in by_name:
+            raise ValueError(f"无法解析的参数覆盖: {override}，格式为 STAGE.PARAM=VALUE")
+        by_name[name].params[key] = {'true': True, 'false': False}.get(value.lower(), value)
+    return Pipeline(stages, state_path=state_path, log_dir=log_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按内容哈希增量运行实验流水线，独立分支并行执行。")
+    parser.add_argument("targets", nargs='*', help="要运行的阶段或分支（含其上游），如 927、926/analyze；默认全部")
+    parser.add_argument("--jobs", type=int, default=2, help="同时运行的阶段数")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="STAGE.PARAM=VALUE",
+                        help="覆盖阶段参数，可重复，如 927/llm.num-runs=50")
+    parser.add_argument("--force", action="append", default=[], help="强制重跑的阶段或分支（含其上游），可重复")
+    parser.add_argument("--dry-run", action="store_true", help="只打印将要执行的阶段及原因")
+    parser.add_argument("--list", action="store_true", help="列出全部阶段、依赖与命令")
+    parser.add_argument("--state", default=DEFAULT_STATE, help="运行状态文件")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR, help="各阶段输出日志目录")
+    args = parser.parse_args()
+
+    pipeline = build_pipeline(args.overrides, state_path=args.state, log_dir=args.log_dir)
+    if args.list:
+        for name in pipeline._topological(set(pipeline.stages)):
+            stage = pipeline.stages[name]
+            deps = ', '.join(pipeline.deps[name]) or '-'
+            print(f"{name:<20} 依赖: {deps:<20} {' '.join(stage.command()[1:])}")
+        return 0
+
+    results = pipeline.run(args.targets or None, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    counts = {}
+    for status in results.values():
+        counts[status] = counts.get(status, 0) + 1
+    print(f"流水线结束: {counts}")
+    return 1 if counts.get('failed') or counts.get('blocked') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
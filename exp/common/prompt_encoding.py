@@ -0,0 +1,143 @@
+## 数据生成prompt中观察数据的紧凑编码：CSV表格、列名简写与固定精度，并提供prompt token数对比
+
+import io
+import csv
+import json
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 为可选依赖，缺失时按字符数估算token
+    tiktoken = None
+
+FORMATS = ('json', 'json-compact', 'csv')
+
+
+class RowEncoding:
+    """
+    观察数据在prompt中的编码方式。
+
+    参数:
+        fmt (str): 'json' 为原有的缩进JSON；'json-compact' 为无缩进无空格的JSON；'csv' 为首行列名的表格。
+        short_names (bool): 观察变量列名替换为 X1、X2… 简写，并要求LLM在输出记录中同样使用简写，解码后映射回原名。
+        precision (int | None): 浮点数保留的小数位数，None 表示保持原值。
+    """
+
+    def __init__(self, fmt='json', short_names=False, precision=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的编码格式: {fmt}，可选: {FORMATS}")
+        self.fmt = fmt
+        self.short_names = short_names
+        self.precision = precision
+
+    def __repr__(self):
+        return f"RowEncoding(fmt={self.fmt!r}, short_names={self.short_names}, precision={self.precision})"
+
+    def aliases(self, variables):
+        """
+        返回 {原列名: 简写}；未开启简写时为空字典。
+        """
+        if not self.short_names:
+            return {}
+        return {name: f"X{n + 1}" for n, name in enumerate(variables)}
+
+    def _value(self, value):
+        if self.precision is not None and isinstance(value, float):
+            return round(value, self.precision)
+        return value
+
+    def encode(self, var_list, variables):
+        """
+        将观察数据编码为放入prompt的文本。开启简写或使用CSV时，文本开头附带一行格式说明。
+        """
+        aliases = self.aliases(variables)
+        rows = [{aliases.get(k, k): self._value(v) for k, v in row.items()} for row in var_list]
+        if self.fmt == 'json':
+            body = json.dumps(rows, ensure_ascii=False, indent=2)
+        elif self.fmt == 'json-compact':
+            body = json.dumps(rows, ensure_ascii=False, separators=(',', ':'))
+        else:
+            buffer = io.StringIO()
+            columns = list(rows[0]) if rows else []
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerow(columns)
+            writer.writerows([row.get(c) for c in columns] for row in rows)
+            body = buffer.getvalue().rstrip('\n')
+
+        notes = []
+        if self.fmt == 'csv':
+            notes.append("以下为CSV表格，首行为列名")
+        if aliases:
+            mapping = '，'.join(f'{short} = “{name}”' for name, short in aliases.items())
+            notes.append(f"列名简写：{mapping}；输出的 data 记录中观察变量也请使用简写作为键")
+        return ('（' + '；'.join(notes) + '）\n' + body) if notes else body
+
+    def expand_record(self, record, variables):
+        """
+        将一条输出记录中的简写键映射回原列名（原地修改并返回）。
+        """
+        for name, short in self.aliases(variables).items():
+            if short in record:
+                record[name] = record.pop(short)
+        return record
+
+    def expand(self, datasets, variables):
+        """
+        将解码后的数据集列表中的简写映射回原列名，包括 variables 字段与每条 data 记录。
+        """
+        aliases = self.aliases(variables)
+        if not aliases or not datasets:
+            return datasets
+        reverse = {short: name for name, short in aliases.items()}
+        for dataset in datasets:
+            dataset['variables'] = [reverse.get(v, v) for v in dataset.get('variables', [])]
+            for record in dataset.get('data', []):
+                self.expand_record(record, variables)
+        return datasets
+
+
+def count_tokens(text):
+    """
+    估算文本的token数：有 tiktoken 时使用 cl100k_base 编码，否则按中文约1字1token、其余约4字符1token估算。
+    """
+    if tiktoken is not None:
+        return len(tiktoken.get_encoding('cl100k_base').encode(text))
+    cjk = sum(1 for ch in text if '\u4e00' <= ch <= '\u9fff' or '\u3000' <= ch <= '\u303f' or '\uff00' <= ch <= '\uffef')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def token_report(build_prompt, var_list, variables, encodings=None):
+    """
+    对比不同编码下数据生成prompt的token数。
+
+    参数:
+        build_prompt (callable): build_prompt(encoding, rows) 返回完整prompt。
+        var_list (list): 观察数据记录。
+        variables (list): 观察变量名。
+        encodings (list | None): 参与比较的 RowEncoding，默认比较全部格式及简写/两位小数的组合。
+
+    返回:
+        list: 每种编码的 {'encoding', 'tokens', 'per_row', 'ratio', 'rows_same_size'}，
+            rows_same_size 为与原编码同等prompt长度下一次可以放入的行数。
+    """
+    if encodings is None:
+        encodings = [RowEncoding('json')] + [RowEncoding(fmt, short, precision)
+                                             for fmt in FORMATS
+                                             for short, precision in ((False, None), (True, None), (True, 2))
+                                             if (fmt, short) != ('json', False)]
+    n_rows = len(var_list)
+    results = []
+    for encoding in encodings:
+        tokens = count_tokens(build_prompt(encoding, var_list))
+        fixed = count_tokens(build_prompt(encoding, []))
+        results.append({'encoding': encoding, 'tokens': tokens, 'per_row': (tokens - fixed) / max(1, n_rows),
+                        'fixed': fixed})
+
+    base = results[0]
+    method = 'tiktoken cl100k_base' if tiktoken is not None else '按字符估算'
+    print(f"数据生成prompt token数对比 ({n_rows} 行观察数据, {method}):")
+    for r in results:
+        r['ratio'] = r['tokens'] / base['tokens']
+        r['rows_same_size'] = int((base['tokens'] - r['fixed']) / r['per_row']) if r['per_row'] else n_rows
+        print(f"  {r['encoding']!r:<66} {r['tokens']:>8} tokens  每行 {r['per_row']:6.1f}  "
+              f"相对原编码 {r['ratio']:6.1%}  同等长度可放 {r['rows_same_size']} 行")
+    return results
@@ -0,0 +1,346 @@
+## LLM调用的限流、退避重试与全局预算：按模型的令牌桶、遵守 Retry-After 的抖动指数退避、自适应调速
+
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+# 各模型默认的每分钟请求数与每分钟token数，可通过 --model-limit 覆盖
+DEFAULT_MODEL_LIMITS = {
+    'glm-4.5-air': {'rpm': 120, 'tpm': 400000},
+    'glm-4.5': {'rpm': 60, 'tpm': 200000},
+}
+FALLBACK_LIMITS = {'rpm': 60, 'tpm': 200000}
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class BudgetExceeded(RuntimeError):
+    """全局请求数或token预算已用完，不再发出新请求。"""
+
+
+class TokenBucket:
+    """
+    令牌桶：以 rate 个/秒的速度补充，最多积累 capacity 个。
+
+    reserve 立即扣除令牌（允许透支）并返回需要等待的秒数，同步与异步调用方各自按该时间休眠，
+    因此多个线程/协程的预约按先后顺序排队，不会同时醒来冲击服务端。
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1.0):
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            # 单次请求超过桶容量时按容量计，否则永远无法满足
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount):
+        """
+        事后修正扣除量：amount 为正表示补扣，为负表示退还（如实际用量小于预估）。
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class ModelLimiter:
+    """
+    单个模型的请求数与token数限流，并按服务端反馈自适应调速：
+    收到 429 时速率减半并在 Retry-After 期间暂停该模型的全部请求，之后每次成功逐步恢复到配置上限。
+
+    参数:
+        rpm (float): 每分钟请求数上限。
+        tpm (float): 每分钟token数上限。
+        min_factor (float): 自适应降速的下限（相对配置上限的比例）。
+        recovery (float): 每次成功后速率比例的回升量。
+    """
+
+    def __init__(self, rpm, tpm, min_factor=0.05, recovery=0.05):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_factor = min_factor
+        self.recovery = recovery
+        self.factor = 1.0
+        self.paused_until = 0.0
+        self.last_decrease = float('-inf')
+        # 请求桶容量取每秒速率（至少1），避免启动瞬间把一整分钟的额度一次发完
+        self.requests = TokenBucket(rpm / 60.0, capacity=max(1.0, rpm / 60.0))
+        self.tokens = TokenBucket(tpm / 60.0, capacity=tpm / 6.0)
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """
+        预约一次请求，返回发送前需要等待的秒数。
+        """
+        pause = max(0.0, self.paused_until - time.monotonic())
+        return max(pause, self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def _apply_factor(self):
+        self.requests.set_rate(self.rpm / 60.0 * self.factor)
+        self.tokens.set_rate(self.tpm / 60.0 * self.factor)
+
+    def on_throttled(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            # 同一波并发请求同时收到的多个 429 只降速一次
+            if now - self.last_decrease >= 1.0:
+                self.factor = max(self.min_factor, self.factor / 2)
+                self.last_decrease = now
+                self._apply_factor()
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+    def on_success(self):
+        with self.lock:
+            if self.factor < 1.0:
+                self.factor = min(1.0, self.factor + self.recovery)
+                self._apply_factor()
+
+
+def retry_after_seconds(error):
+    """
+    从异常携带的HTTP响应头中读取 retry-after-ms / retry-after（秒数或HTTP日期），没有时返回 None。
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        value = headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """
+    判断异常是否值得重试：限流、服务端错误、超时与连接错误可以重试，参数或鉴权错误直接抛出。
+    """
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # openai 的 APIConnectionError / APITimeoutError 没有状态码
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError') or isinstance(error, (ConnectionError, TimeoutError))
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, retry_after=None):
+    """
+    第 attempt 次重试（从0开始）前的等待秒数：有 Retry-After 时以其为准并加少量抖动，否则为全抖动指数退避。
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, min(1.0, base))
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def estimate_tokens(messages, completion_tokens):
+    # 中文prompt约每2个字符一个token；输出长度无法预知，按 max_tokens 或默认值预估
+    chars = sum(len(str(m.get('content', ''))) for m in messages)
+    return chars // 2 + completion_tokens
+
+
+class LLMScheduler:
+    """
+    所有LLM调用共享的调度器：按模型限流、失败时退避重试，并执行全局请求数与token预算。
+
+    参数:
+        model_limits (dict): 模型名 -> {'rpm', 'tpm'}，未列出的模型使用 FALLBACK_LIMITS。
+        max_requests (int | None): 全局请求数上限（包含重试），None 表示不限。
+        max_tokens (int | None): 全局token上限，None 表示不限。
+        max_attempts (int): 单次调用的最大尝试次数。
+        backoff_base (float): 指数退避的基数（秒）。
+        backoff_cap (float): 单次退避的最长等待（秒）。
+        completion_tokens (int): 未指定 max_tokens 时预估的输出token数。
+    """
+
+    def __init__(self, model_limits=None, max_requests=None, max_tokens=None, max_attempts=6,
+                 backoff_base=1.0, backoff_cap=60.0, completion_tokens=2000):
+        self.model_limits = {**DEFAULT_MODEL_LIMITS, **(model_limits or {})}
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.completion_tokens = completion_tokens
+        self.limiters = {}
+        self.lock = threading.Lock()
+        self.requests_sent = 0
+        self.tokens_used = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.waited = 0.0
+
+    def limiter(self, model):
+        with self.lock:
+            if model not in self.limiters:
+                limits = self.model_limits.get(model, FALLBACK_LIMITS)
+                self.limiters[model] = ModelLimiter(limits['rpm'], limits['tpm'])
+            return self.limiters[model]
+
+    def _admit(self, model, estimate):
+        # 先检查并扣除全局预算，再向模型限流器预约，返回需要等待的秒数
+        with self.lock:
+            if self.max_requests is not None and self.requests_sent >= self.max_requests:
+                raise BudgetExceeded(f"已达到请求数预算 {self.max_requests}")
+            if self.max_tokens is not None and self.tokens_used + estimate > self.max_tokens:
+                raise BudgetExceeded(f"token预算不足: 已用 {self.tokens_used} / {self.max_tokens}")
+            self.requests_sent += 1
+            self.tokens_used += estimate
+        wait = self.limiter(model).reserve(estimate)
+        with self.lock:
+            self.waited += wait
+        return wait
+
+    def _settle(self, model, estimate, response):
+        # 非流式响应带有实际用量，按实际值修正预算与token桶
+        usage = getattr(response, 'usage', None)
+        actual = getattr(usage, 'total_tokens', None)
+        if actual is not None:
+            with self.lock:
+                self.tokens_used += actual - estimate
+            self.limiter(model).tokens.adjust(actual - estimate)
+        self.limiter(model).on_success()
+
+    def _on_error(self, model, estimate, error, attempt):
+        """
+        处理一次失败的尝试，需要重试时返回等待秒数，否则重新抛出异常。失败的请求不计入token预算。
+        """
+        with self.lock:
+            self.tokens_used -= estimate
+        if not is_retryable(error) or attempt + 1 >= self.max_attempts:
+            with self.lock:
+                self.failures += 1
+            raise error
+        retry_after = retry_after_seconds(error)
+        if getattr(error, 'status_code', None) == 429:
+            with self.lock:
+                self.throttled += 1
+            self.limiter(model).on_throttled(retry_after)
+        with self.lock:
+            self.retries += 1
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap, retry_after)
+
+    def _estimate(self, kwargs):
+        return estimate_tokens(kwargs.get('messages', []), kwargs.get('max_tokens') or self.completion_tokens)
+
+    def call(self, create, **kwargs):
+        """
+        同步调用 create(**kwargs)（即 chat.completions.create），按限流等待并在可重试的错误上退避重试。
+        """
+        model, estimate = kwargs.get('model'), self._estimate(kwargs)
+        for attempt in range(self.max_attempts):
+            time.sleep(self._admit(model, estimate))
+            try:
+                response = create(**kwargs)
+            except Exception as e:
+                time.sleep(self._on_error(model, estimate, e, attempt))
+                continue
+            self._settle(model, estimate, response)
+            return response
+
+    async def acall(self, create, **kwargs):
+        """
+        call 的异步版本，create 为 AsyncOpenAI 的 chat.completions.create。
+        """
+        model, estimate = kwargs.get('model'), self._estimate(kwargs)
+        for attempt in range(self.max_attempts):
+            await asyncio.sleep(self._admit(model, estimate))
+            try:
+                response = await create(**kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._on_error(model, estimate, e, attempt))
+                continue
+            self._settle(model, estimate, response)
+            return response
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests_sent,
+                'tokens': self.tokens_used,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'failures': self.failures,
+                'waited_seconds': self.waited,
+            }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"LLM调度: 发出请求 {s['requests']} 次 (重试 {s['retries']} 次, 429 {s['throttled']} 次), "
+              f"最终失败 {s['failures']} 次, 约 {s['tokens']} tokens, 限流累计等待 {s['waited_seconds']:.1f} 秒")
+
+
+class _ThrottledCompletions:
+    def __init__(self, completions, scheduler, use_async):
+        self._completions = completions
+        self._scheduler = scheduler
+        self._use_async = use_async
+
+    def create(self, **kwargs):
+        if self._use_async:
+            return self._scheduler.acall(self._completions.create, **kwargs)
+        return self._scheduler.call(self._completions.create, **kwargs)
+
+
+class _ThrottledChat:
+    def __init__(self, chat, scheduler, use_async):
+        self.completions = _ThrottledCompletions(chat.completions, scheduler, use_async)
+
+
+class ThrottledClient:
+    """
+    包装 OpenAI / AsyncOpenAI 客户端，使 client.chat.completions.create 经过 LLMScheduler。
+    接口与原客户端一致，cached_completion 与 astream_data_records 等无需修改即可使用。
+    流式请求只对建立连接的部分重试，已开始接收的流不会重发。
+    """
+
+    def __init__(self, client, scheduler, use_async=False):
+        self._client = client
+        self.scheduler = scheduler
+        self.chat = _ThrottledChat(client.chat, scheduler, use_async)
+
+    def close(self):
+        """
+        关闭被包装的客户端；异步客户端返回需要 await 的协程。
+        """
+        return self._client.close()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def parse_model_limits(specs):
+    """
+    解析命令行的 MODEL=RPM[:TPM] 列表，如 ['glm-4.5=30:100000', 'glm-4.5-air=200']。
+    """
+    limits = {}
+    for spec in specs or []:
+        model, _, values = spec.partition('=')
+        rpm, _, tpm = values.partition(':')
+        base = DEFAULT_MODEL_LIMITS.get(model, FALLBACK_LIMITS)
+        limits[model] = {'rpm': float(rpm), 'tpm': float(tpm) if tpm else base['tpm']}
+    return limits
@@ -0,0 +1,215 @@
+## LLM流式返回的增量JSON解析：逐条产出 data 记录，结构无法恢复时立即中止
+
+import json
+
+from .llm_cache import CacheMissError
+from .llm_decode import loads
+
+
+class StreamAbort(ValueError):
+    """流式返回的结构已无法恢复（括号不匹配、记录无法解析等），应立即取消请求。"""
+
+
+class DataRecordStream:
+    """
+    增量解析形如 [{"variables": [...], "confounder_variables": [...], "data": [{...}, ...]}, ...] 的文本。
+
+    每当 "data" 数组中的一个对象完整到达，就将其解析并产出 (header, record)，
+    其中 header 包含该数据集已到达的 "variables" / "confounder_variables"。
+
+    参数:
+        repair_fn (callable | None): 解析单条记录前对其文本做的修复（如 std 键名错误）。
+        max_preamble (int): 结构开始前允许出现的非JSON字符数（解释文字、代码块标记）。
+        max_bad_records (int): 允许无法解析的记录条数，超过后中止。
+    """
+
+    HEADER_KEYS = ('variables', 'confounder_variables')
+
+    def __init__(self, repair_fn=None, max_preamble=500, max_bad_records=3):
+        self.repair_fn = repair_fn
+        self.max_preamble = max_preamble
+        self.max_bad_records = max_bad_records
+        self.text = ''
+        self.pos = 0
+        self.stack = []
+        self.started = False
+        self.done = False
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string = None
+        self.preamble = 0
+        self.bad_records = 0
+        self.records = 0
+        # 已完成但尚未交给调用方的记录；feed 中途抛出 StreamAbort 时可由 take_pending 取回
+        self.pending = []
+
+    def feed(self, chunk):
+        """
+        输入一段新到达的文本，返回其中新完成的 (header, record) 列表。
+
+        抛出 StreamAbort 时，同一段文本中在此之前已完成的记录保留在 pending 中，由 take_pending 取回。
+        """
+        if self.done or not chunk:
+            return self.take_pending()
+        self.text += chunk
+        out = self.pending
+        text = self.text
+        i = self.pos
+        n = len(text)
+        while i < n and not self.done:
+            ch = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.last_string = text[self.string_start + 1:i]
+                i += 1
+                continue
+
+            if not self.started:
+                if ch in '[{':
+                    self.started = True
+                    continue
+                if ch == '`':
+                    # 跳过 ```json 代码块标记
+                    end = text.find('\n', i)
+                    if end == -1:
+                        break
+                    i = end + 1
+                    continue
+                if not ch.isspace():
+                    self.preamble += 1
+                    if self.preamble > self.max_preamble:
+                        raise StreamAbort("返回内容在JSON开始前包含过多非JSON文字")
+                i += 1
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch == ':':
+                if self.stack and self.stack[-1]['type'] == '{':
+                    self.stack[-1]['last_key'] = self.last_string
+            elif ch in '[{':
+                parent = self.stack[-1] if self.stack else None
+                key = parent['last_key'] if parent and parent['type'] == '{' else None
+                is_record = bool(parent and parent['type'] == '[' and parent['key'] == 'data')
+                self.stack.append({'type': ch, 'start': i, 'key': key, 'last_key': None,
+                                   'is_record': is_record, 'header': {}})
+            elif ch in ']}':
+                if not self.stack:
+                    raise StreamAbort(f"位置 {i} 出现多余的右括号 '{ch}'")
+                frame = self.stack.pop()
+                if (frame['type'] == '{') != (ch == '}'):
+                    raise StreamAbort(f"位置 {i} 括号不匹配: '{frame['type']}' 与 '{ch}'")
+                if frame['is_record']:
+                    record = self._parse_record(text[frame['start']:i + 1])
+                    if record is not None:
+                        # 记录所在数据集对象位于 data 数组的上一层
+                        header = self.stack[-2]['header'] if len(self.stack) >= 2 else {}
+                        out.append((dict(header), record))
+                elif frame['key'] in self.HEADER_KEYS and self.stack and self.stack[-1]['type'] == '{':
+                    try:
+                        self.stack[-1]['header'][frame['key']] = json.loads(text[frame['start']:i + 1])
+                    except json.JSONDecodeError:
+                        pass
+                if not self.stack:
+                    self.done = True
+            i += 1
+        self.pos = i
+        return self.take_pending()
+
+    def take_pending(self):
+        """
+        取出并清空已完成但尚未返回的记录。
+        """
+        out, self.pending = self.pending, []
+        return out
+
+    def _parse_record(self, record_text):
+        if self.repair_fn is not None:
+            record_text = self.repair_fn(record_text)
+        try:
+            record = loads(record_text)
+        except json.JSONDecodeError as e:
+            self.bad_records += 1
+            if self.bad_records > self.max_bad_records:
+                raise StreamAbort(f"无法解析的记录超过 {self.max_bad_records} 条: {e}")
+            return None
+        self.records += 1
+        return record
+
+    def close(self):
+        """
+        流结束时调用；若JSON结构尚未闭合（返回被截断），抛出 StreamAbort。已产出的记录仍然有效。
+        """
+        if not self.started:
+            raise StreamAbort("返回内容中没有JSON结构")
+        if not self.done:
+            raise StreamAbort(f"返回内容被截断，仍有 {len(self.stack)} 层括号未闭合")
+
+
+def _feed(parser, text):
+    """
+    返回 (新完成的记录, StreamAbort 或 None)；中止前已完成的记录同样返回，由调用方先产出再抛出异常。
+    """
+    try:
+        return parser.feed(text), None
+    except StreamAbort as e:
+        return parser.take_pending(), e
+
+
+async def astream_data_records(client, model, prompt, repair_fn=None, cache=None, sample_index=0, **params):
+    """
+    以 stream=True 调用LLM，边接收边产出 (header, record)。
+
+    结构无法恢复时抛出 StreamAbort，并立即关闭连接以停止继续生成；
+    完整且成功解析的返回内容会写入缓存，缓存命中时直接回放。
+    """
+    parser = DataRecordStream(repair_fn=repair_fn)
+    key = None
+    if cache is not None:
+        key = cache.make_key(model, prompt, dict(params, sample_index=sample_index))
+        content = cache.get(key)
+        if content is not None:
+            items, abort = _feed(parser, content)
+            for item in items:
+                yield item
+            if abort is not None:
+                raise abort
+            parser.close()
+            return
+        if cache.replay_only:
+            raise CacheMissError(f"仅回放模式下缓存未命中 (model={model}, key={key[:12]})")
+
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+        **params,
+    )
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            items, abort = _feed(parser, delta)
+            for item in items:
+                yield item
+            if abort is not None:
+                raise abort
+            if parser.done:
+                # 顶层结构已闭合，之后的解释文字不再接收
+                break
+        parser.close()
+    finally:
+        await stream.close()
+
+    if cache is not None:
+        cache.put(key, model, parser.text)
@@ -1,33 +1,34 @@
 ## 计算基数据因果效应
 
 import os
-import pandas as pd
-from causallearn.search.ConstraintBased.PC import pc
+import sys
+import argparse
 from causallearn.utils.GraphUtils import GraphUtils
-from sklearn.preprocessing import LabelEncoder
 
-def discover_causal_structure(data, node_names):
-    """
-    对给定的数据集运行PC因果发现算法。
-
-    参数:
-        data (np.ndarray): 经过标签编码的数值型数据集 (NumPy数组)。
-        node_names (list): 变量名称列表。
-
-    返回:
-        causallearn.Graph.GeneralGraph: 发现的因果图对象。
-    """
-    # 运行PC算法
-    # alpha参数是显著性水平，用于独立性检验
-    cg = pc(data, alpha=0.05, node_names=node_names)
-    return cg
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'exp'))
+from common.bootstrap import bootstrap_edges, print_stability_table, save_stability_results
+from common.dataset_store import open_dataset
+from common.pc_batch import discover_causal_structure
+from common.graph_eval import evaluate_graphs, graph_matrix, load_truth_graph, print_summary, stack_matrices, summarize
 
 def main():
     """
     主函数，加载基准数据文件，执行因果发现并打印结果。
     """
+    parser = argparse.ArgumentParser(description="对基准数据运行PC算法。")
+    parser.add_argument("--input", default='data_generate/generated_cancer_dataset.csv', help="基准数据CSV文件")
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="自助重采样次数；大于0时并行运行PC并报告每条边及其方向的出现频率")
+    parser.add_argument("--workers", type=int, default=None, help="自助重采样的进程数，默认使用全部CPU核心")
+    parser.add_argument("--seed", type=int, default=0, help="自助重采样的随机种子")
+    parser.add_argument("--output", default=None, help="保存稳定性选择结果的JSON文件")
+    parser.add_argument("--rebuild-store", action="store_true", help="忽略数据集缓存，重新读取CSV并编码")
+    parser.add_argument("--truth", default=None,
+                        help="与真实结构比较并输出 SHD、邻接/方向 P/R/F1，如 cancer、asia 或 .bif 文件")
+    args = parser.parse_args()
+
     # 我们要分析的基准数据文件
-    benchmark_file_path = 'data_generate/generated_cancer_dataset.csv'
+    benchmark_file_path = args.input
     
     if not os.path.exists(benchmark_file_path):
         print(f"错误: 基准数据文件 '{benchmark_file_path}' 不存在。")
@@ -37,16 +38,24 @@ def main():
     print(f"正在分析基准数据文件: {os.path.basename(benchmark_file_path)}")
     print(f"{'='*30}")
 
-    # --- 1. 加载数据 ---
-    df = pd.read_csv(benchmark_file_path)
-    
-    # --- 2. 数据预处理：标签编码 ---
-    df_encoded = df.apply(LabelEncoder().fit_transform)
-    column_names = df.columns.tolist()
+    # --- 1. 加载数据并做标签编码 ---
+    # 编码结果缓存为 .npy（与 LabelEncoder 的编号一致），再次运行时直接内存映射载入
+    dataset = open_dataset(benchmark_file_path, encode='all', rebuild=args.rebuild_store)
+    column_names = dataset.columns
+
+    data_np = dataset.to_numpy()
+
+    if args.bootstrap > 0:
+        print(f"正在进行 {args.bootstrap} 次自助重采样并并行运行PC算法...")
+        result = bootstrap_edges(data_np, column_names, n_boot=args.bootstrap,
+                                 max_workers=args.workers, seed=args.seed, alpha=0.05)
+        print_stability_table(result)
+        if args.output:
+            save_stability_results(result, args.output)
+        return
 
     # --- 3. 运行因果发现算法 ---
     print("正在运行PC算法进行因果发现...")
-    data_np = df_encoded.to_numpy()
     causal_graph = discover_causal_structure(data_np, column_names)
     
     # --- 4. 打印发现的因果图 ---
@@ -60,6 +69,12 @@ def main():
             node1 = edge.get_node1()
             node2 = edge.get_node2()
             print(f"  -> {node1.get_name()} {edge.get_endpoint1()}--{edge.get_endpoint2()} {node2.get_name()}")
+
+    # --- 5. 与真实结构比较 ---
+    if args.truth:
+        truth = load_truth_graph(args.truth)
+        est, present = stack_matrices([graph_matrix(causal_graph.G)], truth)
+        print_summary(summarize(evaluate_graphs(est, present, truth)), os.path.basename(benchmark_file_path), 1)
             
 
 